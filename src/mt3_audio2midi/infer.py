@@ -0,0 +1,173 @@
+"""Transcription without TensorFlow, seqio or t5.
+
+Importing this module only imports NumPy. `Transcriber` imports JAX, Flax and note_seq when it is created, computes
+spectrograms with `mt3.audio_frontend` and reads parameters with `mt3.checkpoint_params` or `mt3.param_pack`, so inference servers skip
+the TensorFlow import on cold start. Predictions match those of `mt3_audio2midi.MT3`.
+"""
+import functools
+import logging
+import numpy as np
+
+# Decode lengths to try, smallest first, before the model's full outputs length; each compiles its own predict fn.
+DECODE_LENGTHS = (128, 256, 512)
+# Segments whose loudest frame is below this RMS level (dBFS) are not run through the model; None disables.
+SILENCE_THRESHOLD_DB = -60.0
+
+def silent_segments(frames, inputs_length, silence_threshold_db):
+	"""Returns whether each `inputs_length` segment of audio frames is silent, i.e. its loudest frame is below the threshold."""
+	num_segments = -(-len(frames) // inputs_length)
+	if silence_threshold_db is None:
+		return np.zeros(num_segments, bool)
+	frame_rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+	frame_rms = np.pad(frame_rms, [0, num_segments * inputs_length - len(frame_rms)])
+	return frame_rms.reshape(num_segments, inputs_length).max(axis=1) < 10 ** (silence_threshold_db / 20)
+
+def predict_with_decode_lengths(predict_fn, encoder_input_tokens, batch_size, decode_lengths, eos_id, decode_length_index=0):
+	"""Decodes each segment with the smallest decode length at which it reaches EOS.
+
+	`predict_fn(encoder_input_tokens, decoder_input_tokens)` decodes a full batch up to the length of
+	`decoder_input_tokens`. All segments start at `decode_lengths[decode_length_index]`; segments that hit that limit
+	without EOS are decoded again at the next decode length. Returns the decodes padded to the last decode length and
+	the decode length index needed by the longest decode, used to start the next batch.
+	"""
+	num_segments = len(encoder_input_tokens)
+	decodes = np.zeros((num_segments, decode_lengths[-1]), np.int32)
+	needed_length = 0
+	pending = np.arange(num_segments)
+	for i in range(decode_length_index, len(decode_lengths)):
+		decode_length = decode_lengths[i]
+		for start in range(0, len(pending), batch_size):
+			segments = pending[start:start + batch_size]
+			# Pad to a full batch so there is one executable per decode length.
+			inputs = np.zeros((batch_size,) + encoder_input_tokens.shape[1:], encoder_input_tokens.dtype)
+			inputs[:len(segments)] = encoder_input_tokens[segments]
+			outputs = np.asarray(predict_fn(inputs, np.zeros((batch_size, decode_length), np.int32)))
+			decodes[segments, :decode_length] = outputs[:len(segments)]
+		ended = (decodes[pending] == eos_id).any(axis=1)
+		if ended.any():
+			needed_length = max(needed_length, 1 + np.argmax(decodes[pending[ended]] == eos_id, axis=1).max())
+		pending = pending[~ended]
+		if not len(pending):
+			break
+	else:
+		needed_length = decode_lengths[-1]
+	return decodes, int(np.searchsorted(decode_lengths, needed_length))
+
+def _encode(module, params, encoder_input_tokens):
+	return module.apply({'params': params}, encoder_input_tokens, enable_dropout=False, method=module.encode)
+
+def _decode(module, eos_id, params, encoded, decoder_input_tokens):
+	"""Greedy decoding of encoded segments, up to the length of `decoder_input_tokens`.
+
+	Each token is the argmax given the previous ones and decoding stops at EOS, so a segment that reaches EOS within a
+	shorter decode length decodes to the same tokens as with a longer one (unlike beam search, whose stopping rule depends
+	on the decode length).
+	"""
+	import jax.numpy as jnp
+	from mt3_audio2midi.t5x import decoding
+	# The decoder only uses the shape of the encoder inputs (for the attention mask), which `encoded` shares.
+	_, initial_variables = module.apply({'params': params}, encoded, encoded, jnp.ones_like(decoder_input_tokens), jnp.ones_like(decoder_input_tokens), mutable=['cache'], decode=True, enable_dropout=False, method=module.decode)
+	def tokens_to_logits(decoding_state):
+		logits, new_variables = module.apply({'params': params, 'cache': decoding_state.cache}, encoded, encoded, decoding_state.cur_token, decoding_state.cur_token, enable_dropout=False, decode=True, max_decode_length=decoder_input_tokens.shape[1], mutable=['cache'], method=module.decode)
+		return jnp.squeeze(logits, axis=1), new_variables['cache']
+	decodes, _ = decoding.temperature_sample(inputs=jnp.zeros_like(decoder_input_tokens), cache=initial_variables['cache'], tokens_to_logits=tokens_to_logits, eos_id=eos_id, num_decodes=1, temperature=0.0)
+	return decodes[:, -1, :]
+
+def _predict(module, eos_id, params, encoder_input_tokens, decoder_input_tokens):
+	"""Greedy decoding, as `MT3`'s `EncoderDecoderModel.predict_batch_with_aux`."""
+	return _decode(module, eos_id, params, _encode(module, params, encoder_input_tokens), decoder_input_tokens)
+
+class Transcriber():
+	def __init__(self, model_path, model_type='mt3', batch_size=8, quantization=None):
+		import jax
+		from mt3_audio2midi.mt3 import event_codec, model_config, network, note_sequences, param_pack, quantize, token_vocabulary
+		# Same configuration as `MT3`, read from the packaged gin files without binding them globally.
+		self.config = model_config.load_model_config(model_type)
+		self.inputs_length = self.config.inputs_length
+		self.encoding_spec = note_sequences.NoteEncodingWithTiesSpec if self.config.use_ties else note_sequences.NoteEncodingSpec
+		self.batch_size = batch_size
+		self.outputs_length = self.config.targets_length
+		self.decode_lengths = DECODE_LENGTHS + (self.outputs_length,)
+		self.silence_threshold_db = SILENCE_THRESHOLD_DB
+		self.spectrogram_config = self.config.spectrogram_config
+		self.codec = token_vocabulary.build_codec(self.config.vocab_config)
+		self.vocabulary = token_vocabulary.vocabulary_from_codec(self.codec)
+		# Silent segments decode to no events; with ties, an empty tie section ends all active notes.
+		self.silent_tokens = np.array([self.codec.encode_event(event_codec.Event('tie', 0))] if self.config.use_ties else [], np.int32)
+		# `model_path` is a T5X checkpoint or a param pack; on CPU, param pack arrays stay in the (shared) memory-mapped file.
+		params = param_pack.load_params(model_path)
+		# Quantized packs (see mt3.quantize_checkpoint) run in int8 mode by default; `quantization` (a layers.QUANTIZATION_MODES mode) also quantizes float weights on load.
+		if quantize.is_quantized(params):
+			quantization = quantization or 'int8'
+		elif quantization is not None:
+			params = quantize.quantize_params(params)
+		self.quantization = quantization
+		self.module = network.Transformer(config=network.T5Config(vocab_size=token_vocabulary.num_embeddings(self.vocabulary), quantization=quantization, **self.config.t5_config))
+		self.params = jax.device_put(params)
+		self._predict_fn = jax.jit(functools.partial(_predict, self.module, self.vocabulary.eos_id))
+
+	def frames(self, samples):
+		"""Splits audio into frames of `hop_width` samples."""
+		from mt3_audio2midi.mt3 import audio_frontend
+		hop_width = self.spectrogram_config.hop_width
+		samples = np.pad(np.asarray(samples, np.float32), [0, hop_width - len(samples) % hop_width])
+		return audio_frontend.split_audio(samples, self.spectrogram_config)
+
+	def spectrograms(self, frames):
+		"""Spectrograms of the `inputs_length` frame segments of audio frames, and the segment start times."""
+		from mt3_audio2midi.mt3 import audio_frontend
+		spectrograms = np.zeros((-(-len(frames) // self.inputs_length), self.inputs_length, self.spectrogram_config.num_mel_bins), np.float32)
+		for i, start in enumerate(range(0, len(frames), self.inputs_length)):
+			segment_frames = frames[start:start + self.inputs_length]
+			spectrograms[i, :len(segment_frames)] = audio_frontend.compute_spectrogram(segment_frames.ravel(), self.spectrogram_config)
+		start_times = np.arange(0, len(frames), self.inputs_length) / self.spectrogram_config.frames_per_second
+		return spectrograms, start_times
+
+	def segments(self, samples):
+		"""Splits audio into `inputs_length` frame segments; returns frames, spectrograms and segment start times."""
+		frames = self.frames(samples)
+		return (frames,) + self.spectrograms(frames)
+
+	def postprocess(self, tokens, start_time):
+		"""Prediction for a segment from its decoded tokens, up to (not including) EOS."""
+		return {'est_tokens': tokens,'start_time': start_time - start_time % (1 / self.codec.steps_per_second)}
+
+	def _predict_segments(self, spectrograms, start_times, decode_length_index):
+		decodes, decode_length_index = predict_with_decode_lengths(functools.partial(self._predict_fn, self.params), spectrograms, self.batch_size, self.decode_lengths, self.vocabulary.eos_id, decode_length_index)
+		tokens, lengths = self.vocabulary.decode_np(decodes)
+		return [self.postprocess(segment_tokens[:length], start_time) for segment_tokens, length, start_time in zip(tokens, lengths, start_times)], decode_length_index
+
+	def predict_segments(self, samples):
+		"""Predictions for each segment of 16 kHz mono audio samples, as combined by `metrics_utils.event_predictions_to_ns`."""
+		frames, spectrograms, start_times = self.segments(samples)
+		silent = silent_segments(frames, self.inputs_length, self.silence_threshold_db)
+		predictions = [None] * len(spectrograms)
+		for i in np.flatnonzero(silent):
+			predictions[i] = dict(self.postprocess(self.silent_tokens, start_times[i]), skipped=True)
+		decode_length_index = 0
+		pending = np.flatnonzero(~silent)
+		for start in range(0, len(pending), self.batch_size):
+			# Neighboring segments have similar note density, so start where the previous batch ended.
+			batch = pending[start:start + self.batch_size]
+			batch_predictions, decode_length_index = self._predict_segments(spectrograms[batch], start_times[batch], decode_length_index)
+			for i, prediction in zip(batch, batch_predictions):
+				predictions[i] = prediction
+		return predictions
+
+	def transcribe_result(self, samples):
+		"""`metrics_utils.event_predictions_to_ns` of 16 kHz mono audio samples: the NoteSequence `est_ns` and counts such as `est_skipped_segments`."""
+		from mt3_audio2midi.mt3 import metrics_utils
+		predictions = self.predict_segments(samples)
+		result = metrics_utils.event_predictions_to_ns(predictions, codec=self.codec, encoding_spec=self.encoding_spec)
+		logging.info('Skipped %d of %d segments as silent.', result['est_skipped_segments'], len(predictions))
+		return result
+
+	def transcribe(self, samples):
+		"""Transcribes 16 kHz mono audio samples to a NoteSequence."""
+		return self.transcribe_result(samples)['est_ns']
+
+	def transcribe_file(self, audio_path, output_file='output.mid'):
+		import librosa
+		import note_seq
+		note_seq.sequence_proto_to_midi_file(self.transcribe(librosa.load(audio_path, sr=self.spectrogram_config.sample_rate)[0]), output_file)
+		return output_file
@@ -0,0 +1,38 @@
+"""Tests for infer."""
+import functools
+from absl.testing import absltest
+import jax
+import numpy as np
+from mt3_audio2midi import infer
+from mt3_audio2midi.mt3 import network
+
+EOS_ID = 1
+
+class PredictWithDecodeLengthsTest(absltest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		module = network.Transformer(config=network.T5Config(vocab_size=16, emb_dim=16, num_heads=2, num_encoder_layers=1, num_decoder_layers=1, head_dim=8, mlp_dim=32, dropout_rate=0.0))
+		self.inputs = np.random.default_rng(0).normal(size=(8, 4, 3)).astype(np.float32)
+		decoder_tokens = np.ones((8, 32), np.int32)
+		params = module.init(jax.random.PRNGKey(0), self.inputs, decoder_tokens, decoder_tokens, enable_dropout=False)['params']
+		# Make EOS likely enough that segments end at different lengths, or not at all.
+		kernel = np.array(params['decoder']['logits_dense']['kernel'])
+		kernel[:, EOS_ID] += 0.3 * np.sign(kernel[:, EOS_ID])
+		params['decoder']['logits_dense']['kernel'] = kernel
+		self.predict_fn = functools.partial(jax.jit(functools.partial(infer._predict, module, EOS_ID)), params)
+
+	def test_matches_full_length_decode(self):
+		full, _ = infer.predict_with_decode_lengths(self.predict_fn, self.inputs, 4, (32,), EOS_ID)
+		eos_positions = [np.argmax(decode == EOS_ID) for decode in full if (decode == EOS_ID).any()]
+		# Some segments end within the shorter decode lengths and some need the longest one.
+		self.assertLess(min(eos_positions), 12)
+		self.assertLess(len(eos_positions), len(full))
+		for decode_length_index in range(3):
+			bucketed, _ = infer.predict_with_decode_lengths(self.predict_fn, self.inputs, 4, (12, 20, 32), EOS_ID, decode_length_index)
+			for full_decode, bucketed_decode in zip(full, bucketed):
+				length = np.argmax(full_decode == EOS_ID) + 1 if (full_decode == EOS_ID).any() else len(full_decode)
+				np.testing.assert_array_equal(bucketed_decode[:length], full_decode[:length])
+
+if __name__ == '__main__':
+	absltest.main()
@@ -0,0 +1,251 @@
+import collections
+import concurrent.futures
+import functools
+import logging
+import threading
+import numpy as np
+import tensorflow as tf
+import librosa
+import note_seq
+import jax
+import flax
+import seqio
+import t5
+import mt3_audio2midi.infer
+import mt3_audio2midi.mt3.event_codec
+import mt3_audio2midi.mt3.note_sequences
+import mt3_audio2midi.mt3.vocabularies
+import mt3_audio2midi.mt3.spectrograms
+import mt3_audio2midi.mt3.model_config
+import mt3_audio2midi.mt3.models
+import mt3_audio2midi.mt3.network
+import mt3_audio2midi.mt3.param_pack
+import mt3_audio2midi.mt3.preprocessors
+import mt3_audio2midi.mt3.metrics_utils
+import mt3_audio2midi.t5x.decoding
+import mt3_audio2midi.t5x.partitioning
+import mt3_audio2midi.t5x.utils
+
+class MT3():
+	def __init__(self, model_path, model_type='mt3'):
+		# Read from the packaged gin files (once per process) without binding them globally, so models can be created concurrently.
+		self.config = mt3_audio2midi.mt3.model_config.load_model_config(model_type)
+		self.encoding_spec = mt3_audio2midi.mt3.note_sequences.NoteEncodingWithTiesSpec if self.config.use_ties else mt3_audio2midi.mt3.note_sequences.NoteEncodingSpec
+		self.inputs_length = self.config.inputs_length
+		self.batch_size = 8
+		self.outputs_length = self.config.targets_length
+		self.decode_lengths = mt3_audio2midi.infer.DECODE_LENGTHS + (self.outputs_length,)
+		self.silence_threshold_db = mt3_audio2midi.infer.SILENCE_THRESHOLD_DB
+		self.sequence_length = {'inputs': self.inputs_length,'targets': self.outputs_length}
+		self.partitioner = mt3_audio2midi.t5x.partitioning.PjitPartitioner(model_parallel_submesh=None, num_partitions=1)
+		self.spectrogram_config = self.config.spectrogram_config
+		self.codec = mt3_audio2midi.mt3.vocabularies.build_codec(vocab_config=self.config.vocab_config)
+		self.vocabulary = mt3_audio2midi.mt3.vocabularies.vocabulary_from_codec(self.codec)
+		# Silent segments decode to no events; with ties, an empty tie section ends all active notes.
+		self.silent_tokens = np.array([self.codec.encode_event(mt3_audio2midi.mt3.event_codec.Event('tie', 0))] if self.encoding_spec is mt3_audio2midi.mt3.note_sequences.NoteEncodingWithTiesSpec else [], np.int32)
+		self.output_features = {'inputs': seqio.ContinuousFeature(dtype=tf.float32, rank=2),'targets': seqio.Feature(vocabulary=self.vocabulary),}
+		self.model = mt3_audio2midi.mt3.models.ContinuousInputsEncoderDecoderModel(module=mt3_audio2midi.mt3.network.Transformer(config=mt3_audio2midi.mt3.network.T5Config(vocab_size=mt3_audio2midi.mt3.vocabularies.num_embeddings(self.vocabulary), **self.config.t5_config)),input_vocabulary=self.output_features['inputs'].vocabulary,output_vocabulary=self.output_features['targets'].vocabulary,optimizer_def=None,decode_fn=mt3_audio2midi.t5x.decoding.temperature_sample,input_depth=mt3_audio2midi.mt3.spectrograms.input_depth(self.spectrogram_config))
+		# Without an optimizer the train state is an InferenceState: only `target` params are allocated and restored.
+		self._train_state_initializer = mt3_audio2midi.t5x.utils.TrainStateInitializer(optimizer_def=None,init_fn=self.model.get_initial_variables,input_shapes={'encoder_input_tokens': (self.batch_size, self.inputs_length),'decoder_input_tokens': (self.batch_size, self.outputs_length)},partitioner=self.partitioner)
+		self._predict_fn = self._get_predict_fn(self._train_state_initializer.train_state_axes)
+		self._train_state = self._restore_train_state(model_path)
+
+	def _restore_train_state(self, model_path):
+		"""Restores a T5X checkpoint or param pack into the train state layout (shapes and partitioning) of this model."""
+		train_state_shape = self._train_state_initializer.global_train_state_shape
+		if not mt3_audio2midi.mt3.param_pack.is_param_pack(model_path):
+			return self._train_state_initializer.from_checkpoint([mt3_audio2midi.t5x.utils.RestoreCheckpointConfig(path=model_path, mode='specific', dtype='float32')])
+		params = flax.serialization.from_state_dict(train_state_shape.params, mt3_audio2midi.mt3.param_pack.load_param_pack(model_path))
+		if jax.tree_util.tree_map(lambda x: (x.shape, x.dtype), params) != jax.tree_util.tree_map(lambda x: (x.shape, x.dtype), train_state_shape.params):
+			raise ValueError('parameters of %s do not match the shapes of this model' % model_path)
+		# Placed with the partitioning of restored checkpoints, so the compiled predict fns accept either.
+		shardings = jax.tree_util.tree_map(lambda axes: jax.sharding.NamedSharding(self.partitioner.mesh, axes), self._train_state_initializer.train_state_axes.params, is_leaf=lambda x: isinstance(x, mt3_audio2midi.t5x.partitioning.PartitionSpec))
+		# Param pack arrays are views of a memory-mapped file shared by all processes using it; on CPU, device_put does not copy them.
+		return train_state_shape.replace_step(np.zeros((), np.int32)).replace_params(jax.device_put(params, shardings))
+
+	def load_weights(self, model_path):
+		"""Replaces the parameters with those of another checkpoint or param pack of the same model type, without recompiling.
+
+		The new parameters are restored with the shapes and partitioning of the current ones, so the compiled predict fns
+		are reused, and swapped in at once: `predict` calls in progress finish with the parameters they started with.
+		"""
+		self._train_state = self._restore_train_state(model_path)
+
+	def _get_predict_fn(self, train_state_axes):
+		# Greedy decoding, whose tokens do not depend on the decode length (see `infer._decode`).
+		def partial_predict_fn(params, batch, decode_rng):
+			return self.model.predict_batch_with_aux(params, batch, decoder_params={'decode_rng': None, 'temperature': 0.0})
+		return self.partitioner.partition(partial_predict_fn,in_axis_resources=(train_state_axes.params,mt3_audio2midi.t5x.partitioning.PartitionSpec('data',), None),out_axis_resources=mt3_audio2midi.t5x.partitioning.PartitionSpec('data',))
+
+	def _predict_batch(self, batch, decode_rng, decode_length_index=0, params=None):
+		"""Decodes each segment with the smallest decode length at which it reaches EOS; see `infer.predict_with_decode_lengths`."""
+		params = self._train_state.params if params is None else params
+		predict_fn = lambda inputs, decoder_input_tokens: self._predict_fn(params, {'encoder_input_tokens': inputs, 'decoder_input_tokens': decoder_input_tokens}, decode_rng)[0]
+		return mt3_audio2midi.infer.predict_with_decode_lengths(predict_fn, batch['encoder_input_tokens'], self.batch_size, self.decode_lengths, self.vocabulary.eos_id, decode_length_index)
+
+	def _predict_segments(self, segments, decode_rng, decode_length_index, params=None):
+		"""Predicts a list of (example, model features) segments; see `_predict_batch`."""
+		batch = {'encoder_input_tokens': np.stack([features['encoder_input_tokens'] for _, features in segments])}
+		decodes, decode_length_index = self._predict_batch(batch, decode_rng, decode_length_index, params)
+		tokens, lengths = self.vocabulary.decode_np(decodes)
+		return [self.postprocess(segment_tokens[:length], example) for (example, _), segment_tokens, length in zip(segments, tokens, lengths)], decode_length_index
+
+	def silent_segments(self, frames):
+		"""Returns whether each `inputs_length` segment of audio frames is silent."""
+		return mt3_audio2midi.infer.silent_segments(frames, self.inputs_length, self.silence_threshold_db)
+
+	def preprocess(self, ds):
+		for pp in [functools.partial(t5.data.preprocessors.split_tokens_to_inputs_length,sequence_length=self.sequence_length,output_features=self.output_features,feature_key='inputs',additional_feature_keys=['input_times']),mt3_audio2midi.mt3.preprocessors.add_dummy_targets,functools.partial(mt3_audio2midi.mt3.preprocessors.compute_spectrograms,spectrogram_config=self.spectrogram_config,keep_raw_inputs=False)]:
+			ds = pp(ds)
+		return ds
+
+	def postprocess(self, tokens, example):
+		"""Prediction for a segment from its decoded tokens, up to (not including) EOS."""
+		start_time = example['input_times'][0]
+		return {'est_tokens': tokens,'start_time': start_time - start_time % (1 / self.codec.steps_per_second)}
+
+	def predict(self, audio_path, seed=0,output_file="output.mid", params=None):
+		audio = librosa.load(audio_path,sr=16000)[0]
+		frame_size = self.spectrogram_config.hop_width
+		padding = [0, frame_size - len(audio) % frame_size]
+		audio = np.pad(audio, padding, mode='constant')
+		frames = mt3_audio2midi.mt3.spectrograms.split_audio(audio, self.spectrogram_config)
+		num_frames = len(audio) // frame_size
+		frame_times = np.arange(num_frames) / self.spectrogram_config.frames_per_second
+		silent = self.silent_segments(frames)
+		ds =  tf.data.Dataset.from_tensors({'inputs': frames,'input_times': frame_times,})
+		ds = self.preprocess(ds)
+		model_ds = self.model.FEATURE_CONVERTER_CLS(pack=False)(ds, task_feature_lengths=self.sequence_length)
+		predictions = []
+		segments = []
+		decode_length_index = 0
+		# All segments are decoded with the parameters at the start, even if `load_weights` replaces them meanwhile.
+		params = self._train_state.params if params is None else params
+		for is_silent, example, features in zip(silent, ds.as_numpy_iterator(), model_ds.as_numpy_iterator()):
+			if is_silent:
+				predictions.append(dict(self.postprocess(self.silent_tokens, example), skipped=True))
+				continue
+			segments.append((example, features))
+			if len(segments) == self.batch_size:
+				# Neighboring segments have similar note density, so start where the previous batch ended.
+				batch_predictions, decode_length_index = self._predict_segments(segments, jax.random.PRNGKey(seed), decode_length_index, params)
+				predictions.extend(batch_predictions)
+				segments = []
+		if segments:
+			predictions.extend(self._predict_segments(segments, jax.random.PRNGKey(seed), decode_length_index, params)[0])
+		result = mt3_audio2midi.mt3.metrics_utils.event_predictions_to_ns(predictions, codec=self.codec, encoding_spec=self.encoding_spec)
+		logging.info('Skipped %d of %d segments of %s as silent.', result['est_skipped_segments'], len(predictions), audio_path)
+		note_seq.sequence_proto_to_midi_file(result['est_ns'], output_file)
+		return output_file
+
+class ModelRegistry():
+	"""Serves several checkpoints (e.g. fine-tunes) of each model type from one `MT3` per model type.
+
+	Checkpoints of the same model type have the same shapes, so they share the compiled predict fns of its `MT3` and only
+	differ in the parameters passed to `MT3.predict`. Parameters are loaded on first use; when those loaded exceed
+	`max_bytes`, the least recently used ones are dropped (and loaded again when next used). The parameters each `MT3`
+	was created with stay loaded.
+	"""
+	def __init__(self, max_bytes=None):
+		self.max_bytes = max_bytes
+		self._models = {}
+		self._model_paths = {}
+		# Name: parameters, least recently used first.
+		self._params = collections.OrderedDict()
+		# Futures of the `MT3`s (by model type) and parameters (by name) being loaded, so that concurrent misses load once.
+		self._loading_models = {}
+		self._loading_params = {}
+		self._registering = set()
+		# Only guards the dicts above; models and parameters are loaded without holding it.
+		self._lock = threading.Lock()
+
+	def _claim(self, loading, key):
+		"""The future of `key` in `loading` and whether the caller must complete it; call with `_lock` held."""
+		if key in loading:
+			return loading[key], False
+		future = loading[key] = concurrent.futures.Future()
+		return future, True
+
+	def _load(self, loading, key, future, load_fn, store_fn):
+		"""Completes `future` with `load_fn()` (outside `_lock`) after `store_fn(result)` (inside it)."""
+		try:
+			result = load_fn()
+		except BaseException as e:
+			with self._lock:
+				del loading[key]
+			future.set_exception(e)
+			raise
+		with self._lock:
+			del loading[key]
+			store_fn(result)
+		future.set_result(result)
+		return result
+
+	def register(self, name, model_path, model_type='mt3'):
+		"""Registers a T5X checkpoint or param pack under `name`; the first of each model type creates its `MT3`."""
+		with self._lock:
+			if name in self._model_paths or name in self._registering:
+				raise ValueError('model already registered: %s' % name)
+			self._registering.add(name)
+			if model_type in self._models:
+				future, create = None, False
+			else:
+				future, create = self._claim(self._loading_models, model_type)
+		try:
+			if create:
+				def store(model):
+					self._models[model_type] = model
+					self._params[name] = model._train_state.params
+				self._load(self._loading_models, model_type, future, lambda: MT3(model_path, model_type), store)
+			elif future is not None:
+				future.result()
+		finally:
+			with self._lock:
+				self._registering.discard(name)
+		with self._lock:
+			self._model_paths[name] = (model_path, model_type)
+
+	def names(self):
+		with self._lock:
+			return list(self._model_paths)
+
+	def loaded_names(self):
+		"""Names of the models whose parameters are loaded, least recently used first."""
+		with self._lock:
+			return list(self._params)
+
+	def _nbytes(self, params):
+		return sum(x.nbytes for x in jax.tree_util.tree_leaves(params))
+
+	def _evict(self, keep_name):
+		"""Drops the least recently used parameters (but those of `keep_name` and of the `MT3`s) down to `max_bytes`."""
+		if self.max_bytes is None:
+			return
+		pinned = [m._train_state.params for m in self._models.values()]
+		total_bytes = sum(self._nbytes(p) for p in self._params.values())
+		for evict_name in list(self._params):
+			if total_bytes <= self.max_bytes:
+				break
+			if evict_name != keep_name and not any(self._params[evict_name] is p for p in pinned):
+				# Predictions in progress keep their reference until they finish.
+				total_bytes -= self._nbytes(self._params.pop(evict_name))
+
+	def get(self, name):
+		"""Returns the `MT3` of the model type of `name` and the parameters of `name`, loading them if needed."""
+		with self._lock:
+			model_path, model_type = self._model_paths[name]
+			model = self._models[model_type]
+			if name in self._params:
+				self._params.move_to_end(name)
+				return model, self._params[name]
+			future, load = self._claim(self._loading_params, name)
+		if not load:
+			return model, future.result()
+		def store(params):
+			self._params[name] = params
+			self._evict(name)
+		return model, self._load(self._loading_params, name, future, lambda: model._restore_train_state(model_path).params, store)
+
+	def predict(self, name, audio_path, seed=0, output_file="output.mid"):
+		model, params = self.get(name)
+		return model.predict(audio_path, seed=seed, output_file=output_file, params=params)
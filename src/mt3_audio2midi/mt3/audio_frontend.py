@@ -0,0 +1,151 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Audio framing and log-mel spectrograms in NumPy.
+
+Matches `spectrograms.split_audio` and `spectrograms.compute_spectrogram`
+(`tf.signal.stft` with a periodic Hann window and end padding, followed by
+`tf.signal.linear_to_mel_weight_matrix`) without importing TensorFlow.
+"""
+
+import dataclasses
+import functools
+
+import numpy as np
+
+# defaults for spectrogram config
+DEFAULT_SAMPLE_RATE = 16000
+DEFAULT_HOP_WIDTH = 128
+DEFAULT_NUM_MEL_BINS = 512
+
+# fixed constants; add these to SpectrogramConfig before changing
+FFT_SIZE = 2048
+MEL_LO_HZ = 20.0
+# Default upper edge of `spectral_ops.compute_logmel`.
+MEL_HI_HZ = 7600.0
+
+# Number of STFT frames transformed at once, to bound memory for long audio.
+_STFT_CHUNK_FRAMES = 1024
+
+
+@dataclasses.dataclass
+class SpectrogramConfig:
+  """Spectrogram configuration parameters."""
+  sample_rate: int = DEFAULT_SAMPLE_RATE
+  hop_width: int = DEFAULT_HOP_WIDTH
+  num_mel_bins: int = DEFAULT_NUM_MEL_BINS
+
+  @property
+  def abbrev_str(self):
+    s = ''
+    if self.sample_rate != DEFAULT_SAMPLE_RATE:
+      s += 'sr%d' % self.sample_rate
+    if self.hop_width != DEFAULT_HOP_WIDTH:
+      s += 'hw%d' % self.hop_width
+    if self.num_mel_bins != DEFAULT_NUM_MEL_BINS:
+      s += 'mb%d' % self.num_mel_bins
+    return s
+
+  @property
+  def frames_per_second(self):
+    return self.sample_rate / self.hop_width
+
+
+def split_audio(
+    samples: np.ndarray, spectrogram_config: SpectrogramConfig
+) -> np.ndarray:
+  """Split audio into frames of `hop_width` samples, zero padding the end."""
+  hop_width = spectrogram_config.hop_width
+  num_frames = -(-len(samples) // hop_width)
+  samples = np.pad(samples, [0, num_frames * hop_width - len(samples)])
+  return samples.reshape(num_frames, hop_width)
+
+
+def _hz_to_mel(frequencies_hz):
+  return 1127.0 * np.log1p(frequencies_hz / 700.0)
+
+
+@functools.lru_cache(maxsize=None)
+def mel_weight_matrix(
+    num_mel_bins: int,
+    num_spectrogram_bins: int,
+    sample_rate: int,
+    lower_edge_hertz: float,
+    upper_edge_hertz: float
+) -> np.ndarray:
+  """Like `tf.signal.linear_to_mel_weight_matrix`, in float32."""
+  # The DC bin is excluded from all mel bands, as in TensorFlow.
+  linear_frequencies = np.linspace(
+      0.0, sample_rate / 2.0, num_spectrogram_bins, dtype=np.float32)[1:]
+  spectrogram_bins_mel = _hz_to_mel(linear_frequencies)[:, np.newaxis]
+  band_edges_mel = np.linspace(
+      _hz_to_mel(np.float32(lower_edge_hertz)),
+      _hz_to_mel(np.float32(upper_edge_hertz)),
+      num_mel_bins + 2, dtype=np.float32)
+  lower_edge_mel = band_edges_mel[:-2]
+  center_mel = band_edges_mel[1:-1]
+  upper_edge_mel = band_edges_mel[2:]
+  lower_slopes = ((spectrogram_bins_mel - lower_edge_mel) /
+                  (center_mel - lower_edge_mel))
+  upper_slopes = ((upper_edge_mel - spectrogram_bins_mel) /
+                  (upper_edge_mel - center_mel))
+  mel_weights = np.maximum(0.0, np.minimum(lower_slopes, upper_slopes))
+  mel_weights = np.pad(mel_weights, [[1, 0], [0, 0]]).astype(np.float32)
+  mel_weights.flags.writeable = False
+  return mel_weights
+
+
+@functools.lru_cache(maxsize=None)
+def _periodic_hann_window(size: int) -> np.ndarray:
+  window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(size) / size)).astype(
+      np.float32)
+  window.flags.writeable = False
+  return window
+
+
+def compute_spectrogram(
+    samples: np.ndarray, spectrogram_config: SpectrogramConfig
+) -> np.ndarray:
+  """Compute a log-mel spectrogram, with one frame per `hop_width` samples.
+
+  Args:
+    samples: 1d float array of audio samples.
+    spectrogram_config: Spectrogram configuration.
+
+  Returns:
+    float32 array of shape (ceil(len(samples) / hop_width), num_mel_bins).
+  """
+  hop_width = spectrogram_config.hop_width
+  samples = np.asarray(samples, np.float32)
+  num_frames = -(-len(samples) // hop_width)
+  samples = np.pad(
+      samples, [0, max(0, (num_frames - 1) * hop_width + FFT_SIZE -
+                       len(samples))])
+  window = _periodic_hann_window(FFT_SIZE)
+  mel_weights = mel_weight_matrix(
+      spectrogram_config.num_mel_bins, FFT_SIZE // 2 + 1,
+      spectrogram_config.sample_rate, MEL_LO_HZ, MEL_HI_HZ)
+  frames = np.lib.stride_tricks.sliding_window_view(
+      samples, FFT_SIZE)[::hop_width][:num_frames]
+  logmel = np.empty((num_frames, spectrogram_config.num_mel_bins), np.float32)
+  for start in range(0, num_frames, _STFT_CHUNK_FRAMES):
+    chunk = frames[start:start + _STFT_CHUNK_FRAMES] * window
+    magnitudes = np.abs(np.fft.rfft(chunk, n=FFT_SIZE)).astype(np.float32)
+    mel = magnitudes @ mel_weights
+    logmel[start:start + len(chunk)] = np.log(np.where(mel <= 0, 1e-5, mel))
+  return logmel
+
+
+def input_depth(spectrogram_config):
+  return spectrogram_config.num_mel_bins
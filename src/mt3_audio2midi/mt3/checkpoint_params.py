@@ -0,0 +1,142 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reads model parameters from T5X checkpoints without TensorFlow.
+
+`t5x.checkpoints` restores whole train states (parameters and optimizer
+state) and imports TensorFlow, seqio and orbax to do so. Inference only needs
+the parameters, which this reads from the checkpoint msgpack file and its
+TensorStore arrays into NumPy arrays.
+"""
+
+import copy
+import os
+import re
+
+from typing import Any, Mapping, MutableMapping, Optional
+
+from absl import logging
+from etils import epath
+from flax import serialization
+import numpy as np
+import tensorstore as ts
+
+PyTree = Any
+
+_CHECKPOINT_FILE = 'checkpoint'
+# Subdirectory of checkpoints with a separate (e.g. dataset) state.
+_STATE_DIR = 'state'
+
+
+def find_checkpoint_file(path: str) -> str:
+  """Path of the msgpack file of a checkpoint directory or file."""
+  checkpoint_path = epath.Path(path)
+  if checkpoint_path.is_dir():
+    if (checkpoint_path / _STATE_DIR).is_dir():
+      checkpoint_path = checkpoint_path / _STATE_DIR
+    checkpoint_path = checkpoint_path / _CHECKPOINT_FILE
+  if not checkpoint_path.exists() or checkpoint_path.is_dir():
+    raise ValueError(f'Path is not a valid T5X checkpoint: {path}')
+  return os.fspath(checkpoint_path)
+
+
+def _is_ts_spec(value: Any) -> bool:
+  return isinstance(value, Mapping) and 'driver' in value and (
+      'metadata' in value)
+
+
+def _absolute_ts_spec(
+    ts_spec: Mapping[str, Any], checkpoint_dir: str
+) -> MutableMapping[str, Any]:
+  """TensorStore spec with its path relative to the checkpoint directory."""
+  ts_spec = copy.deepcopy(ts_spec)
+  # Chunking and compression are read from the stored metadata, so that arrays
+  # written with other settings can be opened.
+  ts_spec['metadata'].pop('chunks', None)
+  ts_spec['metadata'].pop('compressor', None)
+  if 'kvstore' in ts_spec:
+    relative_path = ts_spec['kvstore']['path']
+  else:
+    # tensorstore<0.1.14 format
+    relative_path = ts_spec.pop('path')
+  m = re.fullmatch('^gs://([^/]*)/(.*)$', checkpoint_dir, re.DOTALL)
+  if m is not None:
+    ts_spec['kvstore'] = {
+        'driver': 'gcs',
+        'bucket': m.group(1),
+        'path': os.path.join(m.group(2), relative_path),
+    }
+  else:
+    ts_spec['kvstore'] = {
+        'driver': 'file',
+        'path': os.path.join(checkpoint_dir, relative_path),
+    }
+  return ts_spec
+
+
+def load_params(
+    path: str, dtype: Optional[Any] = None, key: str = 'target'
+) -> PyTree:
+  """Reads the parameters of a T5X checkpoint.
+
+  Args:
+    path: Checkpoint directory (e.g. `.../checkpoint_400000`) or its msgpack
+        file.
+    dtype: Optional dtype to cast floating point parameters to.
+    key: Subtree of the optimizer state to read; `target` holds the model
+        parameters.
+
+  Returns:
+    Nested dict of NumPy arrays, as passed to `module.apply` as `params`.
+  """
+  checkpoint_file = find_checkpoint_file(path)
+  checkpoint_dir = os.path.dirname(checkpoint_file)
+  logging.info('Reading parameters from checkpoint: %s', checkpoint_file)
+  contents = serialization.msgpack_restore(
+      epath.Path(checkpoint_file).read_bytes())
+  if contents.get('version', 0) == 0:
+    state = contents
+  else:
+    state = contents['optimizer']
+  params = state[key]
+
+  # Start all reads before waiting on any of them; TensorStore reads run on
+  # its own thread pool.
+  reads = {}
+
+  def start_reads(tree, prefix):
+    for name, value in tree.items():
+      if _is_ts_spec(value):
+        reads[prefix + (name,)] = ts.open(
+            _absolute_ts_spec(value, checkpoint_dir), open=True)
+      elif isinstance(value, Mapping):
+        start_reads(value, prefix + (name,))
+
+  start_reads(params, ())
+  reads = {name: future.result().read() for name, future in reads.items()}
+
+  def finish(tree, prefix):
+    out = {}
+    for name, value in tree.items():
+      if prefix + (name,) in reads:
+        value = reads[prefix + (name,)].result()
+      elif isinstance(value, Mapping):
+        value = finish(value, prefix + (name,))
+      if (dtype is not None and isinstance(value, np.ndarray) and
+          np.issubdtype(value.dtype, np.floating)):
+        value = value.astype(dtype, copy=False)
+      out[name] = value
+    return out
+
+  return finish(params, ())
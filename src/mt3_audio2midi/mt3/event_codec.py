@@ -15,7 +15,10 @@
 """Encode and decode events."""
 
 import dataclasses
-from typing import List, Tuple
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from absl import logging
+import numpy as np
 
 
 @dataclasses.dataclass
@@ -110,3 +113,87 @@ class Codec:
       offset += er.max_value - er.min_value + 1
 
     raise ValueError(f'Unknown event index: {index}')
+
+
+# These should be type variables, but unfortunately those are incompatible with
+# dataclasses.
+EventData = Any
+EncodingState = Any
+DecodingState = Any
+DecodeResult = Any
+
+DS = TypeVar('DS', bound=DecodingState)
+
+
+@dataclasses.dataclass
+class EventEncodingSpec:
+  """Spec for encoding events."""
+  # initialize encoding state
+  init_encoding_state_fn: Callable[[], EncodingState]
+  # convert EventData into zero or more events, updating encoding state
+  encode_event_fn: Callable[[EncodingState, EventData, Codec], Sequence[Event]]
+  # convert encoding state (at beginning of segment) into events
+  encoding_state_to_events_fn: Optional[
+      Callable[[EncodingState], Sequence[Event]]]
+  # create empty decoding state
+  init_decoding_state_fn: Callable[[], DecodingState]
+  # update decoding state when entering new segment
+  begin_decoding_segment_fn: Callable[[DecodingState], None]
+  # consume time and Event and update decoding state
+  decode_event_fn: Callable[[DecodingState, float, Event, Codec], None]
+  # flush decoding state into result
+  flush_decoding_state_fn: Callable[[DecodingState], DecodeResult]
+
+
+def decode_events(
+    state: DS,
+    tokens: np.ndarray,
+    start_time: int,
+    max_time: Optional[int],
+    codec: Codec,
+    decode_event_fn: Callable[[DS, float, Event, Codec], None],
+) -> Tuple[int, int]:
+  """Decode a series of tokens, maintaining a decoding state object.
+
+  Args:
+    state: Decoding state object; will be modified in-place.
+    tokens: event tokens to convert.
+    start_time: offset start time if decoding in the middle of a sequence.
+    max_time: Events at or beyond this time will be dropped.
+    codec: A Codec object that maps indices to Event objects.
+    decode_event_fn: Function that consumes an Event (and the current time) and
+        updates the decoding state.
+
+  Returns:
+    invalid_events: number of events that could not be decoded.
+    dropped_events: number of events dropped due to max_time restriction.
+  """
+  invalid_events = 0
+  dropped_events = 0
+  cur_steps = 0
+  cur_time = start_time
+  token_idx = 0
+  for token_idx, token in enumerate(tokens):
+    try:
+      event = codec.decode_event_index(token)
+    except ValueError:
+      invalid_events += 1
+      continue
+    if event.type == 'shift':
+      cur_steps += event.value
+      cur_time = start_time + cur_steps / codec.steps_per_second
+      if max_time and cur_time > max_time:
+        dropped_events = len(tokens) - token_idx
+        break
+    else:
+      cur_steps = 0
+      try:
+        decode_event_fn(state, cur_time, event, codec)
+      except ValueError:
+        invalid_events += 1
+        logging.info(
+            'Got invalid event when decoding event %s at time %f. '
+            'Invalid event counter now at %d.',
+            event, cur_time, invalid_events, exc_info=True)
+        continue
+  return invalid_events, dropped_events
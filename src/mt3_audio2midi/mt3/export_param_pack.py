@@ -0,0 +1,49 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Exports the parameters of a T5X checkpoint as a param pack.
+
+Usage:
+python -m mt3_audio2midi.mt3.export_param_pack \
+  --checkpoint=/path/to/mt3/checkpoint --output=/path/to/mt3.params
+"""
+
+from typing import Sequence
+
+from absl import app
+from absl import flags
+from absl import logging
+
+from mt3_audio2midi.mt3 import checkpoint_params
+from mt3_audio2midi.mt3 import param_pack
+
+_CHECKPOINT = flags.DEFINE_string(
+    'checkpoint', None, 'T5X checkpoint directory to export.', required=True)
+_OUTPUT = flags.DEFINE_string(
+    'output', None, 'Path of the param pack to write.', required=True)
+_DTYPE = flags.DEFINE_string(
+    'dtype', 'float32', 'Dtype of the floating point parameters.')
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  params = checkpoint_params.load_params(_CHECKPOINT.value, dtype=_DTYPE.value)
+  param_pack.write_param_pack(
+      _OUTPUT.value, params, metadata={'checkpoint': _CHECKPOINT.value})
+  logging.info('Wrote param pack %s', _OUTPUT.value)
+
+
+if __name__ == '__main__':
+  app.run(main)
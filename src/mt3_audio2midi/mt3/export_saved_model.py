@@ -0,0 +1,263 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Exports MT3 as a TF SavedModel, from audio frames to decoded tokens.
+
+The exported signature takes a batch of segments of raw 16 kHz audio,
+`audio_frames` of shape [batch, inputs_length, hop_width] as split by
+`audio_frontend.split_audio`, and returns the decoded `tokens` of shape
+[batch, decode_length] (event indices of the codec, -1 from EOS on, as
+`TokenVocabulary.decode_np`) and their `lengths`. A partial last segment is
+zero padded; unlike in `infer.Transcriber`, its padding is transcribed as
+silence rather than as zero spectrogram frames.
+
+The log-mel spectrogram, the encoder and greedy decoding are one serialized
+StableHLO function with a polymorphic batch dimension, so the model can be
+served (e.g. by TF Serving) without this package; each batch size compiles
+once. Warmup requests for `--warmup_batch_sizes` are written to
+`assets.extra`, along with `mt3_config.json`, which describes the input
+framing and the event ranges of the token codec.
+
+Usage:
+python -m mt3_audio2midi.mt3.export_saved_model \
+  --checkpoint=/path/to/mt3/checkpoint --output_dir=/path/to/mt3_saved_model/1
+"""
+
+import functools
+import json
+import os
+from typing import Any, Mapping, Optional, Sequence
+
+from absl import app
+from absl import flags
+from absl import logging
+from jax.experimental import jax2tf
+import jax.numpy as jnp
+
+from mt3_audio2midi import infer
+from mt3_audio2midi.mt3 import audio_frontend
+from mt3_audio2midi.mt3 import model_config
+from mt3_audio2midi.mt3 import network
+from mt3_audio2midi.mt3 import param_pack
+from mt3_audio2midi.mt3 import quantize
+from mt3_audio2midi.mt3 import token_vocabulary
+from mt3_audio2midi.t5x import export_lib
+
+import numpy as np
+import tensorflow as tf
+
+_CHECKPOINT = flags.DEFINE_string(
+    'checkpoint', None, 'T5X checkpoint or param pack to export.',
+    required=True)
+_OUTPUT_DIR = flags.DEFINE_string(
+    'output_dir', None, 'Directory of the SavedModel to write, usually '
+    '${BASE}/${VERSION} for TF Serving.', required=True)
+_MODEL_TYPE = flags.DEFINE_enum(
+    'model_type', 'mt3', list(model_config.MODEL_TYPES),
+    'Model type of --checkpoint.')
+_MODEL_NAME = flags.DEFINE_string(
+    'model_name', 'mt3', 'Model name of the warmup requests.')
+_DECODE_LENGTH = flags.DEFINE_integer(
+    'decode_length', None,
+    'Maximum number of decoded tokens per segment; defaults to the targets '
+    'length of the model type.')
+_WARMUP_BATCH_SIZES = flags.DEFINE_list(
+    'warmup_batch_sizes', ['1', '8'],
+    'Batch sizes to write warmup requests for.')
+_PLATFORMS = flags.DEFINE_list(
+    'platforms', ['cpu'],
+    'Platforms to lower the model for, a subset of cpu, cuda, rocm and tpu.')
+
+INPUT_NAME = 'audio_frames'
+CONFIG_ASSET = 'mt3_config.json'
+
+PyTree = Any
+
+
+def compute_spectrograms(audio_frames: jnp.ndarray,
+                         spectrogram_config: audio_frontend.SpectrogramConfig
+                         ) -> jnp.ndarray:
+  """`audio_frontend.compute_spectrogram` of a batch of segments, in JAX.
+
+  Args:
+    audio_frames: float32 array of shape [batch, num_frames, hop_width].
+    spectrogram_config: Spectrogram configuration.
+
+  Returns:
+    float32 array of shape [batch, num_frames, num_mel_bins].
+  """
+  num_frames, hop_width = audio_frames.shape[1:]
+  fft_size = audio_frontend.FFT_SIZE
+  samples = audio_frames.reshape(audio_frames.shape[0], num_frames * hop_width)
+  samples = jnp.pad(samples, [(0, 0), (0, fft_size - hop_width)])
+  window_indices = (np.arange(num_frames)[:, np.newaxis] * hop_width +
+                    np.arange(fft_size))
+  windows = samples[:, window_indices] * audio_frontend._periodic_hann_window(  # pylint: disable=protected-access
+      fft_size)
+  magnitudes = jnp.abs(jnp.fft.rfft(windows, n=fft_size))
+  mel = magnitudes @ audio_frontend.mel_weight_matrix(
+      spectrogram_config.num_mel_bins, fft_size // 2 + 1,
+      spectrogram_config.sample_rate, audio_frontend.MEL_LO_HZ,
+      audio_frontend.MEL_HI_HZ)
+  return jnp.log(jnp.where(mel <= 0, 1e-5, mel))
+
+
+def transcribe_frames(module: network.Transformer,
+                      vocabulary: token_vocabulary.TokenVocabulary,
+                      spectrogram_config: audio_frontend.SpectrogramConfig,
+                      decode_length: int, params: PyTree,
+                      features: Mapping[str, jnp.ndarray]
+                      ) -> Mapping[str, jnp.ndarray]:
+  """Spectrograms, greedy decoding and token decoding of audio segments."""
+  encoder_input_tokens = compute_spectrograms(
+      features[INPUT_NAME], spectrogram_config)
+  decoder_input_tokens = jnp.zeros(
+      (encoder_input_tokens.shape[0], decode_length), jnp.int32)
+  ids = infer._predict(  # pylint: disable=protected-access
+      module, vocabulary.eos_id, params, encoder_input_tokens,
+      decoder_input_tokens)
+  # As `TokenVocabulary.decode_np`.
+  # pylint: disable=protected-access
+  num_special_tokens = vocabulary._num_special_tokens
+  base_vocab_size = vocabulary._base_vocab_size
+  # pylint: enable=protected-access
+  is_eos = ids == vocabulary.eos_id
+  eos_and_after = jnp.cumsum(is_eos, axis=-1) > 0
+  tokens = jnp.where(
+      eos_and_after, token_vocabulary.DECODED_EOS_ID,
+      jnp.where((ids >= num_special_tokens) & (ids < base_vocab_size),
+                ids - num_special_tokens,
+                token_vocabulary.DECODED_INVALID_ID)).astype(jnp.int32)
+  lengths = jnp.where(is_eos.any(axis=-1), jnp.argmax(is_eos, axis=-1),
+                      decode_length).astype(jnp.int32)
+  return {'tokens': tokens, 'lengths': lengths}
+
+
+def create_preprocessor(config: model_config.ModelConfig):
+  """The preprocessor (which only names the input) and its signature."""
+  input_signature = (tf.TensorSpec(
+      [None, config.inputs_length, config.spectrogram_config.hop_width],
+      tf.float32, name=INPUT_NAME),)
+
+  def preprocess(audio_frames: tf.Tensor) -> Mapping[str, tf.Tensor]:
+    return {INPUT_NAME: audio_frames}
+
+  return preprocess, input_signature
+
+
+def export_config(config: model_config.ModelConfig,
+                  decode_length: int) -> Mapping[str, Any]:
+  """What a client needs to frame audio and read the exported tokens."""
+  codec = token_vocabulary.build_codec(config.vocab_config)
+  spectrogram_config = config.spectrogram_config
+  return {
+      'model_type': config.model_type,
+      'sample_rate': spectrogram_config.sample_rate,
+      'hop_width': spectrogram_config.hop_width,
+      'inputs_length': config.inputs_length,
+      'decode_length': decode_length,
+      'use_ties': config.use_ties,
+      'steps_per_second': codec.steps_per_second,
+      'event_ranges': [
+          {'type': er.type, 'min_value': er.min_value,
+           'max_value': er.max_value}
+          for er in codec._event_ranges],  # pylint: disable=protected-access
+      'decoded_eos_id': token_vocabulary.DECODED_EOS_ID,
+      'decoded_invalid_id': token_vocabulary.DECODED_INVALID_ID,
+  }
+
+
+def save(*,
+         model_path: str,
+         output_dir: str,
+         model_type: str = 'mt3',
+         model_name: str = 'mt3',
+         decode_length: Optional[int] = None,
+         warmup_batch_sizes: Sequence[int] = (1, 8),
+         platforms: Sequence[str] = ('cpu',)) -> None:
+  """Exports a checkpoint or param pack as a batch polymorphic SavedModel.
+
+  Args:
+    model_path: T5X checkpoint or param pack; quantized param packs are
+      exported in `int8` mode.
+    output_dir: Directory of the SavedModel.
+    model_type: `mt3` or `ismir2021`.
+    model_name: Model name of the warmup requests.
+    decode_length: Maximum number of decoded tokens per segment; defaults to
+      the targets length.
+    warmup_batch_sizes: Batch sizes to write warmup requests for.
+    platforms: Platforms to lower the model for.
+  """
+  config = model_config.load_model_config(model_type)
+  decode_length = decode_length or config.targets_length
+  vocabulary = token_vocabulary.vocabulary_from_codec(
+      token_vocabulary.build_codec(config.vocab_config))
+  params = param_pack.load_params(model_path)
+  quantization = 'int8' if quantize.is_quantized(params) else None
+  module = network.Transformer(config=network.T5Config(
+      vocab_size=token_vocabulary.num_embeddings(vocabulary),
+      quantization=quantization, **config.t5_config))
+
+  preprocessor, input_signature = create_preprocessor(config)
+  model_fn = jax2tf.convert(
+      functools.partial(transcribe_frames, module, vocabulary,
+                        config.spectrogram_config, decode_length),
+      polymorphic_shapes=[
+          None,
+          export_lib.create_batch_polymorphic_shapes(
+              input_signature, preprocessor)],
+      native_serialization_platforms=list(platforms))
+  exportable_module = export_lib.ExportableModule(
+      preproc_tf_fn=preprocessor,
+      model_tf_fn=model_fn,
+      postproc_tf_fn=lambda outputs: outputs,
+      params=params,
+      batch_size=None)
+  signature_name = tf.saved_model.DEFAULT_SERVING_SIGNATURE_DEF_KEY
+  signatures = {
+      signature_name:
+          exportable_module.__call__.get_concrete_function(*input_signature)
+  }
+  logging.info('Saving the model to %s...', output_dir)
+  tf.saved_model.save(exportable_module, output_dir, signatures=signatures)
+
+  warmup_frames = np.zeros(input_signature[0].shape[1:], np.float32).tolist()
+  export_lib.write_warmup_examples(
+      [warmup_frames],
+      output_dir=output_dir,
+      model_name=model_name,
+      signature_name=signature_name,
+      batch_sizes=list(warmup_batch_sizes),
+      input_tensor_name=INPUT_NAME,
+      input_tensor_dtype=tf.float32)
+  with tf.io.gfile.GFile(
+      os.path.join(output_dir, 'assets.extra', CONFIG_ASSET), 'w') as f:
+    f.write(json.dumps(export_config(config, decode_length), indent=2))
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  save(model_path=_CHECKPOINT.value,
+       output_dir=_OUTPUT_DIR.value,
+       model_type=_MODEL_TYPE.value,
+       model_name=_MODEL_NAME.value,
+       decode_length=_DECODE_LENGTH.value,
+       warmup_batch_sizes=[int(size) for size in _WARMUP_BATCH_SIZES.value],
+       platforms=_PLATFORMS.value)
+  logging.info('Exported %s to %s', _CHECKPOINT.value, _OUTPUT_DIR.value)
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,640 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Transcription training tasks on random-access (Grain) data sources.
+
+These mirror the training tasks registered with seqio in `tasks.py`, but read
+ArrayRecord copies of the dataset files and run every preprocessing step as a
+lazy per-example map. Because examples are addressed by index, shuffling is a
+global permutation of indices rather than a shuffle buffer of decoded audio,
+and iteration is deterministic and checkpointable for a given seed.
+
+Audio mixing selects the other examples of a mix by index from the same
+random-access dataset, rather than from separately batched copies of a
+shuffled stream.
+
+Unlike the seqio tasks there is no cache placeholder: random chunks are
+selected from the full example rather than from pre-split 2000-frame pieces.
+Inference eval tasks (which split examples into many segments and compute
+metrics) remain seqio-only.
+"""
+
+import dataclasses
+import functools
+import json
+import time
+from typing import (Any, Callable, Mapping, MutableMapping, Optional,
+                    Sequence, Union)
+
+from absl import logging
+import gin
+import jax
+from jax.experimental import multihost_utils
+from mt3_audio2midi.airio import core as airio_core
+from mt3_audio2midi.airio import pygrain as airio
+from mt3_audio2midi.airio import pygrain_common as airio_common
+from mt3_audio2midi.mt3 import datasets
+from mt3_audio2midi.mt3 import event_codec
+from mt3_audio2midi.mt3 import mixing
+from mt3_audio2midi.mt3 import preprocessors
+from mt3_audio2midi.mt3 import run_length_encoding
+from mt3_audio2midi.mt3 import spectrograms
+from mt3_audio2midi.mt3 import tasks
+from mt3_audio2midi.mt3 import vocabularies
+from mt3_audio2midi.t5x import utils
+
+from array_record.python import array_record_module
+import grain.python as grain
+import numpy as np
+import tensorflow as tf
+
+# Keys that are chunked along with the audio frames.
+_CHUNK_FEATURE_KEYS = (
+    'inputs', 'input_event_start_indices', 'input_event_end_indices',
+    'input_state_event_indices')
+
+
+def array_record_filepattern(tfrecord_filepattern: str) -> str:
+  """Return the ArrayRecord file pattern for a dataset TFRecord pattern."""
+  return tfrecord_filepattern.replace('.tfrecord', '.array_record')
+
+
+def convert_tfrecords_to_array_records(tfrecord_filepattern: str) -> None:
+  """Write an ArrayRecord copy next to each TFRecord file matching a pattern."""
+  for path in sorted(tf.io.gfile.glob(tfrecord_filepattern)):
+    writer = array_record_module.ArrayRecordWriter(
+        array_record_filepattern(path), 'group_size:1')
+    for record in tf.data.TFRecordDataset(path).as_numpy_iterator():
+      writer.write(record)
+    writer.close()
+
+
+def parse_example(
+    serialized: bytes,
+    features: Mapping[str, Union[tf.io.FixedLenFeature,
+                                 tf.io.FixedLenSequenceFeature]]
+) -> MutableMapping[str, Any]:
+  """Parse a serialized tf.train.Example into a dict of numpy values."""
+  ex = tf.io.parse_single_example(serialized, features)
+  return {k: v.numpy() for k, v in ex.items()}
+
+
+def select_random_chunk(
+    ex: MutableMapping[str, Any],
+    rng: jax.Array,
+    runtime_args: airio.AirIOInjectedRuntimeArgs,
+    feature_key: str = 'inputs',
+    additional_feature_keys: Sequence[str] = _CHUNK_FEATURE_KEYS[1:],
+    passthrough_feature_keys: Sequence[str] = ('targets', 'state_events')
+) -> MutableMapping[str, Any]:
+  """Select a random chunk of frames, with a uniformly random start.
+
+  Equivalent to `t5.data.preprocessors.select_random_chunk` with
+  `uniform_random_start=True`: the start is drawn from
+  [-max_length + 1, num_frames), so every frame is equally likely to be
+  included in the chunk.
+
+  Args:
+    ex: Example to chunk.
+    rng: JAX PRNG key.
+    runtime_args: Runtime args; the chunk length is the sequence length of
+        `feature_key`.
+    feature_key: Feature to chunk.
+    additional_feature_keys: Features chunked the same as `feature_key`.
+    passthrough_feature_keys: Features to pass through unchanged.
+
+  Returns:
+    The features of the selected chunk.
+  """
+  max_length = runtime_args.sequence_lengths[feature_key]
+  num_frames = len(ex[feature_key])
+  start = int(jax.random.randint(rng, [], -max_length + 1, num_frames))
+  end = min(start + max_length, num_frames)
+  start = max(start, 0)
+  chunk = {k: ex[k][start:end]
+           for k in [feature_key, *additional_feature_keys]}
+  chunk.update({k: ex[k] for k in passthrough_feature_keys})
+  return chunk
+
+
+def extract_target_sequence_with_indices(
+    ex: MutableMapping[str, Any],
+    state_events_end_token: Optional[int] = None
+) -> MutableMapping[str, Any]:
+  """See `run_length_encoding.extract_target_sequence_with_indices`."""
+  target_start_idx = ex['input_event_start_indices'][0]
+  target_end_idx = ex['input_event_end_indices'][-1]
+
+  ex['targets'] = ex['targets'][target_start_idx:target_end_idx]
+
+  if state_events_end_token is not None:
+    # Extract the state events corresponding to the audio start token, and
+    # prepend them to the targets array.
+    state_event_start_idx = ex['input_state_event_indices'][0]
+    state_event_end_idx = state_event_start_idx + 1
+    while ex['state_events'][state_event_end_idx - 1] != state_events_end_token:
+      state_event_end_idx += 1
+    ex['targets'] = np.concatenate([
+        ex['state_events'][state_event_start_idx:state_event_end_idx],
+        ex['targets']
+    ])
+
+  return ex
+
+
+def map_midi_programs(
+    ex: MutableMapping[str, Any],
+    codec: event_codec.Codec,
+    granularity_type: str = 'full'
+) -> MutableMapping[str, Any]:
+  """See `preprocessors.map_midi_programs`."""
+  granularity = vocabularies.PROGRAM_GRANULARITIES[granularity_type]
+  ex['targets'] = np.asarray(
+      granularity.tokens_map_fn(ex['targets'], codec), np.int32)
+  return ex
+
+
+class MixTranscriptionExamplesMapDataset(grain.MapDataset):
+  """Mixes each example with random other examples from the same dataset.
+
+  The number of examples in each mix is uniform in [1, max_examples_per_mix]
+  and the other examples are chosen uniformly by index, both determined by the
+  base rng and the index of the first example.
+  """
+
+  def __init__(
+      self,
+      parent: grain.MapDataset,
+      codec: event_codec.Codec,
+      max_examples_per_mix: int,
+      base_rng: jax.Array
+  ):
+    super().__init__([parent])
+    self.parent = parent
+    self.codec = codec
+    self.max_examples_per_mix = max_examples_per_mix
+    self.base_rng = base_rng
+
+  def __len__(self) -> int:
+    return len(self.parent)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return self.slice(index)
+    ex = self.parent[index]
+    if ex is None:
+      return None
+    rng = jax.random.fold_in(self.base_rng, index)
+    num_rng, indices_rng = jax.random.split(rng)
+    num_examples = int(jax.random.randint(
+        num_rng, (), 1, self.max_examples_per_mix + 1))
+    other_indices = np.asarray(jax.random.randint(
+        indices_rng, (num_examples - 1,), 0, len(self.parent)))
+    # Examples dropped by earlier filters are left out of the mix.
+    examples = [ex] + [
+        other for other in (self.parent[i] for i in other_indices)
+        if other is not None]
+    # A single example is still normalized, as in the tf.data mixing.
+    return mixing.mix_examples(examples, codec=self.codec)
+
+
+@gin.configurable
+def mix_transcription_examples(
+    ds: grain.MapDataset,
+    runtime_args: airio.AirIOInjectedRuntimeArgs,
+    rng: Optional[jax.Array],
+    codec: event_codec.Codec,
+    max_examples_per_mix: Optional[int] = None
+) -> grain.MapDataset:
+  """See `mixing.mix_transcription_examples`."""
+  del runtime_args
+  if max_examples_per_mix is None:
+    return ds
+  if rng is None:
+    rng = jax.random.key(0)
+  return MixTranscriptionExamplesMapDataset(
+      ds, codec=codec, max_examples_per_mix=max_examples_per_mix,
+      base_rng=rng)
+
+
+def map_targets(
+    ex: MutableMapping[str, Any],
+    fn: Callable[[np.ndarray], np.ndarray]
+) -> MutableMapping[str, Any]:
+  """Applies a NumPy function, e.g. from `run_length_encoding`, to targets."""
+  ex['targets'] = fn(ex['targets'])
+  return ex
+
+
+def compute_spectrograms(
+    ex: MutableMapping[str, Any],
+    spectrogram_config: spectrograms.SpectrogramConfig
+) -> MutableMapping[str, Any]:
+  """See `preprocessors.compute_spectrograms`; does not keep raw inputs."""
+  samples = np.reshape(ex['inputs'], [-1])
+  ex['inputs'] = spectrograms.compute_spectrogram(
+      samples, spectrogram_config).numpy()
+  return ex
+
+
+def is_not_empty(ex: Mapping[str, Any]) -> bool:
+  """Record tokenizers return an empty dict for examples to be dropped."""
+  return bool(ex)
+
+
+def _max_length_for_key(
+    runtime_args: airio.AirIOInjectedRuntimeArgs, key: str) -> int:
+  max_length = runtime_args.sequence_lengths[key]
+  if key == 'targets':
+    # Leave room to insert an EOS token.
+    max_length -= 1
+  return max_length
+
+
+def is_not_too_long(
+    ex: Mapping[str, Any],
+    runtime_args: airio.AirIOInjectedRuntimeArgs
+) -> bool:
+  """Whether all features fit in their sequence lengths."""
+  return all(len(ex[k]) <= _max_length_for_key(runtime_args, k)
+             for k in runtime_args.sequence_lengths if k in ex)
+
+
+def assert_not_too_long(
+    ex: Mapping[str, Any],
+    runtime_args: airio.AirIOInjectedRuntimeArgs
+) -> Mapping[str, Any]:
+  """Raise an error if any feature exceeds its sequence length."""
+  for k in runtime_args.sequence_lengths:
+    if k in ex and len(ex[k]) > _max_length_for_key(runtime_args, k):
+      raise ValueError(f'Value for "{k}" field exceeds maximum length')
+  return ex
+
+
+def construct_transcription_task(
+    dataset_config: datasets.DatasetConfig,
+    spectrogram_config: spectrograms.SpectrogramConfig,
+    vocab_config: vocabularies.VocabularyConfig,
+    tokenize_fn: Callable[..., Mapping[str, Any]],
+    onsets_only: bool,
+    include_ties: bool,
+    skip_too_long: bool = False,
+    program_granularity: str = 'full'
+) -> airio.GrainTask:
+  """Construct a note transcription training task.
+
+  The task has 'train' and 'eval' splits, like the seqio training task added
+  by `tasks.add_transcription_task_to_registry`, read from the ArrayRecord
+  copies of the corresponding files (see `convert_tfrecords_to_array_records`).
+
+  Args:
+    dataset_config: Dataset configuration.
+    spectrogram_config: Spectrogram configuration.
+    vocab_config: Vocabulary configuration.
+    tokenize_fn: Per-record tokenizer, e.g.
+        `preprocessors.tokenize_transcription_record`.
+    onsets_only: If True, include only onset events.
+    include_ties: If True, include tie events.
+    skip_too_long: If True, drop examples whose targets are too long instead of
+        raising an error.
+    program_granularity: Key into `vocabularies.PROGRAM_GRANULARITIES`.
+
+  Returns:
+    A GrainTask.
+  """
+  codec = vocabularies.build_codec(vocab_config)
+  vocabulary = vocabularies.vocabulary_from_codec(codec)
+  tie_token = codec.encode_event(event_codec.Event('tie', 0))
+
+  task_name = 'onsets' if onsets_only else 'notes'
+  if include_ties:
+    task_name += '_ties'
+  train_task_name = tasks.construct_task_name(
+      task_prefix=f'{dataset_config.name}_{task_name}',
+      spectrogram_config=spectrogram_config,
+      vocab_config=vocab_config,
+      task_suffix='train')
+
+  def filepaths(split):
+    return sorted(tf.io.gfile.glob(
+        array_record_filepattern(dataset_config.paths[split])))
+
+  if skip_too_long:
+    handle_too_long = airio.FilterFnTransform(is_not_too_long)
+  else:
+    handle_too_long = airio.MapFnTransform(assert_not_too_long)
+
+  return airio.GrainTaskBuilder(
+      task_name=train_task_name,
+      source=airio.ArrayRecordDataSource(
+          split_to_filepattern={
+              'train': filepaths(dataset_config.train_split),
+              'eval': filepaths(dataset_config.train_eval_split)
+          }),
+      preprocessors=[
+          airio.MapFnTransform(
+              functools.partial(
+                  parse_example, features=dataset_config.features)),
+          airio.MapFnTransform(
+              functools.partial(
+                  tokenize_fn,
+                  spectrogram_config=spectrogram_config, codec=codec,
+                  is_training_data=True, onsets_only=onsets_only,
+                  include_ties=include_ties)),
+          airio.FilterFnTransform(is_not_empty),
+          airio.RandomMapFnTransform(select_random_chunk),
+          airio.MapFnTransform(
+              functools.partial(
+                  extract_target_sequence_with_indices,
+                  state_events_end_token=tie_token if include_ties else None)),
+          airio.MapFnTransform(
+              functools.partial(
+                  map_midi_programs, codec=codec,
+                  granularity_type=program_granularity)),
+          airio.MapFnTransform(
+              functools.partial(
+                  map_targets,
+                  fn=functools.partial(
+                      run_length_encoding.run_length_encode_shifts_np,
+                      codec=codec))),
+          airio.preprocessors.LazyMapTransform(
+              functools.partial(mix_transcription_examples, codec=codec),
+              update_runtime_args=lambda x: x,
+              produces_none_elements=False,
+              requires_non_none_elements=False),
+          airio.MapFnTransform(
+              functools.partial(
+                  map_targets,
+                  fn=functools.partial(
+                      run_length_encoding.remove_redundant_state_changes_np,
+                      codec=codec,
+                      state_change_event_types=['velocity', 'program']))),
+          airio.MapFnTransform(
+              functools.partial(
+                  compute_spectrograms,
+                  spectrogram_config=spectrogram_config)),
+          handle_too_long,
+          airio.MapFnTransform(
+              airio.Tokenizer(
+                  tokenizer_configs={
+                      'targets': airio.TokenizerConfig(vocab=vocabulary)
+                  },
+                  copy_pretokenized=False)),
+      ]).build()
+
+
+# Per-record tokenizers of each `tasks.TranscriptionTaskConfig.tokenizer`.
+RECORD_TOKENIZERS = {
+    'transcription': preprocessors.tokenize_transcription_record,
+    'guitarset': preprocessors.tokenize_guitarset_record,
+    'program_lookup': preprocessors.tokenize_record_with_program_lookup,
+    'slakh': preprocessors.tokenize_slakh_record,
+}
+
+# The training tasks registered in `tasks.py`, by name.
+_TRANSCRIPTION_TASKS = {
+    task_config.train_task_name: task_config
+    for task_config in tasks.TRANSCRIPTION_TASKS
+}
+
+
+def _transcription_task_args(name: str) -> Mapping[str, Any]:
+  """`construct_transcription_task` arguments of a training task."""
+  task_config = _TRANSCRIPTION_TASKS[name]
+  return dict(
+      dataset_config=task_config.dataset_config,
+      spectrogram_config=task_config.spectrogram_config,
+      vocab_config=task_config.vocab_config,
+      tokenize_fn=functools.partial(
+          RECORD_TOKENIZERS[task_config.tokenizer],
+          **task_config.tokenizer_kwargs),
+      onsets_only=task_config.onsets_only,
+      include_ties=task_config.include_ties)
+
+
+MIXTURE_TRAIN_TASK_NAME = tasks.construct_task_name(
+    task_prefix='mega_notes_ties',
+    spectrogram_config=tasks.SPECTROGRAM_CONFIG,
+    vocab_config=tasks.VOCAB_CONFIG_NOVELOCITY,
+    task_suffix='train')
+
+
+@functools.lru_cache(maxsize=None)
+def _get_mixture_or_task(
+    name: str, skip_too_long: bool, program_granularity: str
+) -> Union[airio.GrainTask, airio.GrainMixture]:
+  """Construct (once) the task or mixture with the given name."""
+  if name == MIXTURE_TRAIN_TASK_NAME:
+    mixture_tasks = [
+        _get_mixture_or_task(task_name, skip_too_long, program_granularity)
+        for task_name in tasks.MIXTURE_TRAIN_TASK_NAMES
+    ]
+    # Equivalent to `seqio.mixing_rate_num_examples`, but using the number of
+    # input records (there are no cached preprocessed example counts).
+    proportions = [
+        task.num_input_examples('train') ** (1 / tasks.MIXING_TEMPERATURE)
+        for task in mixture_tasks
+    ]
+    return airio.GrainMixture(
+        name=name, tasks=mixture_tasks, proportions=proportions)
+
+  if name not in _TRANSCRIPTION_TASKS:
+    raise ValueError(f'Unknown Grain transcription task: {name}')
+  return construct_transcription_task(
+      **_transcription_task_args(name),
+      skip_too_long=skip_too_long,
+      program_granularity=program_granularity)
+
+
+@gin.configurable
+def get_mixture_or_task(
+    name: str,
+    skip_too_long: bool = False,
+    program_granularity: str = 'full'
+) -> Union[airio.GrainTask, airio.GrainMixture]:
+  """Get the Grain training task or mixture matching a seqio task name.
+
+  Args:
+    name: Name of a training task or mixture registered in `tasks.py`, e.g.
+        the result of `tasks.construct_task_name(..., task_suffix='train')`.
+    skip_too_long: If True, drop examples whose targets are too long instead of
+        raising an error.
+    program_granularity: Key into `vocabularies.PROGRAM_GRANULARITIES`.
+
+  Returns:
+    A GrainTask or GrainMixture with 'train' and 'eval' splits.
+  """
+  return _get_mixture_or_task(name, skip_too_long, program_granularity)
+
+
+def feature_converter_preprocessors() -> Sequence[airio.MapFnTransform]:
+  """Runtime preprocessors that convert task features to model features.
+
+  The Grain counterpart of `models.ContinuousInputsEncDecFeatureConverter`
+  without packing: features are trimmed and padded along their first
+  dimension, which also works for the rank-2 spectrogram inputs.
+
+  Returns:
+    A list of AirIO preprocessors to pass as `runtime_preprocessors`.
+  """
+  feature_converters = airio_common.feature_converters
+  return feature_converters.get_t5x_enc_dec_feature_converter_preprocessors(
+      pack=False,
+      use_multi_bin_packing=False,
+      passthrough_feature_keys=[],
+      pad_id=0,
+      bos_id=0)
+
+
+class RepeatedDatasetIterator(airio_core.AirIODatasetIterator):
+  """Iterates over successive passes over a dataset, without end.
+
+  Each pass is an iterator of a finite number of epochs, created with its own
+  seed when the previous pass is exhausted. The state is the pass index and
+  the state of the iterator of that pass.
+  """
+
+  def __init__(
+      self,
+      iterator: airio_core.AirIODatasetIterator,
+      make_pass_iterator: Callable[[int], airio_core.AirIODatasetIterator]):
+    """RepeatedDatasetIterator constructor.
+
+    Args:
+      iterator: Iterator of the first pass.
+      make_pass_iterator: Returns the iterator of the pass with a given index.
+    """
+    super().__init__()
+    self._make_pass_iterator = make_pass_iterator
+    self._pass_index = 0
+    self._iterator = iterator
+
+  def _start_pass(self, pass_index: int) -> None:
+    self._pass_index = pass_index
+    self._iterator = self._make_pass_iterator(pass_index)
+
+  def __next__(self):
+    try:
+      return next(self._iterator)
+    except StopIteration:
+      logging.info('Starting pass %d over the training data.',
+                   self._pass_index + 1)
+      self._start_pass(self._pass_index + 1)
+      return next(self._iterator)
+
+  @property
+  def element_spec(self):
+    return self._iterator.element_spec
+
+  def peek(self):
+    return self._iterator.peek()
+
+  def peek_async(self):
+    return self._iterator.peek_async()
+
+  def get_state(self) -> Mapping[str, Any]:
+    return {'pass_index': self._pass_index,
+            'iterator': self._iterator.get_state()}
+
+  def set_state(self, state: Mapping[str, Any]) -> None:
+    if state['pass_index'] != self._pass_index:
+      self._start_pass(state['pass_index'])
+    self._iterator.set_state(state['iterator'])
+
+  def save(self, filename) -> None:
+    with tf.io.gfile.GFile(filename, 'w') as f:
+      f.write(json.dumps(self.get_state(), indent=4))
+
+  def restore(self, filename) -> None:
+    if not tf.io.gfile.exists(filename):
+      raise ValueError(f'File {filename} does not exist.')
+    with tf.io.gfile.GFile(filename) as f:
+      self.set_state(json.loads(f.read()))
+
+
+def _get_pass_dataset(
+    cfg: utils.DatasetConfig,
+    shard_id: int,
+    num_shards: int,
+    num_epochs: int,
+    seed: int
+) -> airio_core.AirIODatasetIterator:
+  """The AirIO case of `utils.get_dataset`, without its multihost checks.
+
+  Hosts may exhaust a pass at different steps, so later passes must not
+  synchronize them.
+  """
+  return airio_core.get_dataset(
+      mixture_or_task=cfg.mixture_or_task_name,
+      sequence_lengths=cfg.task_feature_lengths,
+      split=cfg.split,
+      runtime_preprocessors=cfg.runtime_preprocessors,
+      batch_size=cfg.batch_size // num_shards,
+      shuffle=cfg.shuffle,
+      num_epochs=num_epochs,
+      seed=seed,
+      shard_info=airio.ShardInfo(index=shard_id, num_shards=num_shards),
+      num_prefetch_threads=cfg.num_prefetch_threads,
+      num_workers=cfg.num_workers)
+
+
+@gin.configurable
+def get_dataset(
+    cfg: utils.DatasetConfig,
+    shard_id: int,
+    num_shards: int,
+    feature_converter_cls: Callable[..., Any],
+    num_epochs: Optional[int] = None,
+    continue_from_last_checkpoint: bool = False,
+    epochs_per_pass: int = 100
+):
+  """`utils.get_dataset` for Grain tasks and mixtures.
+
+  AirIO cannot repeat shuffled mixtures (or tasks that filter examples)
+  indefinitely, so with `num_epochs=None` the dataset is read in passes of
+  `epochs_per_pass` epochs, each pass (and each epoch within it) with a
+  different shuffle and different random chunks, for as many steps as
+  training requires.
+
+  Args:
+    cfg: Dataset configuration; `mixture_or_task_name` should come from
+        `get_mixture_or_task`.
+    shard_id: Index of the data shard for this host.
+    num_shards: Number of data shards.
+    feature_converter_cls: Unused by Grain tasks.
+    num_epochs: Number of epochs, or None to repeat indefinitely.
+    continue_from_last_checkpoint: Must be False.
+    epochs_per_pass: Number of epochs per pass when `num_epochs` is None.
+
+  Returns:
+    A dataset iterator.
+  """
+  if num_epochs is not None:
+    return utils.get_dataset(
+        cfg, shard_id, num_shards, feature_converter_cls,
+        num_epochs=num_epochs,
+        continue_from_last_checkpoint=continue_from_last_checkpoint)
+
+  seed = cfg.seed
+  if seed is None:
+    # As `utils.get_dataset`, but shared by all passes.
+    seed = int(multihost_utils.broadcast_one_to_all(np.int32(time.time())))
+  iterator = utils.get_dataset(
+      dataclasses.replace(cfg, seed=seed), shard_id, num_shards,
+      feature_converter_cls, num_epochs=epochs_per_pass,
+      continue_from_last_checkpoint=continue_from_last_checkpoint)
+  return RepeatedDatasetIterator(
+      iterator,
+      lambda pass_index: _get_pass_dataset(
+          cfg, shard_id, num_shards, epochs_per_pass, seed + pass_index))
@@ -0,0 +1,112 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Cold start benchmark for the inference entry points.
+
+Imports each entry point in fresh Python processes, and reports the median
+import time, peak resident memory, and whether TensorFlow was imported. With
+`--checkpoint`, also times creating the transcriber (reading parameters and
+building the model), excluding compilation.
+
+Usage:
+python -m mt3_audio2midi.mt3.import_benchmark --num_runs=5 \
+  --checkpoint=/path/to/mt3/checkpoint
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+from typing import Mapping, Optional, Sequence
+
+from absl import app
+from absl import flags
+from absl import logging
+
+_NUM_RUNS = flags.DEFINE_integer(
+    'num_runs', 5, 'Number of fresh processes to time for each entry point.')
+_CHECKPOINT = flags.DEFINE_string(
+    'checkpoint', None,
+    'Optional T5X checkpoint to also time creating the transcriber with.')
+_MODEL_TYPE = flags.DEFINE_enum(
+    'model_type', 'mt3', ['mt3', 'ismir2021'], 'Model type of --checkpoint.')
+
+# Entry point name: (import statement, transcriber creation statement).
+_ENTRY_POINTS = {
+    'mt3_audio2midi.infer': (
+        'from mt3_audio2midi import infer',
+        'infer.Transcriber({checkpoint!r}, model_type={model_type!r})'),
+    'mt3_audio2midi.MT3': (
+        'from mt3_audio2midi import MT3',
+        'MT3({checkpoint!r}, model_type={model_type!r})'),
+}
+
+# Run in the child process; prints a JSON dict of measurements.
+_CHILD_TEMPLATE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{import_statement}
+import_seconds = time.perf_counter() - start
+create_seconds = None
+if {create!r}:
+  start = time.perf_counter()
+  {create_statement}
+  create_seconds = time.perf_counter() - start
+print(json.dumps({{
+    'import_seconds': import_seconds,
+    'create_seconds': create_seconds,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'tensorflow_imported': 'tensorflow' in sys.modules,
+}}))
+"""
+
+
+def _run_child(
+    import_statement: str, create_statement: Optional[str]
+) -> Mapping[str, float]:
+  code = _CHILD_TEMPLATE.format(
+      import_statement=import_statement,
+      create=create_statement is not None,
+      create_statement=create_statement or 'pass')
+  output = subprocess.run(
+      [sys.executable, '-c', code], check=True, capture_output=True,
+      text=True).stdout
+  return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  for name, (import_statement, create_statement) in _ENTRY_POINTS.items():
+    if _CHECKPOINT.value:
+      create_statement = create_statement.format(
+          checkpoint=_CHECKPOINT.value, model_type=_MODEL_TYPE.value)
+    else:
+      create_statement = None
+    runs = [_run_child(import_statement, create_statement)
+            for _ in range(_NUM_RUNS.value)]
+    logging.info(
+        '%s: import %.2f s (median of %d), peak RSS %.0f MB, '
+        'TensorFlow imported: %s', name,
+        statistics.median(run['import_seconds'] for run in runs), len(runs),
+        max(run['max_rss_mb'] for run in runs),
+        any(run['tensorflow_imported'] for run in runs))
+    if create_statement:
+      logging.info('%s: create %.2f s (median)', name,
+                   statistics.median(run['create_seconds'] for run in runs))
+
+
+if __name__ == '__main__':
+  app.run(main)
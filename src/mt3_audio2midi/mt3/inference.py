@@ -16,14 +16,16 @@
 
 import functools
 import json
+import os
 
-from typing import Any, Optional, Sequence
+from typing import Any, Iterator, Optional, Sequence, Tuple
 
+from absl import logging
 import gin
 
 from mt3_audio2midi.mt3 import metrics_utils
 from mt3_audio2midi.mt3 import note_sequences
-from mt3_audio2midi.mt3 import tasks
+from mt3_audio2midi.mt3 import note_shards
 from mt3_audio2midi.mt3 import vocabularies
 
 import note_seq
@@ -31,21 +33,21 @@ import seqio
 import tensorflow as tf
 
 
-def write_inferences_to_file(
-    path: str,
+def _transcribed_examples(
     inferences: Sequence[Any],
     task_ds: tf.data.Dataset,
     mode: str,
-    vocabulary: Optional[seqio.Vocabulary] = None,
-    vocab_config=gin.REQUIRED,
-    onsets_only=gin.REQUIRED,
-    use_ties=gin.REQUIRED) -> None:
-  """Writes model predictions, ground truth transcriptions, and input audio.
+    vocabulary: Optional[seqio.Vocabulary],
+    vocab_config: vocabularies.VocabularyConfig,
+    onsets_only: bool,
+    use_ties: bool
+) -> Iterator[Tuple[str, note_seq.NoteSequence]]:
+  """Combines segment inferences into (example id, NoteSequence) pairs.
 
-  For now this only works for transcription tasks with ties.
+  Arguments are checked immediately; each full example is yielded as soon as
+  all of its segments have been read, in dataset order.
 
   Args:
-    path: File path to write to.
     inferences: Model inferences, output of predict_batch.
     task_ds: Original task dataset.
     mode: Prediction mode; must be 'predict' as 'score' is not supported.
@@ -53,6 +55,10 @@ def write_inferences_to_file(
     vocab_config: Vocabulary config object.
     onsets_only: If True, only predict onsets.
     use_ties: If True, use "tie" representation.
+
+  Returns:
+    An iterator over the example id and transcribed NoteSequence of each full
+    example.
   """
   if mode == 'score':
     raise ValueError('`score` mode currently not supported in mt3_audio2midi.mt3')
@@ -69,54 +75,79 @@ def write_inferences_to_file(
     encoding_spec = note_sequences.NoteEncodingWithTiesSpec
 
   codec = vocabularies.build_codec(vocab_config)
+  combine_predictions_fn = functools.partial(
+      metrics_utils.event_predictions_to_ns,
+      codec=codec,
+      encoding_spec=encoding_spec)
+
+  def segments():
+    for inp, output in zip(task_ds.as_numpy_iterator(), inferences):
+      tokens, length = vocabulary.decode_np(output)
+      tokens = tokens[:length]
+
+      start_time = inp['input_times'][0]
+      # Round down to nearest symbolic token step.
+      start_time -= start_time % (1 / codec.steps_per_second)
+
+      target = {
+          'unique_id': inp['unique_id'][0],
+          'ref_ns': inp['sequence'][0] if inp['sequence'][0] else None,
+      }
 
-  targets = []
-  predictions = []
-
-  for inp, output in zip(task_ds.as_numpy_iterator(), inferences):
-    tokens = tasks.trim_eos(vocabulary.decode_tf(output).numpy())
-
-    start_time = inp['input_times'][0]
-    # Round down to nearest symbolic token step.
-    start_time -= start_time % (1 / codec.steps_per_second)
-
-    targets.append({
-        'unique_id': inp['unique_id'][0],
-        'ref_ns': inp['sequence'][0] if inp['sequence'][0] else None,
-    })
-
-    predictions.append({
-        'unique_id': inp['unique_id'][0],
-        'est_tokens': tokens,
-        'start_time': start_time,
-        # Input audio is not part of the "prediction" but the below call to
-        # metrics_utils.event_predictions_to_ns handles the concatenation.
-        'raw_inputs': inp['raw_inputs']
-    })
-
-  # The first target for each full example contains the NoteSequence; just
-  # organize by ID.
-  full_targets = {}
-  for target in targets:
-    if target['ref_ns']:
-      full_targets[target['unique_id']] = {
-          'ref_ns': note_seq.NoteSequence.FromString(target['ref_ns'])
+      prediction = {
+          'unique_id': inp['unique_id'][0],
+          'est_tokens': tokens,
+          'start_time': start_time,
       }
 
-  full_predictions = metrics_utils.combine_predictions_by_id(
-      predictions=predictions,
-      combine_predictions_fn=functools.partial(
-          metrics_utils.event_predictions_to_ns,
-          codec=codec,
-          encoding_spec=encoding_spec))
+      yield target, prediction
+
+  def examples():
+    for example_segments in metrics_utils.group_consecutive_by_id(
+        segments(), id_fn=lambda seg: seg[1]['unique_id']):
+      segment_targets, segment_predictions = zip(*example_segments)
+
+      # The first target for each full example contains the NoteSequence.
+      ref_ns = next(
+          (target['ref_ns'] for target in segment_targets if target['ref_ns']),
+          None)
+      if ref_ns is None:
+        raise ValueError('No reference NoteSequence for example '
+                         f'{segment_predictions[0]["unique_id"]}')
+      prediction = combine_predictions_fn(segment_predictions)
+      yield note_seq.NoteSequence.FromString(ref_ns).id, prediction['est_ns']
 
-  assert sorted(full_targets.keys()) == sorted(full_predictions.keys())
+  return examples()
 
-  full_target_prediction_pairs = [
-      (full_targets[id], full_predictions[id])
-      for id in sorted(full_targets.keys())
-  ]
 
+def write_inferences_to_file(
+    path: str,
+    inferences: Sequence[Any],
+    task_ds: tf.data.Dataset,
+    mode: str,
+    vocabulary: Optional[seqio.Vocabulary] = None,
+    vocab_config=gin.REQUIRED,
+    onsets_only=gin.REQUIRED,
+    use_ties=gin.REQUIRED) -> None:
+  """Writes the notes predicted for each example as a line of JSON.
+
+  Each line has the example id and its estimated notes. Input audio and ground
+  truth transcriptions are not written: raw inputs are not kept in the task
+  dataset (`keep_raw_inputs=False` in infer.gin), and examples are streamed
+  from the predictions rather than collected.
+
+  For now this only works for transcription tasks with ties.
+
+  Args:
+    path: File path to write to.
+    inferences: Model inferences, output of predict_batch.
+    task_ds: Original task dataset.
+    mode: Prediction mode; must be 'predict' as 'score' is not supported.
+    vocabulary: Task output vocabulary.
+    vocab_config: Vocabulary config object.
+    onsets_only: If True, only predict onsets.
+    use_ties: If True, use "tie" representation.
+  """
   def note_to_dict(note):
     return {
         'start_time': note.start_time,
@@ -127,12 +158,70 @@ def write_inferences_to_file(
         'is_drum': note.is_drum
     }
 
+  examples = _transcribed_examples(
+      inferences, task_ds, mode, vocabulary, vocab_config=vocab_config,
+      onsets_only=onsets_only, use_ties=use_ties)
   with tf.io.gfile.GFile(path, 'w') as f:
-    for target, prediction in full_target_prediction_pairs:
+    for example_id, est_ns in examples:
       json_dict = {
-          'id': target['ref_ns'].id,
-          'est_notes':
-              [note_to_dict(note) for note in prediction['est_ns'].notes]
+          'id': example_id,
+          'est_notes': [note_to_dict(note) for note in est_ns.notes]
       }
       json_str = json.dumps(json_dict, cls=seqio.TensorAndNumpyEncoder)
       f.write(json_str + '\n')
+
+
+def write_note_shards_to_file(
+    path: str,
+    inferences: Sequence[Any],
+    task_ds: tf.data.Dataset,
+    mode: str,
+    vocabulary: Optional[seqio.Vocabulary] = None,
+    vocab_config=gin.REQUIRED,
+    onsets_only=gin.REQUIRED,
+    use_ties=gin.REQUIRED) -> None:
+  """Writes transcribed notes as a binary shard, see `note_shards`.
+
+  Like `write_inferences_to_file`, but avoids JSON encoding of every note;
+  read the output with `note_shards.NoteShardReader`. Use with
+  `merge_note_shards` to merge chunks.
+
+  Args:
+    path: File path to write to.
+    inferences: Model inferences, output of predict_batch.
+    task_ds: Original task dataset.
+    mode: Prediction mode; must be 'predict' as 'score' is not supported.
+    vocabulary: Task output vocabulary.
+    vocab_config: Vocabulary config object.
+    onsets_only: If True, only predict onsets.
+    use_ties: If True, use "tie" representation.
+  """
+  examples = _transcribed_examples(
+      inferences, task_ds, mode, vocabulary, vocab_config=vocab_config,
+      onsets_only=onsets_only, use_ties=use_ties)
+  with note_shards.NoteShardWriter(path) as writer:
+    for example_id, est_ns in examples:
+      writer.write(
+          example_id, note_sequences.NoteArray.from_note_sequence(est_ns))
+
+
+def merge_note_shards(
+    output_dir: str,
+    output_fname: str,
+    tmp_dir: str,
+    step: Optional[int]) -> None:
+  """Merges note shards of inference chunks into a single shard."""
+  del step
+  chunk_paths = sorted(
+      tf.io.gfile.glob(os.path.join(tmp_dir, f'{output_fname}-chunk?????')))
+  if not chunk_paths:
+    raise FileNotFoundError(f'No chunk results found in {tmp_dir}.')
+  example_ids = []
+  notes = []
+  for chunk_path in chunk_paths:
+    for example_id, example_notes in note_shards.NoteShardReader(chunk_path):
+      example_ids.append(example_id)
+      notes.append(example_notes)
+  output_path = os.path.join(output_dir, output_fname)
+  note_shards.write_note_shard(output_path, example_ids, notes)
+  logging.info('Results written to %s.', output_path)
@@ -0,0 +1,454 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Inference benchmark for the stages of transcribing audio to MIDI.
+
+Transcribes deterministic synthetic clips (silence, sine tones and chords of
+increasing note density) with `infer.Transcriber`, which matches `MT3.predict`,
+and times each stage separately: audio load, framing (including silence
+detection), spectrogram, encoder, decode loop, token decoding (to a
+NoteSequence) and MIDI write. Reports latency percentiles, compile time and
+memory growth of each stage, and segments per second, real-time factor,
+latency percentiles and peak resident memory of the whole process.
+
+The memory growth of a stage is measured around the untimed warmup run of each
+clip (the largest over clips is reported): the change in resident memory of
+the process, which includes host buffers allocated by XLA, and the change in
+memory in use on the device, where `memory_stats` reports it (not on CPU).
+Memory freed by the allocator within a stage is not seen.
+
+Without `--checkpoint`, the model has randomly initialized weights of the
+`T5Config` of `--model_type`, so no checkpoint is needed. Random weights never
+predict EOS, so every non-silent segment decodes `--max_decode_length` tokens.
+
+`--output` writes the results as JSON; `--baseline` compares them with a
+previous output and exits with status 1 if a latency (or the throughput)
+regressed by more than `--max_regression`.
+
+Usage:
+python -m mt3_audio2midi.mt3.inference_benchmark --output=/tmp/bench.json \
+  --baseline=/path/to/baseline.json
+"""
+
+import functools
+import json
+import os
+import resource
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from absl import app
+from absl import flags
+from absl import logging
+import jax
+import jax.numpy as jnp
+
+from mt3_audio2midi import infer
+from mt3_audio2midi.mt3 import metrics_utils
+from mt3_audio2midi.mt3 import model_config
+from mt3_audio2midi.mt3 import network
+from mt3_audio2midi.mt3 import param_pack
+from mt3_audio2midi.mt3 import token_vocabulary
+
+import numpy as np
+
+_MODEL_TYPE = flags.DEFINE_enum(
+    'model_type', 'mt3', list(model_config.MODEL_TYPES),
+    'Model type to benchmark.')
+_CHECKPOINT = flags.DEFINE_string(
+    'checkpoint', None,
+    'Optional T5X checkpoint or param pack; randomly initialized weights of '
+    'the same shapes are used otherwise.')
+_CLIP_SECONDS = flags.DEFINE_float(
+    'clip_seconds', 8.0, 'Length of each synthetic clip in seconds.')
+_NUM_RUNS = flags.DEFINE_integer(
+    'num_runs', 3, 'Number of timed runs of each clip, after a warmup run.')
+_BATCH_SIZE = flags.DEFINE_integer(
+    'batch_size', 8, 'Number of segments per encoder and decoder batch.')
+_MAX_DECODE_LENGTH = flags.DEFINE_integer(
+    'max_decode_length', 128,
+    'Longest decode length; the shorter decode lengths of `Transcriber` are '
+    'tried first.')
+_OUTPUT = flags.DEFINE_string(
+    'output', None, 'Optional JSON file to write the results to.')
+_BASELINE = flags.DEFINE_string(
+    'baseline', None, 'Optional JSON output of a previous run to compare to.')
+_MAX_REGRESSION = flags.DEFINE_float(
+    'max_regression', 0.1,
+    'Largest tolerated relative regression of a gated metric.')
+
+STAGES = ('audio_load', 'framing', 'spectrogram', 'encoder', 'decode',
+          'token_decoding', 'midi_write')
+
+# Clip name: (chords per second, notes per chord); zero chords is silence.
+_CLIPS = {
+    'silence': (0, 0),
+    'sine': (1, 1),
+    'chords_sparse': (2, 3),
+    'chords_dense': (8, 4),
+}
+_SEED = 0
+# Faster stages are dominated by timer and scheduling noise, so they are
+# reported but not compared with the baseline.
+_MIN_GATED_STAGE_MS = 10.0
+
+
+def synthesize_clip(chords_per_second: float, notes_per_chord: int,
+                    seconds: float, sample_rate: int,
+                    seed: int = _SEED) -> np.ndarray:
+  """Deterministic clip of decaying sine tone chords at random pitches."""
+  rng = np.random.default_rng(seed)
+  samples = np.zeros(int(seconds * sample_rate), np.float32)
+  num_chords = int(chords_per_second * seconds)
+  note_samples = int(0.5 * sample_rate)
+  t = np.arange(note_samples) / sample_rate
+  envelope = np.exp(-6 * t) * np.minimum(1, t * 200)
+  for onset in np.linspace(0, len(samples), num_chords, endpoint=False):
+    onset = int(onset)
+    for pitch in rng.choice(np.arange(48, 84), notes_per_chord, replace=False):
+      frequency = 440 * 2 ** ((pitch - 69) / 12)
+      tone = np.sin(2 * np.pi * frequency * t) * envelope
+      end = min(len(samples), onset + note_samples)
+      samples[onset:end] += tone[:end - onset] * 0.2 / notes_per_chord
+  return samples
+
+
+def _random_param_pack(path: str, config: model_config.ModelConfig) -> None:
+  """Writes randomly initialized parameters of a model type to a param pack."""
+  vocabulary = token_vocabulary.vocabulary_from_codec(
+      token_vocabulary.build_codec(config.vocab_config))
+  module = network.Transformer(config=network.T5Config(
+      vocab_size=token_vocabulary.num_embeddings(vocabulary),
+      **config.t5_config))
+  encoder_shape = (1, config.inputs_length,
+                   config.spectrogram_config.num_mel_bins)
+  decoder_shape = (1, config.targets_length)
+  params = jax.jit(functools.partial(module.init, enable_dropout=False))(
+      jax.random.PRNGKey(_SEED), jnp.ones(encoder_shape, jnp.float32),
+      jnp.ones(decoder_shape, jnp.int32), jnp.ones(decoder_shape, jnp.int32)
+  )['params']
+  param_pack.write_param_pack(
+      path, jax.tree_util.tree_map(np.asarray, params),
+      metadata={'random_init': config.model_type})
+
+
+def _peak_rss_mb() -> float:
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _rss_mb() -> Optional[float]:
+  """Current resident memory of the process, None where /proc is missing."""
+  try:
+    with open('/proc/self/statm') as f:
+      resident_pages = int(f.read().split()[1])
+  except OSError:
+    return None
+  return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def _device_mb() -> Optional[float]:
+  """Memory in use on the default device, None if it is not reported."""
+  memory_stats = jax.devices()[0].memory_stats()
+  if not memory_stats or 'bytes_in_use' not in memory_stats:
+    return None
+  return memory_stats['bytes_in_use'] / 2**20
+
+
+def _format_mb(mb: Optional[float]) -> str:
+  return 'n/a' if mb is None else f'{mb:.1f}'
+
+
+class _Benchmark:
+  """Runs the stages of transcribing a clip, timing each one."""
+
+  def __init__(self, transcriber: infer.Transcriber, batch_size: int,
+               output_dir: str):
+    self._transcriber = transcriber
+    self._batch_size = batch_size
+    self._output_dir = output_dir
+    self.seconds = {stage: [] for stage in STAGES}
+    self.rss_delta_mb = {stage: None for stage in STAGES}
+    self.device_delta_mb = {stage: None for stage in STAGES}
+    self.compile_seconds = {stage: 0.0 for stage in STAGES}
+    self._compile(transcriber)
+
+  def _compile(self, transcriber: infer.Transcriber) -> None:
+    """Compiles the encoder and the decoder for each decode length."""
+    # pylint: disable=protected-access
+    encode = jax.jit(functools.partial(infer._encode, transcriber.module))
+    decode = jax.jit(functools.partial(
+        infer._decode, transcriber.module, transcriber.vocabulary.eos_id))
+    # pylint: enable=protected-access
+    spectrograms = jax.ShapeDtypeStruct(
+        (self._batch_size, transcriber.inputs_length,
+         transcriber.spectrogram_config.num_mel_bins), jnp.float32)
+    start = time.perf_counter()
+    self._encode = encode.lower(transcriber.params, spectrograms).compile()
+    self.compile_seconds['encoder'] = time.perf_counter() - start
+    encoded = jax.eval_shape(encode, transcriber.params, spectrograms)
+    self._encoded_shape = encoded.shape[1:]
+    self._decode = {}
+    start = time.perf_counter()
+    for decode_length in transcriber.decode_lengths:
+      self._decode[decode_length] = decode.lower(
+          transcriber.params, encoded,
+          jax.ShapeDtypeStruct((self._batch_size, decode_length), jnp.int32)
+      ).compile()
+    self.compile_seconds['decode'] = time.perf_counter() - start
+
+  def _stage(self, stage: str, record: bool, fn: Callable[..., Any],
+             *args) -> Any:
+    # Memory is only measured in untimed runs, so that it costs no time.
+    if not record:
+      rss_before, device_before = _rss_mb(), _device_mb()
+    start = time.perf_counter()
+    # Stages return NumPy arrays, so the device computations have finished.
+    result = fn(*args)
+    if record:
+      self.seconds[stage].append(time.perf_counter() - start)
+    else:
+      self._record_delta(self.rss_delta_mb, stage, rss_before, _rss_mb())
+      self._record_delta(self.device_delta_mb, stage, device_before,
+                         _device_mb())
+    return result
+
+  @staticmethod
+  def _record_delta(deltas: Dict[str, Optional[float]], stage: str,
+                    before: Optional[float], after: Optional[float]) -> None:
+    if before is None or after is None:
+      return
+    deltas[stage] = max(after - before, deltas[stage] or 0.0)
+
+  def _framing(self, samples: np.ndarray):
+    frames = self._transcriber.frames(samples)
+    return frames, infer.silent_segments(
+        frames, self._transcriber.inputs_length,
+        self._transcriber.silence_threshold_db)
+
+  def _encode_segments(self, spectrograms: np.ndarray) -> np.ndarray:
+    encoded = [np.zeros((0,) + self._encoded_shape, np.float32)]
+    for start in range(0, len(spectrograms), self._batch_size):
+      batch = np.zeros((self._batch_size,) + spectrograms.shape[1:],
+                       spectrograms.dtype)
+      segments = spectrograms[start:start + self._batch_size]
+      batch[:len(segments)] = segments
+      encoded.append(np.asarray(
+          self._encode(self._transcriber.params, batch))[:len(segments)])
+    return np.concatenate(encoded)
+
+  def _decode_segments(self, encoded: np.ndarray) -> np.ndarray:
+    transcriber = self._transcriber
+    decode_fn = lambda inputs, decoder_input_tokens: self._decode[  # pylint: disable=g-long-lambda
+        decoder_input_tokens.shape[1]](transcriber.params, inputs,
+                                       decoder_input_tokens)
+    decodes = [np.zeros((0, transcriber.decode_lengths[-1]), np.int32)]
+    decode_length_index = 0
+    # As `Transcriber.predict_segments`, starting each batch at the decode
+    # length the previous one needed.
+    for start in range(0, len(encoded), self._batch_size):
+      batch_decodes, decode_length_index = infer.predict_with_decode_lengths(
+          decode_fn, encoded[start:start + self._batch_size], self._batch_size,
+          transcriber.decode_lengths, transcriber.vocabulary.eos_id,
+          decode_length_index)
+      decodes.append(batch_decodes)
+    return np.concatenate(decodes)
+
+  def _token_decoding(self, decodes: np.ndarray, silent: np.ndarray,
+                      start_times: np.ndarray):
+    transcriber = self._transcriber
+    tokens, lengths = transcriber.vocabulary.decode_np(decodes)
+    predictions = [
+        transcriber.postprocess(transcriber.silent_tokens, start_time)
+        for start_time in start_times]
+    for i, segment_tokens, length in zip(
+        np.flatnonzero(~silent), tokens, lengths):
+      predictions[i] = transcriber.postprocess(
+          segment_tokens[:length], start_times[i])
+    return metrics_utils.event_predictions_to_ns(
+        predictions, codec=transcriber.codec,
+        encoding_spec=transcriber.encoding_spec)['est_ns']
+
+  def run(self, audio_path: str, record: bool) -> int:
+    """Transcribes an audio file; returns its number of segments."""
+    # pylint: disable=g-import-not-at-top
+    import librosa
+    import note_seq
+    # pylint: enable=g-import-not-at-top
+    transcriber = self._transcriber
+    samples = self._stage(
+        'audio_load', record, lambda: librosa.load(
+            audio_path, sr=transcriber.spectrogram_config.sample_rate)[0])
+    frames, silent = self._stage('framing', record, self._framing, samples)
+    spectrograms, start_times = self._stage(
+        'spectrogram', record, transcriber.spectrograms, frames)
+    encoded = self._stage(
+        'encoder', record, self._encode_segments, spectrograms[~silent])
+    decodes = self._stage('decode', record, self._decode_segments, encoded)
+    ns = self._stage('token_decoding', record, self._token_decoding, decodes,
+                     silent, start_times)
+    self._stage('midi_write', record, note_seq.sequence_proto_to_midi_file,
+                ns, os.path.join(self._output_dir, 'output.mid'))
+    return len(spectrograms)
+
+
+def _percentiles_ms(seconds: Sequence[float]) -> Dict[str, float]:
+  return {f'p{q}_ms': float(np.percentile(seconds, q)) * 1000
+          for q in (50, 95, 99)}
+
+
+def run_benchmark(transcriber: infer.Transcriber, clip_seconds: float,
+                  num_runs: int, batch_size: int) -> Dict[str, Any]:
+  """Benchmarks transcribing the synthetic clips; returns the results."""
+  # pylint: disable=g-import-not-at-top
+  import scipy.io.wavfile
+  # pylint: enable=g-import-not-at-top
+  sample_rate = transcriber.spectrogram_config.sample_rate
+  with tempfile.TemporaryDirectory() as output_dir:
+    benchmark = _Benchmark(transcriber, batch_size, output_dir)
+    clips = {}
+    clip_seconds_run = []
+    total_segments = 0
+    for name, (chords_per_second, notes_per_chord) in _CLIPS.items():
+      audio_path = os.path.join(output_dir, f'{name}.wav')
+      scipy.io.wavfile.write(audio_path, sample_rate, synthesize_clip(
+          chords_per_second, notes_per_chord, clip_seconds, sample_rate))
+      benchmark.run(audio_path, record=False)
+      seconds = []
+      for _ in range(num_runs):
+        start = time.perf_counter()
+        num_segments = benchmark.run(audio_path, record=True)
+        seconds.append(time.perf_counter() - start)
+      clips[name] = dict(_percentiles_ms(seconds), segments=num_segments)
+      logging.info('%s: %d segments, p50 %.0f ms', name, num_segments,
+                   clips[name]['p50_ms'])
+      clip_seconds_run.extend(seconds)
+      total_segments += num_segments * num_runs
+
+  total_seconds = sum(clip_seconds_run)
+  stages = {}
+  for stage in STAGES:
+    stages[stage] = dict(
+        _percentiles_ms(benchmark.seconds[stage]),
+        total_seconds=float(sum(benchmark.seconds[stage])),
+        compile_seconds=benchmark.compile_seconds[stage],
+        rss_delta_mb=benchmark.rss_delta_mb[stage],
+        device_delta_mb=benchmark.device_delta_mb[stage])
+  return {
+      'config': {
+          'model_type': transcriber.config.model_type,
+          'clip_seconds': clip_seconds,
+          'num_runs': num_runs,
+          'batch_size': batch_size,
+          'decode_lengths': list(transcriber.decode_lengths),
+          'backend': jax.default_backend(),
+      },
+      'summary': dict(
+          _percentiles_ms(clip_seconds_run),
+          segments_per_second=total_segments / total_seconds,
+          real_time_factor=total_seconds / (
+              len(clip_seconds_run) * clip_seconds),
+          compile_seconds=float(sum(benchmark.compile_seconds.values())),
+          peak_rss_mb=_peak_rss_mb()),
+      'stages': stages,
+      'clips': clips,
+  }
+
+
+def _gated_metrics(results: Mapping[str, Any]) -> Dict[str, float]:
+  """Metrics compared with the baseline; all but segments/s are lower=better."""
+  metrics = {f'summary.{name}': results['summary'][name] for name in (
+      'p50_ms', 'p95_ms', 'p99_ms', 'real_time_factor', 'segments_per_second')}
+  for stage, stage_results in results['stages'].items():
+    if stage_results['p50_ms'] >= _MIN_GATED_STAGE_MS:
+      metrics[f'stages.{stage}.p50_ms'] = stage_results['p50_ms']
+  return metrics
+
+
+def compare_to_baseline(results: Mapping[str, Any],
+                        baseline: Mapping[str, Any],
+                        max_regression: float) -> List[str]:
+  """Logs changes from a baseline; returns the regressed metrics."""
+  if results['config'] != baseline['config']:
+    logging.warning('Benchmark config %s differs from the baseline config %s',
+                    results['config'], baseline['config'])
+  baseline_metrics = _gated_metrics(baseline)
+  regressions = []
+  for name, value in _gated_metrics(results).items():
+    baseline_value = baseline_metrics.get(name)
+    if not baseline_value:
+      continue
+    change = value / baseline_value - 1
+    if name.endswith('segments_per_second'):
+      regressed = -change > max_regression
+    else:
+      regressed = change > max_regression
+    logging.info('%s: %.4g (baseline %.4g, %+.1f%%)%s', name, value,
+                 baseline_value, 100 * change, ' REGRESSION' if regressed else '')
+    if regressed:
+      regressions.append(name)
+  return regressions
+
+
+def main(argv: Sequence[str]) -> int:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  config = model_config.load_model_config(_MODEL_TYPE.value)
+  with tempfile.TemporaryDirectory() as params_dir:
+    model_path = _CHECKPOINT.value
+    if not model_path:
+      model_path = os.path.join(params_dir, 'random.params')
+      _random_param_pack(model_path, config)
+    transcriber = infer.Transcriber(
+        model_path, model_type=_MODEL_TYPE.value, batch_size=_BATCH_SIZE.value)
+    transcriber.decode_lengths = tuple(
+        length for length in transcriber.decode_lengths
+        if length < _MAX_DECODE_LENGTH.value) + (_MAX_DECODE_LENGTH.value,)
+    results = run_benchmark(transcriber, _CLIP_SECONDS.value, _NUM_RUNS.value,
+                            _BATCH_SIZE.value)
+  results['config']['checkpoint'] = _CHECKPOINT.value
+
+  summary = results['summary']
+  logging.info(
+      '%.2f segments/s, real-time factor %.3f, clip latency p50/p95/p99 '
+      '%.0f/%.0f/%.0f ms, compile %.1f s, peak RSS %.0f MB',
+      summary['segments_per_second'], summary['real_time_factor'],
+      summary['p50_ms'], summary['p95_ms'], summary['p99_ms'],
+      summary['compile_seconds'], summary['peak_rss_mb'])
+  for stage, stage_results in results['stages'].items():
+    logging.info(
+        '%s: p50/p95/p99 %.1f/%.1f/%.1f ms, compile %.1f s, RSS delta %s MB, '
+        'device delta %s MB', stage, stage_results['p50_ms'],
+        stage_results['p95_ms'], stage_results['p99_ms'],
+        stage_results['compile_seconds'],
+        _format_mb(stage_results['rss_delta_mb']),
+        _format_mb(stage_results['device_delta_mb']))
+  if _OUTPUT.value:
+    with open(_OUTPUT.value, 'w') as f:
+      json.dump(results, f, indent=2)
+
+  if _BASELINE.value:
+    with open(_BASELINE.value) as f:
+      baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline,
+                                      _MAX_REGRESSION.value)
+    if regressions:
+      logging.error('Regressed by more than %.0f%%: %s',
+                    100 * _MAX_REGRESSION.value, ', '.join(regressions))
+      return 1
+  return 0
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -173,6 +173,7 @@ class MultiHeadDotProductAttention(nn.Module):
       kernel_init: initializer for the kernel of the Dense layers.
       float32_logits: bool, if True then compute logits in float32 to avoid
         numerical issues with bfloat16.
+      quantization: optional quantized execution mode of the Dense layers.
   """
 
   num_heads: int
@@ -182,6 +183,7 @@ class MultiHeadDotProductAttention(nn.Module):
   kernel_init: Initializer = nn.initializers.variance_scaling(
       1.0, 'fan_in', 'normal')
   float32_logits: bool = False  # computes logits in float32 for stability.
+  quantization: Optional[str] = None
 
   @nn.compact
   def __call__(self,
@@ -225,7 +227,8 @@ class MultiHeadDotProductAttention(nn.Module):
         axis=-1,
         features=(self.num_heads, self.head_dim),
         kernel_axes=('embed', 'joined_kv'),
-        dtype=self.dtype)
+        dtype=self.dtype,
+        quantization=self.quantization)
 
     # NOTE: T5 does not explicitly rescale the attention logits by
     #       1/sqrt(depth_kq)!  This is folded into the initializers of the
@@ -350,6 +353,7 @@ class MultiHeadDotProductAttention(nn.Module):
         kernel_init=self.kernel_init,
         kernel_axes=('joined_kv', 'embed'),
         dtype=self.dtype,
+        quantization=self.quantization,
         name='out')(
             x)
     return out
@@ -370,6 +374,14 @@ def _canonicalize_tuple(x):
 #------------------------------------------------------------------------------
 # DenseGeneral for attention layers.
 #------------------------------------------------------------------------------
+# Quantized execution modes of `DenseGeneral`, for int8 kernels:
+#   'int8': inputs are quantized to int8 per row, and multiplied with the kernel
+#     in int8 with int32 accumulation (fastest on CPU).
+#   'int8_weights': the kernel is converted to the computation dtype on the fly,
+#     and inputs are not quantized (more accurate).
+QUANTIZATION_MODES = ('int8', 'int8_weights')
+
+
 class DenseGeneral(nn.Module):
   """A linear transformation (without bias) with flexible axes.
 
@@ -378,6 +390,10 @@ class DenseGeneral(nn.Module):
       axis: tuple with axes to apply the transformation on.
       dtype: the dtype of the computation (default: float32).
       kernel_init: initializer function for the weight matrix.
+      quantization: optional quantized execution mode, see
+        `QUANTIZATION_MODES`. The kernel is then an int8 matrix with a float32
+        scale per output feature (`kernel_scale`), as written by
+        `quantize.quantize_params`.
   """
   features: Union[Iterable[int], int]
   axis: Union[Iterable[int], int] = -1
@@ -385,6 +401,7 @@ class DenseGeneral(nn.Module):
   kernel_init: Initializer = nn.initializers.variance_scaling(
       1.0, 'fan_in', 'truncated_normal')
   kernel_axes: Tuple[str, ...] = ()
+  quantization: Optional[str] = None
 
   @nn.compact
   def __call__(self, inputs: Array) -> Array:
@@ -405,6 +422,12 @@ class DenseGeneral(nn.Module):
     kernel_shape = tuple([inputs.shape[ax] for ax in axis]) + features
     kernel_param_shape = (np.prod([inputs.shape[ax] for ax in axis]),
                           np.prod(features))
+    contract_ind = tuple(range(0, len(axis)))
+    dimension_numbers = ((axis, contract_ind), ((), ()))
+    if self.quantization is not None:
+      return self._quantized_dot_general(inputs, kernel_shape,
+                                         kernel_param_shape, dimension_numbers)
+
     kernel = param_with_axes(
         'kernel',
         self.kernel_init,
@@ -414,8 +437,52 @@ class DenseGeneral(nn.Module):
     kernel = jnp.asarray(kernel, self.dtype)
     kernel = jnp.reshape(kernel, kernel_shape)
 
-    contract_ind = tuple(range(0, len(axis)))
-    return lax.dot_general(inputs, kernel, ((axis, contract_ind), ((), ())))
+    return lax.dot_general(inputs, kernel, dimension_numbers)
+
+  def _quantized_dot_general(self, inputs, kernel_shape, kernel_param_shape,
+                             dimension_numbers):
+    """Applies the transformation with an int8 kernel and per-feature scales."""
+    if self.quantization not in QUANTIZATION_MODES:
+      raise ValueError(f'Unknown quantization mode: {self.quantization}')
+    # Quantized kernels are only restored, not trained; the initializers just
+    # give the parameter shapes and dtypes.
+    kernel = param_with_axes(
+        'kernel',
+        nn.initializers.zeros,
+        kernel_param_shape,
+        jnp.int8,
+        axes=self.kernel_axes)
+    kernel_scale = param_with_axes(
+        'kernel_scale',
+        nn.initializers.ones,
+        kernel_param_shape[-1:],
+        jnp.float32,
+        axes=self.kernel_axes[-1:])
+    kernel = jnp.reshape(kernel, kernel_shape)
+    kernel_scale = jnp.reshape(kernel_scale, kernel_shape[-len(
+        _canonicalize_tuple(self.features)):]).astype(self.dtype)
+
+    if self.quantization == 'int8_weights':
+      # Dequantize on the fly; only the int8 kernel is read from memory.
+      y = lax.dot_general(inputs, kernel.astype(self.dtype), dimension_numbers)
+      return y * kernel_scale
+
+    # Quantize the inputs with a scale per row (over the contracting axes), and
+    # multiply int8 by int8 with int32 accumulation.
+    contracting_axes = dimension_numbers[0][0]
+    inputs_scale = jnp.max(jnp.abs(inputs), axis=contracting_axes) / 127
+    inputs_scale = jnp.where(inputs_scale == 0, 1, inputs_scale)
+    quantized_inputs = jnp.round(
+        inputs / jnp.expand_dims(inputs_scale, contracting_axes)).astype(
+            jnp.int8)
+    y = lax.dot_general(
+        quantized_inputs, kernel, dimension_numbers,
+        preferred_element_type=jnp.int32)
+    # The output axes are the non-contracting input axes, then the features.
+    inputs_scale = jnp.reshape(
+        inputs_scale, inputs_scale.shape + (1,) * kernel_scale.ndim)
+    return (y.astype(self.dtype) * inputs_scale * kernel_scale).astype(
+        self.dtype)
 
 
 def _convert_to_activation_function(
@@ -443,6 +510,7 @@ class MlpBlock(nn.Module):
     deterministic: Whether the dropout layers should be deterministic.
     intermediate_dropout_rate: Dropout rate used after the intermediate layers.
     dtype: Type for the dense layer.
+    quantization: Optional quantized execution mode of the dense layers.
   """
   intermediate_dim: int = 2048
   activations: Sequence[Union[str, Callable]] = ('relu',)
@@ -450,6 +518,7 @@ class MlpBlock(nn.Module):
       1.0, 'fan_in', 'truncated_normal')
   intermediate_dropout_rate: float = 0.1
   dtype: Any = jnp.float32
+  quantization: Optional[str] = None
 
   @nn.compact
   def __call__(self, inputs, decode: bool = False, deterministic: bool = False):
@@ -464,6 +533,7 @@ class MlpBlock(nn.Module):
           dtype=self.dtype,
           kernel_init=self.kernel_init,
           kernel_axes=('embed', 'mlp'),
+          quantization=self.quantization,
           name=dense_name)(
               inputs)
       x = _convert_to_activation_function(act_fn)(x)
@@ -481,6 +551,7 @@ class MlpBlock(nn.Module):
         dtype=self.dtype,
         kernel_init=self.kernel_init,
         kernel_axes=('mlp', 'embed'),
+        quantization=self.quantization,
         name='wo')(
             x)
     return output
@@ -15,14 +15,19 @@
 """Transcription metrics."""
 
 import collections
-import copy
+import concurrent.futures
+import contextlib
+import dataclasses
 import functools
-from typing import Any, Iterable, Mapping, Optional, Sequence
+import multiprocessing
+from typing import Any, Callable, Iterable, Mapping, Optional, Sequence, Tuple
 
+import gin
 import mir_eval
 
 from mt3_audio2midi.mt3 import event_codec
 from mt3_audio2midi.mt3 import metrics_utils
+from mt3_audio2midi.mt3 import note_matching
 from mt3_audio2midi.mt3 import note_sequences
 from mt3_audio2midi.mt3 import spectrograms
 from mt3_audio2midi.mt3 import summaries
@@ -30,12 +35,41 @@ from mt3_audio2midi.mt3 import vocabularies
 
 import note_seq
 import numpy as np
+import pretty_midi
 import seqio
 
 
+def _valid_note_mask(notes: note_sequences.NoteArray) -> np.ndarray:
+  """Notes kept by `note_seq.sequences_lib.sequence_to_valued_intervals`."""
+  # mir_eval does not allow notes that start and end at the same time.
+  return ((notes.pitch >= note_seq.MIN_MIDI_PITCH) &
+          (notes.pitch <= note_seq.MAX_MIDI_PITCH) &
+          (notes.start_time != notes.end_time))
+
+
+def _note_matcher(
+    ref_notes: note_sequences.NoteArray,
+    est_notes: note_sequences.NoteArray,
+    max_onset_tolerance: float = 0.05
+) -> note_matching.NoteMatcher:
+  """Note matcher for valid reference and estimated notes."""
+  def intervals_and_pitches(notes):
+    intervals = np.stack(
+        [notes.start_time, notes.end_time], axis=1).reshape(-1, 2)
+    pitches = pretty_midi.note_number_to_hz(notes.pitch.astype(np.int64))
+    return intervals, pitches
+
+  ref_intervals, ref_pitches = intervals_and_pitches(ref_notes)
+  est_intervals, est_pitches = intervals_and_pitches(est_notes)
+  return note_matching.NoteMatcher(
+      ref_intervals=ref_intervals, ref_pitches=ref_pitches,
+      est_intervals=est_intervals, est_pitches=est_pitches,
+      max_onset_tolerance=max_onset_tolerance)
+
+
 def _program_aware_note_scores(
-    ref_ns: note_seq.NoteSequence,
-    est_ns: note_seq.NoteSequence,
+    ref_notes: note_sequences.NoteArray,
+    est_notes: note_sequences.NoteArray,
     granularity_type: str
 ) -> Mapping[str, float]:
   """Compute precision/recall/F1 for notes taking program into account.
@@ -44,8 +78,8 @@ def _program_aware_note_scores(
   only. Applies MIDI program map of specified granularity type.
 
   Args:
-    ref_ns: Reference NoteSequence with ground truth labels.
-    est_ns: Estimated NoteSequence.
+    ref_notes: Reference notes with ground truth labels.
+    est_notes: Estimated notes.
     granularity_type: String key in vocabularies.PROGRAM_GRANULARITIES dict.
 
   Returns:
@@ -53,22 +87,46 @@ def _program_aware_note_scores(
   """
   program_map_fn = vocabularies.PROGRAM_GRANULARITIES[
       granularity_type].program_map_fn
+  program_map = np.array(
+      [program_map_fn(program)
+       for program in range(note_seq.MAX_MIDI_PROGRAM + 1)], dtype=np.int32)
 
-  ref_ns = copy.deepcopy(ref_ns)
-  for note in ref_ns.notes:
-    if not note.is_drum:
-      note.program = program_map_fn(note.program)
+  def map_programs(notes):
+    return dataclasses.replace(notes, program=np.where(
+        notes.is_drum, notes.program, program_map[notes.program]))
 
-  est_ns = copy.deepcopy(est_ns)
-  for note in est_ns.notes:
-    if not note.is_drum:
-      note.program = program_map_fn(note.program)
+  ref_notes = map_programs(ref_notes)
+  est_notes = map_programs(est_notes)
 
   program_and_is_drum_tuples = (
-      set((note.program, note.is_drum) for note in ref_ns.notes) |
-      set((note.program, note.is_drum) for note in est_ns.notes)
+      set(zip(ref_notes.program.tolist(), ref_notes.is_drum.tolist())) |
+      set(zip(est_notes.program.tolist(), est_notes.is_drum.tolist()))
   )
 
+  # Match all tracks at once, only allowing matches within the same track;
+  # the matching restricted to each track is then a maximum matching for that
+  # track alone.
+  ref_notes = ref_notes[_valid_note_mask(ref_notes)]
+  est_notes = est_notes[_valid_note_mask(est_notes)]
+  matcher = _note_matcher(ref_notes, est_notes)
+  num_tracks = 2 * (note_seq.MAX_MIDI_PROGRAM + 1)
+  ref_tracks = ref_notes.program + (note_seq.MAX_MIDI_PROGRAM + 1) * (
+      ref_notes.is_drum)
+  est_tracks = est_notes.program + (note_seq.MAX_MIDI_PROGRAM + 1) * (
+      est_notes.is_drum)
+  num_matches = np.zeros(num_tracks, dtype=np.int64)
+  for is_drum in (False, True):
+    ref_mask = ref_notes.is_drum == is_drum
+    est_mask = est_notes.is_drum == is_drum
+    matching = matcher.subset(ref_mask, est_mask).match_notes(
+        offset_ratio=None if is_drum else 0.2,
+        ref_groups=ref_tracks[ref_mask], est_groups=est_tracks[est_mask])
+    num_matches += np.bincount(
+        ref_tracks[ref_mask][[ref_i for ref_i, _ in matching]],
+        minlength=num_tracks)
+  num_ref = np.bincount(ref_tracks, minlength=num_tracks)
+  num_est = np.bincount(est_tracks, minlength=num_tracks)
+
   drum_precision_sum = 0.0
   drum_precision_count = 0
   drum_recall_sum = 0.0
@@ -80,34 +138,27 @@ def _program_aware_note_scores(
   nondrum_recall_count = 0
 
   for program, is_drum in program_and_is_drum_tuples:
-    est_track = note_sequences.extract_track(est_ns, program, is_drum)
-    ref_track = note_sequences.extract_track(ref_ns, program, is_drum)
-
-    est_intervals, est_pitches, unused_est_velocities = (
-        note_seq.sequences_lib.sequence_to_valued_intervals(est_track))
-    ref_intervals, ref_pitches, unused_ref_velocities = (
-        note_seq.sequences_lib.sequence_to_valued_intervals(ref_track))
-
-    args = {
-        'ref_intervals': ref_intervals, 'ref_pitches': ref_pitches,
-        'est_intervals': est_intervals, 'est_pitches': est_pitches
-    }
-    if is_drum:
-      args['offset_ratio'] = None
-
-    precision, recall, unused_f_measure, unused_avg_overlap_ratio = (
-        mir_eval.transcription.precision_recall_f1_overlap(**args))
+    track = program + (note_seq.MAX_MIDI_PROGRAM + 1) * is_drum
+    track_num_ref = int(num_ref[track])
+    track_num_est = int(num_est[track])
+
+    # As in mir_eval, scores are zero if either track is empty.
+    if track_num_ref and track_num_est:
+      precision = float(num_matches[track]) / track_num_est
+      recall = float(num_matches[track]) / track_num_ref
+    else:
+      precision, recall = 0.0, 0.0
 
     if is_drum:
-      drum_precision_sum += precision * len(est_intervals)
-      drum_precision_count += len(est_intervals)
-      drum_recall_sum += recall * len(ref_intervals)
-      drum_recall_count += len(ref_intervals)
+      drum_precision_sum += precision * track_num_est
+      drum_precision_count += track_num_est
+      drum_recall_sum += recall * track_num_ref
+      drum_recall_count += track_num_ref
     else:
-      nondrum_precision_sum += precision * len(est_intervals)
-      nondrum_precision_count += len(est_intervals)
-      nondrum_recall_sum += recall * len(ref_intervals)
-      nondrum_recall_count += len(ref_intervals)
+      nondrum_precision_sum += precision * track_num_est
+      nondrum_precision_count += track_num_est
+      nondrum_recall_sum += recall * track_num_ref
+      nondrum_recall_count += track_num_ref
 
   precision_sum = drum_precision_sum + nondrum_precision_sum
   precision_count = drum_precision_count + nondrum_precision_count
@@ -146,24 +197,211 @@ def _program_aware_note_scores(
   }
 
 
+def _track_scores(
+    ref_notes: note_sequences.NoteArray,
+    est_notes: note_sequences.NoteArray,
+    onsets_only: bool,
+    track_specs: Optional[Sequence[note_sequences.TrackSpec]],
+    frame_fps: float,
+    frame_velocity_threshold: int
+) -> Sequence[Tuple[str, float]]:
+  """Compute note and frame metrics for all non-drum notes and each track.
+
+  Args:
+    ref_notes: Reference notes with ground truth labels.
+    est_notes: Estimated notes.
+    onsets_only: If True, only compute onset metrics.
+    track_specs: Optional tracks to compute metrics for separately.
+    frame_fps: Frame rate of the pianorolls used for frame metrics.
+    frame_velocity_threshold: Velocity threshold for frame metrics.
+
+  Returns:
+    (name, score) pairs.
+  """
+  # Whether or not there are separate tracks, compute metrics for the full
+  # NoteSequence minus drums.
+  est_track_masks = [~est_notes.is_drum]
+  ref_track_masks = [~ref_notes.is_drum]
+  use_track_offsets = [not onsets_only]
+  use_track_velocities = [not onsets_only]
+  track_instrument_names = ['']
+
+  if track_specs is not None:
+    # Compute transcription metrics separately for each track.
+    for spec in track_specs:
+      est_track_masks.append((est_notes.program == spec.program) &
+                             (est_notes.is_drum == spec.is_drum))
+      ref_track_masks.append((ref_notes.program == spec.program) &
+                             (ref_notes.is_drum == spec.is_drum))
+      use_track_offsets.append(not onsets_only and not spec.is_drum)
+      use_track_velocities.append(not onsets_only)
+      track_instrument_names.append(spec.name)
+
+  # Candidate note matches are found once, for all tracks.
+  est_valid = _valid_note_mask(est_notes)
+  ref_valid = _valid_note_mask(ref_notes)
+  matcher = _note_matcher(ref_notes[ref_valid], est_notes[est_valid])
+
+  scores = []
+  for est_mask, ref_mask, use_offsets, use_velocities, instrument_name in (
+      zip(est_track_masks, ref_track_masks, use_track_offsets,
+          use_track_velocities, track_instrument_names)):
+    track_scores = {}
+
+    est_track = est_notes[est_mask]
+    ref_track = ref_notes[ref_mask]
+    track_matcher = matcher.subset(ref_mask[ref_valid], est_mask[est_valid])
+    est_velocities = est_track.velocity[est_valid[est_mask]].astype(np.int64)
+    ref_velocities = ref_track.velocity[ref_valid[ref_mask]].astype(np.int64)
+
+    # Precision / recall / F1 using onsets (and pitches) only.
+    precision, recall, f_measure, avg_overlap_ratio = (
+        track_matcher.precision_recall_f1_overlap(offset_ratio=None))
+    del avg_overlap_ratio
+    track_scores['Onset precision'] = precision
+    track_scores['Onset recall'] = recall
+    track_scores['Onset F1'] = f_measure
+
+    if use_offsets:
+      # Precision / recall / F1 using onsets and offsets.
+      precision, recall, f_measure, avg_overlap_ratio = (
+          track_matcher.precision_recall_f1_overlap())
+      del avg_overlap_ratio
+      track_scores['Onset + offset precision'] = precision
+      track_scores['Onset + offset recall'] = recall
+      track_scores['Onset + offset F1'] = f_measure
+
+    if use_velocities:
+      # Precision / recall / F1 using onsets and velocities (no offsets).
+      precision, recall, f_measure, avg_overlap_ratio = (
+          track_matcher.velocity_precision_recall_f1_overlap(
+              ref_velocities=ref_velocities,
+              est_velocities=est_velocities,
+              offset_ratio=None))
+      track_scores['Onset + velocity precision'] = precision
+      track_scores['Onset + velocity recall'] = recall
+      track_scores['Onset + velocity F1'] = f_measure
+
+    if use_offsets and use_velocities:
+      # Precision / recall / F1 using onsets, offsets, and velocities.
+      precision, recall, f_measure, avg_overlap_ratio = (
+          track_matcher.velocity_precision_recall_f1_overlap(
+              ref_velocities=ref_velocities,
+              est_velocities=est_velocities))
+      track_scores['Onset + offset + velocity precision'] = precision
+      track_scores['Onset + offset + velocity recall'] = recall
+      track_scores['Onset + offset + velocity F1'] = f_measure
+
+    # Calculate framewise metrics.
+    is_drum = bool(np.all(ref_track.is_drum))
+    ref_pr = metrics_utils.get_pianoroll(ref_track, frame_fps, is_drum=is_drum)
+    est_pr = metrics_utils.get_pianoroll(est_track, frame_fps, is_drum=is_drum)
+    frame_precision, frame_recall, frame_f1 = metrics_utils.frame_metrics(
+        ref_pr, est_pr, velocity_threshold=frame_velocity_threshold)
+    track_scores['Frame Precision'] = frame_precision
+    track_scores['Frame Recall'] = frame_recall
+    track_scores['Frame F1'] = frame_f1
+
+    for metric_name, metric_value in track_scores.items():
+      if instrument_name:
+        scores.append((f'{instrument_name}/{metric_name}', metric_value))
+      else:
+        scores.append((metric_name, metric_value))
+
+  return scores
+
+
+def _track_pianorolls(
+    ref_notes: note_sequences.NoteArray,
+    est_notes: note_sequences.NoteArray,
+    track_specs: Optional[Sequence[note_sequences.TrackSpec]],
+    frame_fps: float
+) -> Sequence[Tuple[str, Tuple[np.ndarray, np.ndarray]]]:
+  """Frame metric pianorolls for all non-drum notes and each track.
+
+  Args:
+    ref_notes: Reference notes with ground truth labels.
+    est_notes: Estimated notes.
+    track_specs: Optional tracks to compute pianorolls for separately.
+    frame_fps: Frame rate of the pianorolls.
+
+  Returns:
+    (instrument name, (estimated, reference) pianoroll) pairs.
+  """
+  tracks = [('', ref_notes[~ref_notes.is_drum], est_notes[~est_notes.is_drum])]
+  if track_specs is not None:
+    for spec in track_specs:
+      tracks.append((spec.name,
+                     ref_notes.track(spec.program, spec.is_drum),
+                     est_notes.track(spec.program, spec.is_drum)))
+
+  pianorolls = []
+  for instrument_name, ref_track, est_track in tracks:
+    is_drum = bool(np.all(ref_track.is_drum))
+    pianorolls.append((instrument_name, (
+        metrics_utils.get_pianoroll(est_track, frame_fps, is_drum=is_drum),
+        metrics_utils.get_pianoroll(ref_track, frame_fps, is_drum=is_drum))))
+  return pianorolls
+
+
+def _example_metric_fns(
+    ref_notes: note_sequences.NoteArray,
+    est_notes: note_sequences.NoteArray,
+    onsets_only: bool,
+    track_specs: Optional[Sequence[note_sequences.TrackSpec]],
+    frame_fps: float,
+    frame_velocity_threshold: int
+) -> Sequence[Callable[[], Any]]:
+  """Independent functions computing each metric family for one example."""
+  metric_fns = [
+      functools.partial(
+          _track_scores, ref_notes, est_notes,
+          onsets_only=onsets_only, track_specs=track_specs,
+          frame_fps=frame_fps,
+          frame_velocity_threshold=frame_velocity_threshold)
+  ]
+
+  # Add program-aware note metrics for all program granularities.
+  # Note that this interacts with the training program granularity; in
+  # particular granularities *higher* than the training granularity are likely
+  # to have poor metrics.
+  for granularity_type in vocabularies.PROGRAM_GRANULARITIES:
+    metric_fns.append(functools.partial(
+        _program_aware_note_scores, ref_notes, est_notes,
+        granularity_type=granularity_type))
+
+  # Add (non-program-aware) note metrics across a range of onset/offset
+  # tolerances, for the full NoteSequence minus drums. These use notes with
+  # the minimum length applied for frame metrics.
+  ref_notes_drumless = ref_notes[~ref_notes.is_drum]
+  est_notes_drumless = est_notes[~est_notes.is_drum]
+  is_drum = bool(np.all(ref_notes_drumless.is_drum))
+  metric_fns.append(functools.partial(
+      _note_onset_tolerance_sweep,
+      ref_notes=metrics_utils.lengthen_short_notes(
+          ref_notes_drumless, is_drum),
+      est_notes=metrics_utils.lengthen_short_notes(
+          est_notes_drumless, is_drum)))
+
+  return metric_fns
+
+
 def _note_onset_tolerance_sweep(
-    ref_ns: note_seq.NoteSequence, est_ns: note_seq.NoteSequence,
+    ref_notes: note_sequences.NoteArray, est_notes: note_sequences.NoteArray,
     tolerances: Iterable[float] = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5)
 ) -> Mapping[str, float]:
   """Compute note precision/recall/F1 across a range of tolerances."""
-  est_intervals, est_pitches, unused_est_velocities = (
-      note_seq.sequences_lib.sequence_to_valued_intervals(est_ns))
-  ref_intervals, ref_pitches, unused_ref_velocities = (
-      note_seq.sequences_lib.sequence_to_valued_intervals(ref_ns))
+  tolerances = tuple(tolerances)
+  matcher = _note_matcher(
+      ref_notes[_valid_note_mask(ref_notes)],
+      est_notes[_valid_note_mask(est_notes)],
+      max_onset_tolerance=max(tolerances))
 
   scores = {}
 
   for tol in tolerances:
-    precision, recall, f_measure, _ = (
-        mir_eval.transcription.precision_recall_f1_overlap(
-            ref_intervals=ref_intervals, ref_pitches=ref_pitches,
-            est_intervals=est_intervals, est_pitches=est_pitches,
-            onset_tolerance=tol, offset_min_tolerance=tol))
+    precision, recall, f_measure, _ = matcher.precision_recall_f1_overlap(
+        onset_tolerance=tol, offset_min_tolerance=tol)
 
     scores[f'Onset + offset precision ({tol})'] = precision
     scores[f'Onset + offset recall ({tol})'] = recall
@@ -172,6 +410,7 @@ def _note_onset_tolerance_sweep(
   return scores
 
 
+@gin.configurable
 def transcription_metrics(
     targets: Sequence[Mapping[str, Any]],
     predictions: Sequence[Mapping[str, Any]],
@@ -183,8 +422,33 @@ def transcription_metrics(
     num_summary_examples: int = 5,
     frame_fps: float = 62.5,
     frame_velocity_threshold: int = 30,
+    num_workers: int = 0,
+    summary_max_seconds: Optional[float] = None,
+    summary_max_bytes: Optional[int] = None
 ) -> Mapping[str, seqio.metrics.MetricValue]:
-  """Compute mir_eval transcription metrics."""
+  """Compute mir_eval transcription metrics.
+
+  Args:
+    targets: Targets, each with 'unique_id' and (for the first target of each
+        full example) 'ref_ns'.
+    predictions: Predictions for each segment, to be combined by 'unique_id'.
+    codec: An event_codec.Codec used to decode predicted tokens.
+    spectrogram_config: Spectrogram configuration, used for audio summaries.
+    onsets_only: If True, predictions contain onsets only.
+    use_ties: If True, predictions use the "tie" representation.
+    track_specs: Optional tracks to compute metrics for separately.
+    num_summary_examples: Number of examples to summarize.
+    frame_fps: Frame rate of the pianorolls used for frame metrics.
+    frame_velocity_threshold: Velocity threshold for frame metrics.
+    num_workers: Number of processes used to compute metrics; if zero, metrics
+        are computed in the calling process.
+    summary_max_seconds: Optional limit on time spent generating summaries;
+        examples past the limit are not summarized.
+    summary_max_bytes: Optional limit on the total size of summaries.
+
+  Returns:
+    A dictionary of mean scores, score histograms, and summaries.
+  """
   if onsets_only and use_ties:
     raise ValueError('Ties not compatible with onset-only transcription.')
   if onsets_only:
@@ -194,164 +458,76 @@ def transcription_metrics(
   else:
     encoding_spec = note_sequences.NoteEncodingWithTiesSpec
 
-  # The first target for each full example contains the NoteSequence; just
-  # organize by ID.
-  full_targets = {}
-  for target in targets:
-    if target['ref_ns']:
-      full_targets[target['unique_id']] = {'ref_ns': target['ref_ns']}
-
-  # Gather all predictions for the same ID and concatenate them in time order,
-  # to construct full-length predictions.
-  full_predictions = metrics_utils.combine_predictions_by_id(
-      predictions=predictions,
-      combine_predictions_fn=functools.partial(
-          metrics_utils.event_predictions_to_ns,
-          codec=codec,
-          encoding_spec=encoding_spec))
-
-  assert sorted(full_targets.keys()) == sorted(full_predictions.keys())
-
-  full_target_prediction_pairs = [
-      (full_targets[id], full_predictions[id])
-      for id in sorted(full_targets.keys())
-  ]
+  combine_predictions_fn = functools.partial(
+      metrics_utils.event_predictions_to_ns,
+      codec=codec,
+      encoding_spec=encoding_spec)
 
-  scores = collections.defaultdict(list)
-  all_track_pianorolls = collections.defaultdict(list)
-  for target, prediction in full_target_prediction_pairs:
-    scores['Invalid events'].append(prediction['est_invalid_events'])
-    scores['Dropped events'].append(prediction['est_dropped_events'])
-
-    def remove_drums(ns):
-      ns_drumless = note_seq.NoteSequence()
-      ns_drumless.CopyFrom(ns)
-      del ns_drumless.notes[:]
-      ns_drumless.notes.extend([note for note in ns.notes if not note.is_drum])
-      return ns_drumless
-
-    est_ns_drumless = remove_drums(prediction['est_ns'])
-    ref_ns_drumless = remove_drums(target['ref_ns'])
-
-    # Whether or not there are separate tracks, compute metrics for the full
-    # NoteSequence minus drums.
-    est_tracks = [est_ns_drumless]
-    ref_tracks = [ref_ns_drumless]
-    use_track_offsets = [not onsets_only]
-    use_track_velocities = [not onsets_only]
-    track_instrument_names = ['']
-
-    if track_specs is not None:
-      # Compute transcription metrics separately for each track.
-      for spec in track_specs:
-        est_tracks.append(note_sequences.extract_track(
-            prediction['est_ns'], spec.program, spec.is_drum))
-        ref_tracks.append(note_sequences.extract_track(
-            target['ref_ns'], spec.program, spec.is_drum))
-        use_track_offsets.append(not onsets_only and not spec.is_drum)
-        use_track_velocities.append(not onsets_only)
-        track_instrument_names.append(spec.name)
-
-    for est_ns, ref_ns, use_offsets, use_velocities, instrument_name in zip(
-        est_tracks, ref_tracks, use_track_offsets, use_track_velocities,
-        track_instrument_names):
-      track_scores = {}
-
-      est_intervals, est_pitches, est_velocities = (
-          note_seq.sequences_lib.sequence_to_valued_intervals(est_ns))
-
-      ref_intervals, ref_pitches, ref_velocities = (
-          note_seq.sequences_lib.sequence_to_valued_intervals(ref_ns))
-
-      # Precision / recall / F1 using onsets (and pitches) only.
-      precision, recall, f_measure, avg_overlap_ratio = (
-          mir_eval.transcription.precision_recall_f1_overlap(
-              ref_intervals=ref_intervals,
-              ref_pitches=ref_pitches,
-              est_intervals=est_intervals,
-              est_pitches=est_pitches,
-              offset_ratio=None))
-      del avg_overlap_ratio
-      track_scores['Onset precision'] = precision
-      track_scores['Onset recall'] = recall
-      track_scores['Onset F1'] = f_measure
-
-      if use_offsets:
-        # Precision / recall / F1 using onsets and offsets.
-        precision, recall, f_measure, avg_overlap_ratio = (
-            mir_eval.transcription.precision_recall_f1_overlap(
-                ref_intervals=ref_intervals,
-                ref_pitches=ref_pitches,
-                est_intervals=est_intervals,
-                est_pitches=est_pitches))
-        del avg_overlap_ratio
-        track_scores['Onset + offset precision'] = precision
-        track_scores['Onset + offset recall'] = recall
-        track_scores['Onset + offset F1'] = f_measure
-
-      if use_velocities:
-        # Precision / recall / F1 using onsets and velocities (no offsets).
-        precision, recall, f_measure, avg_overlap_ratio = (
-            mir_eval.transcription_velocity.precision_recall_f1_overlap(
-                ref_intervals=ref_intervals,
-                ref_pitches=ref_pitches,
-                ref_velocities=ref_velocities,
-                est_intervals=est_intervals,
-                est_pitches=est_pitches,
-                est_velocities=est_velocities,
-                offset_ratio=None))
-        track_scores['Onset + velocity precision'] = precision
-        track_scores['Onset + velocity recall'] = recall
-        track_scores['Onset + velocity F1'] = f_measure
-
-      if use_offsets and use_velocities:
-        # Precision / recall / F1 using onsets, offsets, and velocities.
-        precision, recall, f_measure, avg_overlap_ratio = (
-            mir_eval.transcription_velocity.precision_recall_f1_overlap(
-                ref_intervals=ref_intervals,
-                ref_pitches=ref_pitches,
-                ref_velocities=ref_velocities,
-                est_intervals=est_intervals,
-                est_pitches=est_pitches,
-                est_velocities=est_velocities))
-        track_scores['Onset + offset + velocity precision'] = precision
-        track_scores['Onset + offset + velocity recall'] = recall
-        track_scores['Onset + offset + velocity F1'] = f_measure
-
-      # Calculate framewise metrics.
-      is_drum = all([n.is_drum for n in ref_ns.notes])
-      ref_pr = metrics_utils.get_prettymidi_pianoroll(
-          ref_ns, frame_fps, is_drum=is_drum)
-      est_pr = metrics_utils.get_prettymidi_pianoroll(
-          est_ns, frame_fps, is_drum=is_drum)
-      all_track_pianorolls[instrument_name].append((est_pr, ref_pr))
-      frame_precision, frame_recall, frame_f1 = metrics_utils.frame_metrics(
-          ref_pr, est_pr, velocity_threshold=frame_velocity_threshold)
-      track_scores['Frame Precision'] = frame_precision
-      track_scores['Frame Recall'] = frame_recall
-      track_scores['Frame F1'] = frame_f1
-
-      for metric_name, metric_value in track_scores.items():
-        if instrument_name:
-          scores[f'{instrument_name}/{metric_name}'].append(metric_value)
-        else:
-          scores[metric_name].append(metric_value)
-
-    # Add program-aware note metrics for all program granularities.
-    # Note that this interacts with the training program granularity; in
-    # particular granularities *higher* than the training granularity are likely
-    # to have poor metrics.
-    for granularity_type in vocabularies.PROGRAM_GRANULARITIES:
-      for name, score in _program_aware_note_scores(
-          target['ref_ns'], prediction['est_ns'],
-          granularity_type=granularity_type).items():
+  if num_workers:
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context('spawn'))
+  else:
+    executor = contextlib.nullcontext()
+
+  with executor:
+    # Combine the segments of each example as soon as they have all arrived,
+    # and start computing its metrics. Metric families for each example are
+    # independent jobs, which run in the process pool if `num_workers` > 0.
+    # Only the examples to summarize (the first by ID) are kept, with their
+    # audio.
+    example_results = {}
+    examples_to_summarize = {}
+    for segments in metrics_utils.group_consecutive_by_id(
+        zip(targets, predictions), id_fn=lambda seg: seg[1]['unique_id']):
+      segment_targets, segment_predictions = zip(*segments)
+      unique_id = segment_predictions[0]['unique_id']
+
+      # The first target for each full example contains the NoteSequence.
+      ref_ns = next(
+          (target['ref_ns'] for target in segment_targets if target['ref_ns']),
+          None)
+      if ref_ns is None:
+        raise ValueError(f'No reference NoteSequence for example {unique_id}')
+      target = {'ref_ns': ref_ns}
+      prediction = combine_predictions_fn(segment_predictions)
+
+      metric_fns = _example_metric_fns(
+          ref_notes=note_sequences.NoteArray.from_note_sequence(ref_ns),
+          est_notes=note_sequences.NoteArray.from_note_sequence(
+              prediction['est_ns']),
+          onsets_only=onsets_only,
+          track_specs=track_specs,
+          frame_fps=frame_fps,
+          frame_velocity_threshold=frame_velocity_threshold)
+      if num_workers:
+        results = [executor.submit(fn) for fn in metric_fns]
+      else:
+        results = [fn() for fn in metric_fns]
+      example_results[unique_id] = (
+          prediction['est_invalid_events'], prediction['est_dropped_events'],
+          results)
+
+      examples_to_summarize[unique_id] = (target, prediction)
+      if len(examples_to_summarize) > num_summary_examples:
+        del examples_to_summarize[max(examples_to_summarize)]
+
+    # Gather scores in order of ID, so that results do not depend on the
+    # order of examples or the number of workers.
+    scores = collections.defaultdict(list)
+    for unique_id in sorted(example_results):
+      invalid_events, dropped_events, results = example_results[unique_id]
+      scores['Invalid events'].append(invalid_events)
+      scores['Dropped events'].append(dropped_events)
+
+      if num_workers:
+        results = [result.result() for result in results]
+      track_scores, *family_scores = results
+      for name, score in track_scores:
         scores[name].append(score)
-
-    # Add (non-program-aware) note metrics across a range of onset/offset
-    # tolerances.
-    for name, score in _note_onset_tolerance_sweep(
-        ref_ns=ref_ns_drumless, est_ns=est_ns_drumless).items():
-      scores[name].append(score)
+      for example_scores in family_scores:
+        for name, score in example_scores.items():
+          scores[name].append(score)
 
   mean_scores = {k: np.mean(v) for k, v in scores.items()}
 
@@ -360,13 +536,18 @@ def transcription_metrics(
 
   # Pick several examples to summarize.
   targets_to_summarize, predictions_to_summarize = zip(
-      *full_target_prediction_pairs[:num_summary_examples])
+      *(examples_to_summarize[unique_id]
+        for unique_id in sorted(examples_to_summarize)))
+
+  budget = summaries.SummaryBudget(
+      max_seconds=summary_max_seconds, max_bytes=summary_max_bytes)
 
   # Compute audio summaries.
   audio_summaries = summaries.audio_summaries(
       targets=targets_to_summarize,
       predictions=predictions_to_summarize,
-      spectrogram_config=spectrogram_config)
+      spectrogram_config=spectrogram_config,
+      budget=budget)
 
   # Compute transcription summaries.
   transcription_summaries = summaries.transcription_summaries(
@@ -374,14 +555,21 @@ def transcription_metrics(
       predictions=predictions_to_summarize,
       spectrogram_config=spectrogram_config,
       ns_feature_suffix='ns',
-      track_specs=track_specs)
-
-  pianorolls_to_summarize = {
-      k: v[:num_summary_examples] for k, v in all_track_pianorolls.items()
-  }
+      track_specs=track_specs,
+      budget=budget)
+
+  pianorolls_to_summarize = collections.defaultdict(list)
+  for target, prediction in zip(targets_to_summarize, predictions_to_summarize):
+    for instrument_name, pianorolls in _track_pianorolls(
+        ref_notes=note_sequences.NoteArray.from_note_sequence(target['ref_ns']),
+        est_notes=note_sequences.NoteArray.from_note_sequence(
+            prediction['est_ns']),
+        track_specs=track_specs,
+        frame_fps=frame_fps):
+      pianorolls_to_summarize[instrument_name].append(pianorolls)
 
   prettymidi_pianoroll_summaries = summaries.prettymidi_pianoroll(
-      pianorolls_to_summarize, fps=frame_fps)
+      pianorolls_to_summarize, fps=frame_fps, budget=budget)
 
   return {
       **mean_scores,
@@ -15,18 +15,17 @@
 """Utilities for transcription metrics."""
 
 import collections
+import dataclasses
 import functools
 
-from typing import Any, Callable, Mapping, Optional, Sequence, Tuple, TypeVar
+from typing import (Any, Callable, Iterable, Iterator, Mapping, Optional,
+                    Sequence, Tuple, TypeVar)
 
 from mt3_audio2midi.mt3 import event_codec
 from mt3_audio2midi.mt3 import note_sequences
-from mt3_audio2midi.mt3 import run_length_encoding
 
 import note_seq
 import numpy as np
-import pretty_midi
-import sklearn
 
 S = TypeVar('S')
 T = TypeVar('T')
@@ -56,6 +55,42 @@ def combine_predictions_by_id(
   }
 
 
+def group_consecutive_by_id(
+    examples: Iterable[T], id_fn: Callable[[T], Any]
+) -> Iterator[Sequence[T]]:
+  """Group examples (e.g. segments) by ID as they arrive.
+
+  Examples with the same ID must be consecutive; each group is yielded as soon
+  as an example with a different ID arrives, so that it can be processed and
+  released before the rest of the examples are read.
+
+  Args:
+    examples: Examples, grouped by ID.
+    id_fn: Function that returns the ID of an example.
+
+  Yields:
+    Lists of consecutive examples with the same ID.
+
+  Raises:
+    ValueError: If examples with the same ID are not consecutive.
+  """
+  finished_ids = set()
+  group = []
+  group_id = None
+  for ex in examples:
+    ex_id = id_fn(ex)
+    if group and ex_id != group_id:
+      finished_ids.add(group_id)
+      yield group
+      group = []
+    if ex_id in finished_ids:
+      raise ValueError(f'Examples with ID {ex_id} are not consecutive.')
+    group_id = ex_id
+    group.append(ex)
+  if group:
+    yield group
+
+
 def decode_and_combine_predictions(
     predictions: Sequence[Mapping[str, Any]],
     init_state_fn: Callable[[], S],
@@ -126,71 +161,101 @@ def event_predictions_to_ns(
       init_state_fn=encoding_spec.init_decoding_state_fn,
       begin_segment_fn=encoding_spec.begin_decoding_segment_fn,
       decode_tokens_fn=functools.partial(
-          run_length_encoding.decode_events,
+          event_codec.decode_events,
           codec=codec,
           decode_event_fn=encoding_spec.decode_event_fn),
       flush_state_fn=encoding_spec.flush_decoding_state_fn)
 
-  # Also concatenate raw inputs from all predictions.
   sorted_predictions = sorted(predictions, key=lambda pred: pred['start_time'])
-  raw_inputs = np.concatenate(
-      [pred['raw_inputs'] for pred in sorted_predictions], axis=0)
   start_times = [pred['start_time'] for pred in sorted_predictions]
 
-  return {
-      'raw_inputs': raw_inputs,
+  combined = {
       'start_times': start_times,
       'est_ns': ns,
       'est_invalid_events': total_invalid_events,
       'est_dropped_events': total_dropped_events,
+      # Segments not run through the model, e.g. because they were silent.
+      'est_skipped_segments': sum(
+          pred.get('skipped', False) for pred in predictions),
   }
+  # Also concatenate raw inputs from all predictions, if they were kept for
+  # audio summaries.
+  if all('raw_inputs' in pred for pred in sorted_predictions):
+    combined['raw_inputs'] = np.concatenate(
+        [pred['raw_inputs'] for pred in sorted_predictions], axis=0)
+  return combined
+
 
+def lengthen_short_notes(
+    notes: note_sequences.NoteArray, is_drum: bool
+) -> note_sequences.NoteArray:
+  """Give all drum notes a fixed length, and all others a min length."""
+  lengthen = is_drum | (notes.end_time - notes.start_time < 0.05)
+  return dataclasses.replace(notes, end_time=np.where(
+      lengthen, notes.start_time + 0.05, notes.end_time))
 
-def get_prettymidi_pianoroll(ns: note_seq.NoteSequence, fps: float,
-                             is_drum: bool):
-  """Convert NoteSequence to pianoroll through pretty_midi."""
-  for note in ns.notes:
-    if is_drum or note.end_time - note.start_time < 0.05:
-      # Give all drum notes a fixed length, and all others a min length
-      note.end_time = note.start_time + 0.05
-
-  pm = note_seq.note_sequence_to_pretty_midi(ns)
-  end_time = pm.get_end_time()
-  cc = [
-      # all sound off
-      pretty_midi.ControlChange(number=120, value=0, time=end_time),
-      # all notes off
-      pretty_midi.ControlChange(number=123, value=0, time=end_time)
-  ]
-  pm.instruments[0].control_changes = cc
-  if is_drum:
-    # If inst.is_drum is set, pretty_midi will return an all zero pianoroll.
-    for inst in pm.instruments:
-      inst.is_drum = False
-  pianoroll = pm.get_piano_roll(fs=fps)
-  return pianoroll
+
+def get_pianoroll(notes: note_sequences.NoteArray, fps: float,
+                  is_drum: bool) -> np.ndarray:
+  """Rasterize notes into a pianoroll of summed velocities.
+
+  Matches converting to pretty_midi and calling `get_piano_roll`, with
+  velocities saturated at 255, except that notes are kept regardless of their
+  (instrument, program) pairs: the pretty_midi conversion drops notes whose
+  instrument has an inconsistent program, while here every note is rasterized.
+
+  Args:
+    notes: Notes to rasterize; not modified.
+    fps: Pianoroll frames per second.
+    is_drum: If True, notes are drums and rasterized with a fixed length;
+        otherwise drum notes are silent.
+
+  Returns:
+    A uint8 pianoroll of shape (128, num_frames).
+  """
+  notes = lengthen_short_notes(notes, is_drum)
+  if not len(notes):
+    return np.zeros((128, 0), dtype=np.uint8)
+  num_frames = int(fps * np.max(notes.end_time))
+
+  start_frames = (notes.start_time * fps).astype(np.int64)
+  end_frames = (notes.end_time * fps).astype(np.int64)
+  sounding = (is_drum | ~notes.is_drum) & (end_frames > start_frames)
+
+  # Add each note's velocity at its start frame and subtract it at its end
+  # frame, then accumulate over time.
+  width = num_frames + 1
+  pitch_offsets = notes.pitch[sounding].astype(np.int64) * width
+  velocities = notes.velocity[sounding]
+  deltas = (
+      np.bincount(pitch_offsets + start_frames[sounding], weights=velocities,
+                  minlength=128 * width) -
+      np.bincount(pitch_offsets + end_frames[sounding], weights=velocities,
+                  minlength=128 * width))
+  pianoroll = np.cumsum(deltas.reshape(128, width), axis=1)[:, :num_frames]
+  return np.minimum(pianoroll, 255).astype(np.uint8)
 
 
 def frame_metrics(ref_pianoroll: np.ndarray,
                   est_pianoroll: np.ndarray,
                   velocity_threshold: int) -> Tuple[float, float, float]:
   """Frame Precision, Recall, and F1."""
-  # Pad to same length
-  if ref_pianoroll.shape[1] > est_pianoroll.shape[1]:
-    diff = ref_pianoroll.shape[1] - est_pianoroll.shape[1]
-    est_pianoroll = np.pad(est_pianoroll, [(0, 0), (0, diff)], mode='constant')
-  elif est_pianoroll.shape[1] > ref_pianoroll.shape[1]:
-    diff = est_pianoroll.shape[1] - ref_pianoroll.shape[1]
-    ref_pianoroll = np.pad(ref_pianoroll, [(0, 0), (0, diff)], mode='constant')
-
   # For ref, remove any notes that are too quiet (consistent with Cerberus.)
   ref_frames_bool = ref_pianoroll > velocity_threshold
   # For est, keep all predicted notes.
   est_frames_bool = est_pianoroll > 0
 
-  precision, recall, f1, _ = sklearn.metrics.precision_recall_fscore_support(
-      ref_frames_bool.flatten(),
-      est_frames_bool.flatten(),
-      labels=[True, False])
+  # Frames past the end of the shorter pianoroll are inactive in it.
+  num_frames = min(ref_frames_bool.shape[1], est_frames_bool.shape[1])
+  true_positives = np.count_nonzero(
+      ref_frames_bool[:, :num_frames] & est_frames_bool[:, :num_frames])
+  num_ref = np.count_nonzero(ref_frames_bool)
+  num_est = np.count_nonzero(est_frames_bool)
+
+  # Undefined scores are zero, as in sklearn.
+  precision = true_positives / num_est if num_est else 0.0
+  recall = true_positives / num_ref if num_ref else 0.0
+  f1 = (2 * true_positives / (num_ref + num_est)
+        if num_ref + num_est else 0.0)
 
-  return precision[0], recall[0], f1[0]
+  return precision, recall, f1
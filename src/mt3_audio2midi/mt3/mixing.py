@@ -14,7 +14,7 @@
 
 """Functions for mixing (in the audio sense) multiple transcription examples."""
 
-from typing import Callable, Optional, Sequence
+from typing import Any, Callable, Mapping, MutableMapping, Optional, Sequence
 
 import gin
 
@@ -26,6 +26,64 @@ import seqio
 import tensorflow as tf
 
 
+def mix_inputs(inputs: Sequence[np.ndarray]) -> np.ndarray:
+  """Sum audio of different lengths and normalize to a peak of one.
+
+  Audio is summed in place into a single buffer of the longest length, so
+  memory does not grow with the number of examples being mixed.
+
+  Args:
+    inputs: Audio arrays to mix, all with the same shape except for the first
+        dimension.
+
+  Returns:
+    The mixed audio.
+  """
+  mixed = np.zeros(
+      (max(len(x) for x in inputs),) + inputs[0].shape[1:],
+      dtype=inputs[0].dtype)
+  for x in inputs:
+    mixed[:len(x)] += x
+  norm = np.max(np.abs(mixed), initial=0)
+  if norm > 0:
+    mixed /= norm
+  return mixed
+
+
+def mix_examples(
+    examples: Sequence[Mapping[str, Any]],
+    codec: event_codec.Codec,
+    inputs_feature_key: str = 'inputs',
+    targets_feature_keys: Sequence[str] = ('targets',)
+) -> MutableMapping[str, Any]:
+  """Mix transcription examples of different lengths into a single example.
+
+  Args:
+    examples: Transcription examples with NumPy features, each of which should
+        have an 'inputs' field containing audio samples and a 'targets' field
+        containing run-length encoded note events.
+    codec: An event_codec.Codec used to interpret the target events.
+    inputs_feature_key: Feature key for inputs which will be mixed as audio.
+    targets_feature_keys: List of feature keys for targets, each of which will
+        be merged (separately) as run-length encoded note events.
+
+  Returns:
+    The mixed example; other features are taken from the first example.
+  """
+  ex = dict(examples[0])
+  ex[inputs_feature_key] = mix_inputs(
+      [e[inputs_feature_key] for e in examples])
+  for k in targets_feature_keys:
+    ex[k] = run_length_encoding.merge_run_length_encoded_targets_np(
+        targets=[e[k] for e in examples], codec=codec)
+  return ex
+
+
+def _split_ragged(flat_values: np.ndarray,
+                  row_lengths: np.ndarray) -> Sequence[np.ndarray]:
+  return np.split(flat_values, np.cumsum(row_lengths)[:-1])
+
+
 @gin.configurable
 def mix_transcription_examples(
     ds: tf.data.Dataset,
@@ -58,34 +116,45 @@ def mix_transcription_examples(
   Returns:
     Dataset containing mixed examples.
   """
+  del sequence_length, output_features
+
   if max_examples_per_mix is None:
     return ds
 
+  # Only the mixed features are batched; other features (e.g. full-song state
+  # events) would not be meaningful after mixing anyway.
+  ds = ds.map(
+      lambda ex: {k: ex[k] for k in [inputs_feature_key, *targets_feature_keys]},
+      num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+  # Ragged batches avoid padding every example to the longest one in the mix.
   # TODO(iansimon): is there a way to use seqio's seed?
   ds = tf.data.Dataset.sample_from_datasets([
       ds.shuffle(
           buffer_size=shuffle_buffer_size // max_examples_per_mix
-      ).padded_batch(batch_size=i) for i in range(1, max_examples_per_mix + 1)
+      ).ragged_batch(batch_size=i) for i in range(1, max_examples_per_mix + 1)
   ])
 
-  def mix_inputs(ex):
-    samples = tf.reduce_sum(ex[inputs_feature_key], axis=0)
-    norm = tf.linalg.norm(samples, ord=np.inf)
-    ex[inputs_feature_key] = tf.math.divide_no_nan(samples, norm)
-    return ex
-  ds = ds.map(mix_inputs, num_parallel_calls=tf.data.experimental.AUTOTUNE)
-
-  max_tokens = sequence_length['targets']
-  if output_features['targets'].add_eos:
-    # Leave room to insert an EOS token.
-    max_tokens -= 1
+  def mix(ex):
+    inputs = ex[inputs_feature_key]
+    mixed_inputs = tf.numpy_function(
+        lambda values, lengths: mix_inputs(_split_ragged(values, lengths)),
+        [inputs.flat_values, inputs.row_lengths()],
+        inputs.dtype, stateful=False)
+    mixed_inputs.set_shape([None] + inputs.shape[2:])
+    ex[inputs_feature_key] = mixed_inputs
 
-  def mix_targets(ex):
     for k in targets_feature_keys:
-      ex[k] = run_length_encoding.merge_run_length_encoded_targets(
-          targets=ex[k],
-          codec=codec)
+      targets = ex[k]
+      mixed_targets = tf.numpy_function(
+          lambda values, lengths: (
+              run_length_encoding.merge_run_length_encoded_targets_np(
+                  _split_ragged(values, lengths), codec=codec)),
+          [targets.flat_values, targets.row_lengths()],
+          tf.int32, stateful=False)
+      mixed_targets.set_shape([None])
+      ex[k] = mixed_targets
     return ex
-  ds = ds.map(mix_targets, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  ds = ds.map(mix, num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
   return ds
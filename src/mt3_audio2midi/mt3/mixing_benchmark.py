@@ -0,0 +1,136 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Throughput benchmark for mixing transcription examples.
+
+Compares `mixing.mix_examples` (preallocated audio buffer and vectorized target
+merge) with summing padded audio and merging targets with the loop-based
+`run_length_encoding.merge_run_length_encoded_targets`, on synthetic examples.
+
+Usage:
+python -m mt3_audio2midi.mt3.mixing_benchmark \
+  --max_examples_per_mix=8 --example_seconds=30
+"""
+
+import time
+from typing import Any, Callable, Mapping, Sequence
+
+from absl import app
+from absl import flags
+from absl import logging
+
+from mt3_audio2midi.mt3 import event_codec
+from mt3_audio2midi.mt3 import mixing
+from mt3_audio2midi.mt3 import run_length_encoding
+from mt3_audio2midi.mt3 import spectrograms
+from mt3_audio2midi.mt3 import vocabularies
+
+import numpy as np
+import tensorflow as tf
+
+_NUM_MIXES = flags.DEFINE_integer(
+    'num_mixes', 100, 'Number of mixes to time for each implementation.')
+_MAX_EXAMPLES_PER_MIX = flags.DEFINE_integer(
+    'max_examples_per_mix', 8, 'Number of examples in each mix.')
+_EXAMPLE_SECONDS = flags.DEFINE_float(
+    'example_seconds', 30.0, 'Maximum length of each example in seconds.')
+_NOTES_PER_SECOND = flags.DEFINE_float(
+    'notes_per_second', 10.0, 'Number of notes per second in each example.')
+_SKIP_REFERENCE = flags.DEFINE_bool(
+    'skip_reference', False, 'Only time `mixing.mix_examples`.')
+
+
+def _random_example(
+    rng: np.random.Generator,
+    codec: event_codec.Codec,
+    spectrogram_config: spectrograms.SpectrogramConfig
+) -> Mapping[str, np.ndarray]:
+  """Random audio frames and run-length encoded targets."""
+  seconds = rng.uniform(0.5, 1.0) * _EXAMPLE_SECONDS.value
+  num_frames = int(seconds * spectrogram_config.frames_per_second)
+  inputs = rng.uniform(
+      -1, 1, (num_frames, spectrogram_config.hop_width)).astype(np.float32)
+
+  min_pitch, max_pitch = codec.event_type_range('pitch')
+  num_steps = min(int(seconds * codec.steps_per_second), codec.max_shift_steps)
+  num_notes = min(int(seconds * _NOTES_PER_SECOND.value), num_steps)
+  steps = np.sort(rng.choice(np.arange(1, num_steps + 1), num_notes,
+                             replace=False))
+  targets = np.stack(
+      [steps, rng.integers(min_pitch, max_pitch + 1, num_notes)], axis=1)
+  return {'inputs': inputs, 'targets': targets.ravel().astype(np.int32)}
+
+
+def _mix_padded(
+    examples: Sequence[Mapping[str, np.ndarray]],
+    merge_fn: Callable[[tf.Tensor], tf.Tensor]
+) -> Mapping[str, Any]:
+  """Mixing as done by padded batches of examples."""
+  max_frames = max(len(ex['inputs']) for ex in examples)
+  max_tokens = max(len(ex['targets']) for ex in examples)
+  inputs = np.stack([
+      np.pad(ex['inputs'], [(0, max_frames - len(ex['inputs'])), (0, 0)])
+      for ex in examples])
+  targets = np.stack([
+      np.pad(ex['targets'], [(0, max_tokens - len(ex['targets']))])
+      for ex in examples])
+  samples = inputs.sum(axis=0)
+  norm = np.max(np.abs(samples))
+  return {
+      'inputs': samples / norm if norm else samples,
+      'targets': merge_fn(tf.constant(targets)).numpy()
+  }
+
+
+def _time_mixes(name: str, mix_fn, mixes) -> None:
+  start_time = time.time()
+  for examples in mixes:
+    mix_fn(examples)
+  elapsed = time.time() - start_time
+  logging.info('%s: %d mixes in %.2f s (%.2f mixes/s)',
+               name, len(mixes), elapsed, len(mixes) / elapsed)
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  codec = vocabularies.build_codec(vocabularies.VocabularyConfig())
+  spectrogram_config = spectrograms.SpectrogramConfig()
+  rng = np.random.default_rng(0)
+  examples = [_random_example(rng, codec, spectrogram_config)
+              for _ in range(2 * _MAX_EXAMPLES_PER_MIX.value)]
+  mixes = [
+      [examples[i]
+       for i in rng.choice(len(examples), _MAX_EXAMPLES_PER_MIX.value,
+                           replace=False)]
+      for _ in range(_NUM_MIXES.value)
+  ]
+
+  _time_mixes('mixing.mix_examples',
+              lambda exs: mixing.mix_examples(exs, codec=codec), mixes)
+
+  if not _SKIP_REFERENCE.value:
+    # One trace for all padded target shapes, done before timing.
+    merge_fn = tf.function(
+        lambda targets: run_length_encoding.merge_run_length_encoded_targets(
+            targets, codec=codec),
+        input_signature=[tf.TensorSpec([None, None], tf.int32)])
+    _mix_padded(mixes[0], merge_fn)
+    _time_mixes('padded sum + loop merge',
+                lambda exs: _mix_padded(exs, merge_fn), mixes)
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,123 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Inference configuration of the packaged models, without global gin state.
+
+`load_model_config` reads `gin/model.gin` and `gin/{model_type}.gin` with the
+gin parser, but does not bind anything in the (process-wide) gin config, so
+models of different types can be created concurrently in one process. Parsed
+configs are cached.
+"""
+
+import dataclasses
+import functools
+import types
+from typing import Any, Dict, Mapping
+
+from gin import config_parser
+from importlib import resources
+from mt3_audio2midi.mt3 import audio_frontend
+from mt3_audio2midi.mt3 import token_vocabulary
+
+MODEL_TYPES = ('mt3', 'ismir2021')
+
+_GIN_PACKAGE = 'mt3_audio2midi'
+_T5_CONFIG_SELECTOR = 'network.T5Config'
+
+
+@dataclasses.dataclass(frozen=True)
+class ModelConfig:
+  """Configuration of a packaged model type."""
+  model_type: str
+  inputs_length: int
+  targets_length: int
+  num_velocity_bins: int
+  use_ties: bool
+  # Arguments of `network.T5Config`, except `vocab_size` which depends on the
+  # vocabulary.
+  t5_config: Mapping[str, Any]
+
+  @property
+  def vocab_config(self) -> token_vocabulary.VocabularyConfig:
+    return token_vocabulary.VocabularyConfig(
+        num_velocity_bins=self.num_velocity_bins)
+
+  @property
+  def spectrogram_config(self) -> audio_frontend.SpectrogramConfig:
+    return audio_frontend.SpectrogramConfig()
+
+
+class _ParserDelegate(config_parser.ParserDelegate):
+  """Keeps references and macros as markers instead of resolving them."""
+
+  def configurable_reference(self, scoped_name, evaluate):
+    return _Reference(scoped_name)
+
+  def macro(self, name):
+    return _Macro(name)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Reference:
+  name: str
+
+
+@dataclasses.dataclass(frozen=True)
+class _Macro:
+  name: str
+
+
+def _parse_gin_file(filename: str, macros: Dict[str, Any],
+                    bindings: Dict[str, Dict[str, Any]]) -> None:
+  """Adds the macros and bindings of a packaged gin file."""
+  text = resources.files(_GIN_PACKAGE).joinpath('gin', filename).read_text()
+  for statement in config_parser.ConfigParser(text, _ParserDelegate()):
+    if not isinstance(statement, config_parser.BindingStatement):
+      continue
+    if statement.arg_name:
+      bindings.setdefault(statement.selector, {})[statement.arg_name] = (
+          statement.value)
+    else:
+      macros[statement.selector] = statement.value
+
+
+@functools.lru_cache(maxsize=None)
+def load_model_config(model_type: str) -> ModelConfig:
+  """Reads the configuration of a packaged model type from its gin files.
+
+  Args:
+    model_type: `mt3` or `ismir2021`.
+
+  Returns:
+    The (cached) model configuration.
+  """
+  if model_type not in MODEL_TYPES:
+    raise ValueError('unknown model_type: %s' % model_type)
+  macros = {}
+  bindings = {}
+  for filename in ('model.gin', f'{model_type}.gin'):
+    _parse_gin_file(filename, macros, bindings)
+  t5_config = {}
+  for name, value in bindings[_T5_CONFIG_SELECTOR].items():
+    if isinstance(value, _Macro):
+      value = macros[value.name]
+    if not isinstance(value, _Reference):
+      t5_config[name] = value
+  return ModelConfig(
+      model_type=model_type,
+      inputs_length=macros['TASK_FEATURE_LENGTHS']['inputs'],
+      targets_length=macros['TASK_FEATURE_LENGTHS']['targets'],
+      num_velocity_bins=macros['NUM_VELOCITY_BINS'],
+      use_ties=macros['USE_TIES'],
+      t5_config=types.MappingProxyType(t5_config))
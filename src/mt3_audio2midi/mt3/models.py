@@ -20,8 +20,137 @@ from mt3_audio2midi.t5x import decoding
 from mt3_audio2midi.t5x import models
 import tensorflow as tf
 
+
+def trim_and_pack_dataset(
+    ds: tf.data.Dataset,
+    feature_lengths: Mapping[str, int]) -> tf.data.Dataset:
+  """Pack examples whose features may be continuous and of rank > 1.
+
+  Works like `seqio.utils.trim_and_pack_dataset`, but does not use zero values
+  to detect padding (a zero spectrogram frame is a valid input), so features
+  such as `[num_frames, num_mel_bins]` spectrograms can be packed alongside
+  integer targets. Packing is done along the first dimension of each feature.
+
+  For each key in `feature_lengths`, `<key>_segment_ids` and `<key>_positions`
+  features are added; features not in `feature_lengths` are removed.
+
+  Args:
+    ds: a tf.data.Dataset.
+    feature_lengths: map from feature key to packed length.
+
+  Returns:
+    a tf.data.Dataset of packed examples.
+  """
+  keys = list(feature_lengths)
+  element_spec = ds.element_spec
+  inner_shapes = {}
+  for k in keys:
+    if k not in element_spec:
+      raise ValueError(
+          f"Feature '{k}' not found in dataset. Available keys are "
+          f'{list(element_spec.keys())}')
+    inner_shapes[k] = element_spec[k].shape[1:]
+    if not inner_shapes[k].is_fully_defined():
+      raise ValueError(
+          f"Feature '{k}' must have a fully defined shape after its first "
+          f'dimension to be packed, got {element_spec[k].shape}.')
+  dtypes = {k: element_spec[k].dtype for k in keys}
+  packed_lengths = {k + suffix: l
+                    for k, l in feature_lengths.items()
+                    for suffix in ('', '_positions', '_segment_ids')}
+
+  def trim_and_add_lengths(ex):
+    ex = {k: ex[k][:l] for k, l in feature_lengths.items()}
+    for k in keys:
+      ex[k + '_length'] = tf.shape(ex[k])[0]
+    return ex
+
+  ds = ds.map(trim_and_add_lengths,
+              num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+  # Setting batch_size=length ensures that the concatenated sequences (if they
+  # have length >=1) are sufficient to fill at least one packed example.
+  batch_size = max(feature_lengths.values())
+  padded_shapes = {k: [-1, *inner_shapes[k].as_list()] for k in keys}
+  padded_shapes.update({k + '_length': [] for k in keys})
+  ds = ds.padded_batch(batch_size, padded_shapes=padded_shapes)
+
+  empty_example = {}
+  for k in keys:
+    empty_example[k] = tf.zeros([0, *inner_shapes[k].as_list()], dtypes[k])
+    for suffix in ('_positions', '_segment_ids'):
+      empty_example[k + suffix] = tf.zeros([0], dtype=tf.int32)
+  partial_shapes = {k: v.shape[1:] for k, v in empty_example.items()}
+
+  def write_packed_example(partial, outputs):
+    new_outputs = {}
+    for k, v in partial.items():
+      paddings = ([[0, packed_lengths[k] - tf.shape(v)[0]]] +
+                  [[0, 0]] * (v.shape.rank - 1))
+      new_outputs[k] = outputs[k].write(outputs[k].size(), tf.pad(v, paddings))
+    return empty_example.copy(), new_outputs, tf.constant(0)
+
+  def pack_batch(x):
+    """Greedily pack a padded batch of examples into fixed-length examples."""
+    partial = empty_example.copy()
+    num_segments = tf.constant(0)
+    outputs = {}
+    for k, v in empty_example.items():
+      outputs[k] = tf.TensorArray(
+          v.dtype, size=0, dynamic_size=True,
+          element_shape=[packed_lengths[k], *partial_shapes[k].as_list()])
+
+    for i in tf.range(0, tf.shape(x[keys[0]])[0]):
+      tf.autograph.experimental.set_loop_options(
+          shape_invariants=[
+              (partial, {k: tf.TensorShape([None, *partial_shapes[k]])
+                         for k in partial}),
+              (outputs, {k: tf.TensorShape(None) for k in outputs}),
+          ])
+
+      can_append = True
+      for k in keys:
+        can_append = tf.logical_and(
+            can_append,
+            tf.shape(partial[k])[0] + x[k + '_length'][i] <= feature_lengths[k])
+
+      if not can_append:
+        partial, outputs, num_segments = write_packed_example(partial, outputs)
+
+      num_segments += 1
+      new_partial = {}
+      for k in keys:
+        length = x[k + '_length'][i]
+        new_partial[k] = tf.concat([partial[k], x[k][i][:length]], 0)
+        new_partial[k + '_positions'] = tf.concat(
+            [partial[k + '_positions'], tf.range(length, dtype=tf.int32)], 0)
+        new_partial[k + '_segment_ids'] = tf.concat(
+            [partial[k + '_segment_ids'], tf.fill([length], num_segments)], 0)
+      partial = new_partial
+
+    _, outputs, _ = write_packed_example(partial, outputs)
+    return {k: v.stack() for k, v in outputs.items()}
+
+  ds = ds.map(pack_batch, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  ds = ds.unbatch()
+
+  # Set the Tensor shapes correctly since they get lost in the process.
+  def set_shape(x):
+    for k, v in x.items():
+      v.set_shape([packed_lengths[k], *partial_shapes[k]])
+    return x
+
+  return ds.map(set_shape, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+
 class ContinuousInputsEncDecFeatureConverter(seqio.FeatureConverter):
-  """Feature converter for an encoder-decoder with continuous inputs."""
+  """Feature converter for an encoder-decoder with continuous inputs.
+
+  When packing, input segments are usually already at their maximum length
+  (e.g. 256 spectrogram frames) while targets are often much shorter than
+  theirs. To pack more than one segment per example, the encoder length is
+  multiplied by `inputs_pack_factor`; the decoder length is left as is.
+  """
 
   TASK_FEATURES = {
       "inputs": seqio.FeatureConverter.FeatureSpec(dtype=tf.float32, rank=2),
@@ -44,6 +173,43 @@ class ContinuousInputsEncDecFeatureConverter(seqio.FeatureConverter):
       "decoder_positions": tf.int32
   }
 
+  def __init__(self, *args, inputs_pack_factor: int = 1, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._inputs_pack_factor = inputs_pack_factor
+    # Packing always goes through `trim_and_pack_dataset`, which (unlike the
+    # default seqio packing) supports the rank-2 inputs.
+    self._use_custom_packing_ops = self.pack
+
+  def _packed_lengths(
+      self, task_feature_lengths: Mapping[str, int]) -> Mapping[str, int]:
+    """Task feature lengths after (optional) packing."""
+    if not self.pack:
+      return task_feature_lengths
+    return {
+        **task_feature_lengths,
+        "inputs": task_feature_lengths["inputs"] * self._inputs_pack_factor
+    }
+
+  def _pack_or_pad(
+      self, ds: tf.data.Dataset,
+      packed_lengths: Mapping[str, int]) -> tf.data.Dataset:
+    """Trim/pad to packed_lengths and optionally pack the input dataset.
+
+    The seqio packing ops only support one-dimensional integer features, so
+    packing of the rank-2 continuous inputs is done with
+    `trim_and_pack_dataset` above.
+
+    Args:
+      ds: an input tf.data.Dataset.
+      packed_lengths: a mapping from feature to its packed length.
+
+    Returns:
+      ds: the trimmed/padded or packed dataset.
+    """
+    if self.pack:
+      return trim_and_pack_dataset(ds, packed_lengths)
+    return super()._pack_or_pad(ds, packed_lengths)
+
   def _convert_features(
       self, ds: tf.data.Dataset,
       task_feature_lengths: Mapping[str, int]) -> tf.data.Dataset:
@@ -92,15 +258,16 @@ class ContinuousInputsEncDecFeatureConverter(seqio.FeatureConverter):
 
       return d
 
-    ds = self._pack_or_pad(ds, task_feature_lengths)
+    ds = self._pack_or_pad(ds, self._packed_lengths(task_feature_lengths))
     return ds.map(
         convert_example, num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
   def get_model_feature_lengths(
       self, task_feature_lengths: Mapping[str, int]) -> Mapping[str, int]:
     """Define the length relationship between input and output features."""
-    encoder_length = task_feature_lengths["inputs"]
-    decoder_length = task_feature_lengths["targets"]
+    packed_lengths = self._packed_lengths(task_feature_lengths)
+    encoder_length = packed_lengths["inputs"]
+    decoder_length = packed_lengths["targets"]
 
     model_feature_lengths = {
         "encoder_input_tokens": encoder_length,
@@ -124,13 +291,15 @@ class ContinuousInputsEncoderDecoderModel(models.EncoderDecoderModel):
 
   def __init__(self, module, input_vocabulary, output_vocabulary, optimizer_def,
                input_depth, decode_fn=decoding.beam_search, label_smoothing=0.0,
-               z_loss=0.0, loss_normalizing_factor=None):
+               z_loss=0.0, loss_normalizing_factor=None,
+               feature_converter_cls=None):
     super().__init__(
         module=module,
         input_vocabulary=input_vocabulary,
         output_vocabulary=output_vocabulary,
         optimizer_def=optimizer_def,
         decode_fn=decode_fn,
+        feature_converter_cls=feature_converter_cls,
         label_smoothing=label_smoothing,
         z_loss=z_loss,
         loss_normalizing_factor=loss_normalizing_factor)
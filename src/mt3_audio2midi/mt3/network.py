@@ -14,7 +14,7 @@
 
 """T5.1.1 Transformer model."""
 
-from typing import Any, Sequence
+from typing import Any, Optional, Sequence
 
 from flax import linen as nn
 from flax import struct
@@ -39,6 +39,9 @@ class T5Config:
   dropout_rate: float = 0.1
   # If `True`, the embedding weights are used in the decoder output layer.
   logits_via_embedding: bool = False
+  # Optional quantized execution mode of the Dense layers, for int8 kernels; see
+  # `layers.QUANTIZATION_MODES`.
+  quantization: Optional[str] = None
 
 
 class EncoderLayer(nn.Module):
@@ -60,6 +63,7 @@ class EncoderLayer(nn.Module):
         dtype=cfg.dtype,
         head_dim=cfg.head_dim,
         dropout_rate=cfg.dropout_rate,
+        quantization=cfg.quantization,
         name='attention')(
             x, x, encoder_mask, deterministic=deterministic)
     x = nn.Dropout(
@@ -75,6 +79,7 @@ class EncoderLayer(nn.Module):
         activations=cfg.mlp_activations,
         intermediate_dropout_rate=cfg.dropout_rate,
         dtype=cfg.dtype,
+        quantization=cfg.quantization,
         name='mlp',
     )(y, deterministic=deterministic)
     y = nn.Dropout(
@@ -111,6 +116,7 @@ class DecoderLayer(nn.Module):
         dtype=cfg.dtype,
         head_dim=cfg.head_dim,
         dropout_rate=cfg.dropout_rate,
+        quantization=cfg.quantization,
         name='self_attention')(
             x,
             x,
@@ -131,6 +137,7 @@ class DecoderLayer(nn.Module):
         dtype=cfg.dtype,
         head_dim=cfg.head_dim,
         dropout_rate=cfg.dropout_rate,
+        quantization=cfg.quantization,
         name='encoder_decoder_attention')(
             y, encoded, encoder_decoder_mask, deterministic=deterministic)
     y = nn.Dropout(
@@ -145,6 +152,7 @@ class DecoderLayer(nn.Module):
         activations=cfg.mlp_activations,
         intermediate_dropout_rate=cfg.dropout_rate,
         dtype=cfg.dtype,
+        quantization=cfg.quantization,
         name='mlp',
     )(z, deterministic=deterministic)
     z = nn.Dropout(
@@ -163,12 +171,15 @@ class Encoder(nn.Module):
   def __call__(self,
                encoder_input_tokens,
                encoder_mask=None,
-               deterministic=False):
+               deterministic=False,
+               encoder_positions=None):
     cfg = self.config
     assert encoder_input_tokens.ndim == 3  # [batch, length, depth]
 
-    seq_length = encoder_input_tokens.shape[-2]
-    inputs_positions = jnp.arange(seq_length)[None, :]
+    # Packed examples restart positions at each segment boundary.
+    if encoder_positions is None:
+      seq_length = encoder_input_tokens.shape[-2]
+      encoder_positions = jnp.arange(seq_length)[None, :]
 
     # [batch, length, depth] -> [batch, length, emb_dim]
     x = layers.DenseGeneral(  # pytype: disable=wrong-arg-types  # jax-types
@@ -176,8 +187,9 @@ class Encoder(nn.Module):
         dtype=cfg.dtype,
         kernel_init=nn.linear.default_kernel_init,
         kernel_axes=('vocab', 'embed'),
+        quantization=cfg.quantization,
         name='continuous_inputs_projection')(encoder_input_tokens)
-    x = x + layers.FixedEmbed(features=cfg.emb_dim)(inputs_positions)
+    x = x + layers.FixedEmbed(features=cfg.emb_dim)(encoder_positions)
     x = nn.Dropout(
         rate=cfg.dropout_rate, broadcast_dims=(-2,))(
             x, deterministic=deterministic)
@@ -210,8 +222,10 @@ class Decoder(nn.Module):
     cfg = self.config
     assert decoder_input_tokens.ndim == 2  # [batch, len]
 
-    seq_length = decoder_input_tokens.shape[-1]
-    decoder_positions = jnp.arange(seq_length)[None, :]
+    # Packed examples restart positions at each segment boundary.
+    if decoder_positions is None:
+      seq_length = decoder_input_tokens.shape[-1]
+      decoder_positions = jnp.arange(seq_length)[None, :]
 
     # [batch, length] -> [batch, length, emb_dim]
     y = layers.Embed(  # pytype: disable=wrong-arg-types  # jax-types
@@ -257,6 +271,7 @@ class Decoder(nn.Module):
           cfg.vocab_size,
           dtype=jnp.float32,  # Use float32 for stabiliity.
           kernel_axes=('embed', 'vocab'),
+          quantization=cfg.quantization,
           name='logits_dense')(
               y)
     return logits
@@ -275,6 +290,7 @@ class Transformer(nn.Module):
   def encode(self,
              encoder_input_tokens,
              encoder_segment_ids=None,
+             encoder_positions=None,
              enable_dropout=True):
     """Applies Transformer encoder-branch on the inputs."""
     cfg = self.config
@@ -298,7 +314,8 @@ class Transformer(nn.Module):
               dtype=cfg.dtype))
 
     return self.encoder(
-        encoder_input_tokens, encoder_mask, deterministic=not enable_dropout)
+        encoder_input_tokens, encoder_mask, deterministic=not enable_dropout,
+        encoder_positions=encoder_positions)
 
   def decode(
       self,
@@ -395,6 +412,7 @@ class Transformer(nn.Module):
     encoded = self.encode(
         encoder_input_tokens,
         encoder_segment_ids=encoder_segment_ids,
+        encoder_positions=encoder_positions,
         enable_dropout=enable_dropout)
 
     return self.decode(
@@ -0,0 +1,247 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Note matching for transcription metrics, equivalent to mir_eval.
+
+`mir_eval.transcription.match_notes` builds dense (reference x estimate)
+onset, pitch, and offset distance matrices for every call. `NoteMatcher`
+instead finds candidate note pairs once, with a sorted sweep over onsets, and
+then matches notes for any onset tolerance, offset criterion, velocity
+criterion, or grouping (e.g. by program) up to the maximum onset tolerance.
+Matchings are identical to those of mir_eval, as the same bipartite graph is
+passed to the same maximum matching algorithm.
+"""
+
+from typing import List, Optional, Tuple
+
+import mir_eval
+import numpy as np
+
+# Maximum number of (reference, estimate) pairs within the onset window
+# considered at once while finding candidates.
+_MAX_WINDOW_PAIRS = 1 << 22
+
+
+class NoteMatcher:
+  """Matches reference and estimated notes like `mir_eval.transcription`."""
+
+  def __init__(
+      self,
+      ref_intervals: np.ndarray,
+      ref_pitches: np.ndarray,
+      est_intervals: np.ndarray,
+      est_pitches: np.ndarray,
+      max_onset_tolerance: float = 0.05,
+      pitch_tolerance: float = 50.0
+  ):
+    """Find candidate note pairs.
+
+    Args:
+      ref_intervals: Reference note intervals, shape (n, 2).
+      ref_pitches: Reference note pitches in Hz, shape (n,).
+      est_intervals: Estimated note intervals, shape (m, 2).
+      est_pitches: Estimated note pitches in Hz, shape (m,).
+      max_onset_tolerance: Largest onset tolerance that notes will be matched
+          with.
+      pitch_tolerance: Pitch tolerance in cents.
+    """
+    mir_eval.transcription.validate(
+        ref_intervals, ref_pitches, est_intervals, est_pitches)
+    self.ref_intervals = ref_intervals
+    self.est_intervals = est_intervals
+    self.max_onset_tolerance = max_onset_tolerance
+
+    ref_onsets = ref_intervals[:, 0]
+    est_onsets = est_intervals[:, 0]
+    ref_log_pitches = np.log2(ref_pitches)
+    est_log_pitches = np.log2(est_pitches)
+
+    # For each reference note, the estimated notes with onsets in a window
+    # slightly wider than the tolerance, to allow for rounding of distances.
+    est_order = np.argsort(est_onsets, kind='stable')
+    sorted_est_onsets = est_onsets[est_order]
+    window = max_onset_tolerance + 10 ** -(mir_eval.transcription.N_DECIMALS - 1)
+    window_starts = np.searchsorted(
+        sorted_est_onsets, ref_onsets - window, side='left')
+    window_sizes = np.searchsorted(
+        sorted_est_onsets, ref_onsets + window, side='right') - window_starts
+
+    ref_indices = []
+    est_indices = []
+    onset_distances = []
+    chunk_ends = np.searchsorted(
+        np.cumsum(window_sizes),
+        np.arange(1, window_sizes.sum() // _MAX_WINDOW_PAIRS + 1) *
+        _MAX_WINDOW_PAIRS)
+    chunk_ends = np.concatenate([chunk_ends, [len(ref_onsets)]])
+    chunk_start = 0
+    for chunk_end in chunk_ends:
+      chunk_sizes = window_sizes[chunk_start:chunk_end]
+      ref_index = np.repeat(np.arange(chunk_start, chunk_end), chunk_sizes)
+      window_offsets = (
+          np.arange(len(ref_index)) -
+          np.repeat(np.cumsum(chunk_sizes) - chunk_sizes, chunk_sizes))
+      est_index = est_order[
+          np.repeat(window_starts[chunk_start:chunk_end], chunk_sizes) +
+          window_offsets]
+      chunk_start = chunk_end
+
+      # Same distances as mir_eval, computed for candidate pairs only.
+      onset_distance = np.around(
+          np.abs(ref_onsets[ref_index] - est_onsets[est_index]),
+          decimals=mir_eval.transcription.N_DECIMALS)
+      pitch_distance = np.abs(
+          1200 * (ref_log_pitches[ref_index] - est_log_pitches[est_index]))
+      hit = ((onset_distance <= max_onset_tolerance) &
+             (pitch_distance <= pitch_tolerance))
+      ref_indices.append(ref_index[hit])
+      est_indices.append(est_index[hit])
+      onset_distances.append(onset_distance[hit])
+
+    ref_index = np.concatenate(ref_indices)
+    est_index = np.concatenate(est_indices)
+    # Order pairs as `np.where` does for a dense hit matrix.
+    order = np.lexsort((est_index, ref_index))
+    self._ref_index = ref_index[order]
+    self._est_index = est_index[order]
+    self._onset_distance = np.concatenate(onset_distances)[order]
+
+  @property
+  def num_ref(self) -> int:
+    return len(self.ref_intervals)
+
+  @property
+  def num_est(self) -> int:
+    return len(self.est_intervals)
+
+  def subset(
+      self, ref_mask: np.ndarray, est_mask: np.ndarray
+  ) -> 'NoteMatcher':
+    """Matcher for the subsets of reference and estimated notes in the masks."""
+    matcher = NoteMatcher.__new__(NoteMatcher)
+    matcher.ref_intervals = self.ref_intervals[ref_mask]
+    matcher.est_intervals = self.est_intervals[est_mask]
+    matcher.max_onset_tolerance = self.max_onset_tolerance
+    keep = ref_mask[self._ref_index] & est_mask[self._est_index]
+    # Renumbering preserves order, so the maximum matching is unchanged.
+    matcher._ref_index = (np.cumsum(ref_mask) - 1)[self._ref_index[keep]]
+    matcher._est_index = (np.cumsum(est_mask) - 1)[self._est_index[keep]]
+    matcher._onset_distance = self._onset_distance[keep]
+    return matcher
+
+  def match_notes(
+      self,
+      onset_tolerance: float = 0.05,
+      offset_ratio: Optional[float] = 0.2,
+      offset_min_tolerance: float = 0.05,
+      ref_groups: Optional[np.ndarray] = None,
+      est_groups: Optional[np.ndarray] = None
+  ) -> List[Tuple[int, int]]:
+    """Match notes like `mir_eval.transcription.match_notes`.
+
+    Args:
+      onset_tolerance: Onset tolerance in seconds, at most the maximum onset
+          tolerance of the matcher.
+      offset_ratio: Offset tolerance as a ratio of reference note duration, or
+          None to ignore offsets.
+      offset_min_tolerance: Minimum offset tolerance in seconds.
+      ref_groups: Optional group of each reference note, e.g. its program; if
+          given, notes are only matched within the same group.
+      est_groups: Optional group of each estimated note.
+
+    Returns:
+      (reference index, estimate index) pairs, sorted by reference index.
+    """
+    if onset_tolerance > self.max_onset_tolerance:
+      raise ValueError(
+          f'Onset tolerance {onset_tolerance} is larger than the maximum onset '
+          f'tolerance {self.max_onset_tolerance}.')
+    hit = self._onset_distance <= onset_tolerance
+    if offset_ratio is not None:
+      ref_intervals = self.ref_intervals[self._ref_index]
+      offset_distance = np.around(
+          np.abs(ref_intervals[:, 1] -
+                 self.est_intervals[self._est_index, 1]),
+          decimals=mir_eval.transcription.N_DECIMALS)
+      ref_durations = mir_eval.util.intervals_to_durations(ref_intervals)
+      hit &= offset_distance <= np.maximum(
+          offset_ratio * ref_durations, offset_min_tolerance)
+    if ref_groups is not None:
+      hit &= ref_groups[self._ref_index] == est_groups[self._est_index]
+
+    graph = {}
+    for ref_i, est_i in zip(self._ref_index[hit].tolist(),
+                            self._est_index[hit].tolist()):
+      graph.setdefault(est_i, []).append(ref_i)
+    return sorted(mir_eval.util._bipartite_match(graph).items())  # pylint: disable=protected-access
+
+  def precision_recall_f1_overlap(
+      self,
+      onset_tolerance: float = 0.05,
+      offset_ratio: Optional[float] = 0.2,
+      offset_min_tolerance: float = 0.05,
+      beta: float = 1.0
+  ) -> Tuple[float, float, float, float]:
+    """Like `mir_eval.transcription.precision_recall_f1_overlap`."""
+    if not self.num_ref or not self.num_est:
+      return 0.0, 0.0, 0.0, 0.0
+    matching = self.match_notes(
+        onset_tolerance=onset_tolerance, offset_ratio=offset_ratio,
+        offset_min_tolerance=offset_min_tolerance)
+    return self._scores(matching, beta)
+
+  def velocity_precision_recall_f1_overlap(
+      self,
+      ref_velocities: np.ndarray,
+      est_velocities: np.ndarray,
+      onset_tolerance: float = 0.05,
+      offset_ratio: Optional[float] = 0.2,
+      offset_min_tolerance: float = 0.05,
+      velocity_tolerance: float = 0.1,
+      beta: float = 1.0
+  ) -> Tuple[float, float, float, float]:
+    """Like `mir_eval.transcription_velocity.precision_recall_f1_overlap`."""
+    if not self.num_ref or not self.num_est:
+      return 0.0, 0.0, 0.0, 0.0
+    matching = np.array(self.match_notes(
+        onset_tolerance=onset_tolerance, offset_ratio=offset_ratio,
+        offset_min_tolerance=offset_min_tolerance))
+    if matching.size:
+      # Rescale estimated velocities to best fit the normalized reference
+      # velocities of matched notes, as in mir_eval.
+      min_velocity, max_velocity = (
+          np.min(ref_velocities), np.max(ref_velocities))
+      velocity_range = max(1, max_velocity - min_velocity)
+      ref_velocities = (ref_velocities - min_velocity) / float(velocity_range)
+      ref_matched_velocities = ref_velocities[matching[:, 0]]
+      est_matched_velocities = est_velocities[matching[:, 1]]
+      slope, intercept = np.linalg.lstsq(
+          np.vstack([est_matched_velocities,
+                     np.ones(len(est_matched_velocities))]).T,
+          ref_matched_velocities,
+          rcond=None)[0]
+      est_matched_velocities = slope * est_matched_velocities + intercept
+      velocity_diff = np.abs(est_matched_velocities - ref_matched_velocities)
+      matching = matching[velocity_diff < velocity_tolerance]
+    return self._scores([tuple(match) for match in matching], beta)
+
+  def _scores(
+      self, matching: List[Tuple[int, int]], beta: float
+  ) -> Tuple[float, float, float, float]:
+    precision = float(len(matching)) / self.num_est
+    recall = float(len(matching)) / self.num_ref
+    f_measure = mir_eval.util.f_measure(precision, recall, beta=beta)
+    avg_overlap_ratio = mir_eval.transcription.average_overlap_ratio(
+        self.ref_intervals, self.est_intervals, matching)
+    return precision, recall, f_measure, avg_overlap_ratio
@@ -0,0 +1,145 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for note_matching."""
+
+from absl.testing import absltest
+import mir_eval
+from mt3_audio2midi.mt3 import note_matching
+import numpy as np
+
+_MAX_ONSET_TOLERANCE = 0.1
+_ONSET_TOLERANCES = (0.01, 0.05, 0.1)
+_OFFSET_RATIOS = (None, 0.2)
+_NUM_TRIALS = 20
+
+
+def _random_notes(rng, num_notes, num_groups):
+  """Dense random notes, so that many estimates compete for each reference."""
+  onsets = np.round(rng.uniform(0, 2, num_notes), 3)
+  durations = np.round(rng.uniform(0.01, 0.5, num_notes), 3)
+  intervals = np.stack([onsets, onsets + durations], axis=1)
+  pitches = mir_eval.util.midi_to_hz(rng.integers(60, 64, num_notes))
+  velocities = rng.integers(1, 128, num_notes)
+  groups = rng.integers(0, num_groups, num_notes)
+  return intervals, pitches, velocities, groups
+
+
+def _jitter(rng, intervals, pitches, velocities, groups):
+  """Estimates near the reference notes, plus spurious notes."""
+  est_intervals = np.maximum(
+      intervals + np.round(rng.normal(0, 0.04, intervals.shape), 3), 0)
+  est_intervals[:, 1] = np.maximum(
+      est_intervals[:, 1], est_intervals[:, 0] + 0.01)
+  spurious = _random_notes(rng, len(pitches) // 4, groups.max() + 1)
+  keep = rng.random(len(pitches)) < 0.8
+  return (np.concatenate([est_intervals[keep], spurious[0]]),
+          np.concatenate([pitches[keep], spurious[1]]),
+          np.concatenate([
+              np.clip(velocities[keep] + rng.integers(-10, 10, keep.sum()),
+                      1, 127),
+              spurious[2]]),
+          np.concatenate([groups[keep], spurious[3]]))
+
+
+class NoteMatcherTest(absltest.TestCase):
+
+  def _trials(self):
+    rng = np.random.default_rng(0)
+    for _ in range(_NUM_TRIALS):
+      ref = _random_notes(rng, rng.integers(1, 60), num_groups=3)
+      yield ref, _jitter(rng, *ref)
+
+  def test_match_notes(self):
+    for (ref_intervals, ref_pitches, _, _), (est_intervals, est_pitches, _,
+                                              _) in self._trials():
+      matcher = note_matching.NoteMatcher(
+          ref_intervals, ref_pitches, est_intervals, est_pitches,
+          max_onset_tolerance=_MAX_ONSET_TOLERANCE)
+      for onset_tolerance in _ONSET_TOLERANCES:
+        for offset_ratio in _OFFSET_RATIOS:
+          expected = mir_eval.transcription.match_notes(
+              ref_intervals, ref_pitches, est_intervals, est_pitches,
+              onset_tolerance=onset_tolerance, offset_ratio=offset_ratio)
+          self.assertEqual(
+              matcher.match_notes(
+                  onset_tolerance=onset_tolerance, offset_ratio=offset_ratio),
+              sorted(expected))
+
+  def test_match_notes_with_groups(self):
+    for (ref_intervals, ref_pitches, _, ref_groups), (
+        est_intervals, est_pitches, _, est_groups) in self._trials():
+      matcher = note_matching.NoteMatcher(
+          ref_intervals, ref_pitches, est_intervals, est_pitches,
+          max_onset_tolerance=_MAX_ONSET_TOLERANCE)
+      for onset_tolerance in _ONSET_TOLERANCES:
+        for offset_ratio in _OFFSET_RATIOS:
+          # Two octaves per group keep notes of different groups apart.
+          expected = mir_eval.transcription.match_notes(
+              ref_intervals, ref_pitches * 4.0 ** ref_groups, est_intervals,
+              est_pitches * 4.0 ** est_groups,
+              onset_tolerance=onset_tolerance, offset_ratio=offset_ratio)
+          self.assertEqual(
+              matcher.match_notes(
+                  onset_tolerance=onset_tolerance, offset_ratio=offset_ratio,
+                  ref_groups=ref_groups, est_groups=est_groups),
+              sorted(expected))
+
+  def test_precision_recall_f1_overlap(self):
+    for (ref_intervals, ref_pitches, _, ref_groups), (
+        est_intervals, est_pitches, _, est_groups) in self._trials():
+      matcher = note_matching.NoteMatcher(
+          ref_intervals, ref_pitches, est_intervals, est_pitches,
+          max_onset_tolerance=_MAX_ONSET_TOLERANCE)
+      # Per group subsets, as for program-aware metrics.
+      for group in range(3):
+        ref_mask = ref_groups == group
+        est_mask = est_groups == group
+        group_matcher = matcher.subset(ref_mask, est_mask)
+        for onset_tolerance in _ONSET_TOLERANCES:
+          for offset_ratio in _OFFSET_RATIOS:
+            expected = (0.0, 0.0, 0.0, 0.0)
+            if ref_mask.any() and est_mask.any():
+              expected = mir_eval.transcription.precision_recall_f1_overlap(
+                  ref_intervals[ref_mask], ref_pitches[ref_mask],
+                  est_intervals[est_mask], est_pitches[est_mask],
+                  onset_tolerance=onset_tolerance, offset_ratio=offset_ratio)
+            np.testing.assert_allclose(
+                group_matcher.precision_recall_f1_overlap(
+                    onset_tolerance=onset_tolerance,
+                    offset_ratio=offset_ratio),
+                expected)
+
+  def test_velocity_precision_recall_f1_overlap(self):
+    for (ref_intervals, ref_pitches, ref_velocities, _), (
+        est_intervals, est_pitches, est_velocities, _) in self._trials():
+      matcher = note_matching.NoteMatcher(
+          ref_intervals, ref_pitches, est_intervals, est_pitches,
+          max_onset_tolerance=_MAX_ONSET_TOLERANCE)
+      for onset_tolerance in _ONSET_TOLERANCES:
+        for offset_ratio in _OFFSET_RATIOS:
+          expected = (
+              mir_eval.transcription_velocity.precision_recall_f1_overlap(
+                  ref_intervals, ref_pitches, ref_velocities, est_intervals,
+                  est_pitches, est_velocities,
+                  onset_tolerance=onset_tolerance, offset_ratio=offset_ratio))
+          np.testing.assert_allclose(
+              matcher.velocity_precision_recall_f1_overlap(
+                  ref_velocities, est_velocities,
+                  onset_tolerance=onset_tolerance, offset_ratio=offset_ratio),
+              expected)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -17,13 +17,13 @@
 import dataclasses
 import itertools
 
-from typing import MutableMapping, MutableSet, Optional, Sequence, Tuple
+from typing import Mapping, MutableMapping, MutableSet, Optional, Sequence, Tuple
 
 from mt3_audio2midi.mt3 import event_codec
-from mt3_audio2midi.mt3 import run_length_encoding
-from mt3_audio2midi.mt3 import vocabularies
+from mt3_audio2midi.mt3 import token_vocabulary
 
 import note_seq
+import numpy as np
 
 DEFAULT_VELOCITY = 100
 DEFAULT_NOTE_DURATION = 0.01
@@ -39,59 +39,176 @@ class TrackSpec:
   is_drum: bool = False
 
 
+@dataclasses.dataclass(frozen=True)
+class NoteArray:
+  """Notes of a NoteSequence as NumPy columns, one entry per note.
+
+  Slicing returns views of the columns (as do the tracks returned by
+  `tracks`); indexing with a mask or indices returns copies. Conversion to and
+  from NoteSequence preserves these note fields only.
+  """
+  start_time: np.ndarray
+  end_time: np.ndarray
+  pitch: np.ndarray
+  velocity: np.ndarray
+  program: np.ndarray
+  is_drum: np.ndarray
+  instrument: np.ndarray
+
+  @classmethod
+  def from_note_sequence(cls, ns: note_seq.NoteSequence) -> 'NoteArray':
+    """Extract note columns from a NoteSequence in a single pass."""
+    values = np.array(
+        [(note.start_time, note.end_time, note.pitch, note.velocity,
+          note.program, note.is_drum, note.instrument) for note in ns.notes],
+        dtype=np.float64).reshape(-1, 7)
+    return cls(
+        start_time=values[:, 0],
+        end_time=values[:, 1],
+        pitch=values[:, 2].astype(np.int32),
+        velocity=values[:, 3].astype(np.int32),
+        program=values[:, 4].astype(np.int32),
+        is_drum=values[:, 5].astype(bool),
+        instrument=values[:, 6].astype(np.int32))
+
+  def to_note_sequence(self) -> note_seq.NoteSequence:
+    """Create a NoteSequence containing these notes."""
+    ns = note_seq.NoteSequence(ticks_per_quarter=220)
+    for start_time, end_time, pitch, velocity, program, is_drum, instrument in (
+        zip(self.start_time.tolist(), self.end_time.tolist(),
+            self.pitch.tolist(), self.velocity.tolist(),
+            self.program.tolist(), self.is_drum.tolist(),
+            self.instrument.tolist())):
+      ns.notes.add(
+          start_time=start_time, end_time=end_time, pitch=pitch,
+          velocity=velocity, program=program, is_drum=is_drum,
+          instrument=instrument)
+    ns.total_time = self.end_time.max() if len(self) else 0.0
+    return ns
+
+  def __len__(self) -> int:
+    return len(self.start_time)
+
+  def __getitem__(self, key) -> 'NoteArray':
+    return NoteArray(**{
+        field.name: getattr(self, field.name)[key]
+        for field in dataclasses.fields(self)})
+
+  def track(self, program: int, is_drum: bool) -> 'NoteArray':
+    """Notes with the given program and drum status."""
+    return self[(self.program == program) & (self.is_drum == is_drum)]
+
+  def tracks(self) -> Mapping[Tuple[int, bool], 'NoteArray']:
+    """Split into tracks by (program, is_drum), keeping note order.
+
+    Notes are sorted by track once; each track is a view of the sorted notes.
+
+    Returns:
+      A dictionary mapping (program, is_drum) to the notes of that track.
+    """
+    order = np.lexsort((self.program, self.is_drum))
+    notes = self[order]
+    boundaries = np.flatnonzero(
+        (np.diff(notes.program) != 0) | (np.diff(notes.is_drum) != 0)) + 1
+    starts = np.concatenate([[0], boundaries]) if len(self) else []
+    ends = np.concatenate([boundaries, [len(self)]]) if len(self) else []
+    return {
+        (int(notes.program[start]), bool(notes.is_drum[start])):
+            notes[start:end]
+        for start, end in zip(starts, ends)
+    }
+
+  def trimmed_end_times(self) -> np.ndarray:
+    """End times with overlapping notes of the same pitch and track trimmed.
+
+    Each note ends no later than the start of the next note (in start time
+    order) with the same pitch, program, and drum status.
+
+    Returns:
+      The trimmed end time of each note.
+    """
+    order = np.lexsort(
+        (self.start_time, self.pitch, self.program, self.is_drum))
+    same_channel = (
+        (np.diff(self.pitch[order]) == 0) &
+        (np.diff(self.program[order]) == 0) &
+        (np.diff(self.is_drum[order]) == 0))
+    end_times = self.end_time.copy()
+    previous, following = order[:-1][same_channel], order[1:][same_channel]
+    end_times[previous] = np.minimum(
+        end_times[previous], self.start_time[following])
+    return end_times
+
+  def trim_overlapping_notes(self) -> 'NoteArray':
+    """Trim overlapping notes, dropping zero-length notes."""
+    end_times = self.trimmed_end_times()
+    notes = dataclasses.replace(self, end_time=end_times)
+    return notes[notes.start_time < notes.end_time]
+
+  def assigned_instruments(self) -> np.ndarray:
+    """Instrument numbers by order of first appearance of each program.
+
+    Drums are instrument 9; other programs are numbered in order of first
+    appearance, skipping 9.
+
+    Returns:
+      The instrument number of each note.
+    """
+    instruments = np.full(len(self), 9, dtype=np.int32)
+    programs = self.program[~self.is_drum]
+    unique_programs, first_indices, inverse = np.unique(
+        programs, return_index=True, return_inverse=True)
+    program_instruments = np.empty(len(unique_programs), dtype=np.int32)
+    program_instruments[np.argsort(first_indices)] = np.arange(
+        len(unique_programs))
+    program_instruments[program_instruments >= 9] += 1
+    instruments[~self.is_drum] = program_instruments[inverse.reshape(-1)]
+    return instruments
+
+  def validate(self) -> None:
+    """Raise ValueError if there are invalid notes."""
+    invalid = (self.start_time >= self.end_time) | (self.velocity == 0)
+    if invalid.any():
+      i = np.argmax(invalid)
+      if self.start_time[i] >= self.end_time[i]:
+        raise ValueError('note has start time >= end time: %f >= %f' %
+                         (self.start_time[i], self.end_time[i]))
+      raise ValueError('note has zero velocity')
+
+
 def extract_track(ns, program, is_drum):
+  notes = NoteArray.from_note_sequence(ns)
+  idx = np.flatnonzero((notes.program == program) & (notes.is_drum == is_drum))
   track = note_seq.NoteSequence(ticks_per_quarter=220)
-  track_notes = [note for note in ns.notes
-                 if note.program == program and note.is_drum == is_drum]
-  track.notes.extend(track_notes)
-  track.total_time = (max(note.end_time for note in track.notes)
-                      if track.notes else 0.0)
+  track.notes.extend(ns.notes[i] for i in idx)
+  track.total_time = notes.end_time[idx].max() if len(idx) else 0.0
   return track
 
 
 def trim_overlapping_notes(ns: note_seq.NoteSequence) -> note_seq.NoteSequence:
   """Trim overlapping notes from a NoteSequence, dropping zero-length notes."""
+  notes = NoteArray.from_note_sequence(ns)
+  end_times = notes.trimmed_end_times()
   ns_trimmed = note_seq.NoteSequence()
   ns_trimmed.CopyFrom(ns)
-  channels = set((note.pitch, note.program, note.is_drum)
-                 for note in ns_trimmed.notes)
-  for pitch, program, is_drum in channels:
-    notes = [note for note in ns_trimmed.notes if note.pitch == pitch
-             and note.program == program and note.is_drum == is_drum]
-    sorted_notes = sorted(notes, key=lambda note: note.start_time)
-    for i in range(1, len(sorted_notes)):
-      if sorted_notes[i - 1].end_time > sorted_notes[i].start_time:
-        sorted_notes[i - 1].end_time = sorted_notes[i].start_time
-  valid_notes = [note for note in ns_trimmed.notes
-                 if note.start_time < note.end_time]
   del ns_trimmed.notes[:]
-  ns_trimmed.notes.extend(valid_notes)
+  for i in np.flatnonzero(notes.start_time < end_times):
+    note = ns_trimmed.notes.add()
+    note.CopyFrom(ns.notes[i])
+    note.end_time = end_times[i]
   return ns_trimmed
 
 
 def assign_instruments(ns: note_seq.NoteSequence) -> None:
   """Assign instrument numbers to notes; modifies NoteSequence in place."""
-  program_instruments = {}
-  for note in ns.notes:
-    if note.program not in program_instruments and not note.is_drum:
-      num_instruments = len(program_instruments)
-      note.instrument = (num_instruments if num_instruments < 9
-                         else num_instruments + 1)
-      program_instruments[note.program] = note.instrument
-    elif note.is_drum:
-      note.instrument = 9
-    else:
-      note.instrument = program_instruments[note.program]
+  instruments = NoteArray.from_note_sequence(ns).assigned_instruments()
+  for note, instrument in zip(ns.notes, instruments.tolist()):
+    note.instrument = instrument
 
 
 def validate_note_sequence(ns: note_seq.NoteSequence) -> None:
   """Raise ValueError if NoteSequence contains invalid notes."""
-  for note in ns.notes:
-    if note.start_time >= note.end_time:
-      raise ValueError('note has start time >= end time: %f >= %f' %
-                       (note.start_time, note.end_time))
-    if note.velocity == 0:
-      raise ValueError('note has zero velocity')
+  NoteArray.from_note_sequence(ns).validate()
 
 
 def note_arrays_to_note_sequence(
@@ -189,18 +306,21 @@ def note_sequence_to_onsets_and_offsets_and_programs(
     values: A list of NoteEventData objects where velocity is zero for note
         offsets.
   """
+  notes = NoteArray.from_note_sequence(ns)
   # Sort by program and pitch and put offsets before onsets as a tiebreaker for
   # subsequent stable sort.
-  notes = sorted(ns.notes,
-                 key=lambda note: (note.is_drum, note.program, note.pitch))
-  times = ([note.end_time for note in notes if not note.is_drum] +
-           [note.start_time for note in notes])
-  values = ([NoteEventData(pitch=note.pitch, velocity=0,
-                           program=note.program, is_drum=False)
-             for note in notes if not note.is_drum] +
-            [NoteEventData(pitch=note.pitch, velocity=note.velocity,
-                           program=note.program, is_drum=note.is_drum)
-             for note in notes])
+  notes = notes[np.lexsort((notes.pitch, notes.program, notes.is_drum))]
+  nondrums = notes[~notes.is_drum]
+  times = nondrums.end_time.tolist() + notes.start_time.tolist()
+  values = ([NoteEventData(pitch=pitch, velocity=0,
+                           program=program, is_drum=False)
+             for pitch, program in zip(nondrums.pitch.tolist(),
+                                       nondrums.program.tolist())] +
+            [NoteEventData(pitch=pitch, velocity=velocity,
+                           program=program, is_drum=is_drum)
+             for pitch, velocity, program, is_drum in zip(
+                 notes.pitch.tolist(), notes.velocity.tolist(),
+                 notes.program.tolist(), notes.is_drum.tolist())])
   return times, values
 
 
@@ -222,8 +342,8 @@ def note_event_data_to_events(
     # onsets only, no program or velocity
     return [event_codec.Event('pitch', value.pitch)]
   else:
-    num_velocity_bins = vocabularies.num_velocity_bins_from_codec(codec)
-    velocity_bin = vocabularies.velocity_to_bin(
+    num_velocity_bins = token_vocabulary.num_velocity_bins_from_codec(codec)
+    velocity_bin = token_vocabulary.velocity_to_bin(
         value.velocity, num_velocity_bins)
     if value.program is None:
       # onsets + offsets + velocities only, no programs
@@ -365,8 +485,8 @@ def decode_note_event(
         pitch=event.value, velocity=state.current_velocity, is_drum=True)
   elif event.type == 'velocity':
     # velocity change
-    num_velocity_bins = vocabularies.num_velocity_bins_from_codec(codec)
-    velocity = vocabularies.bin_to_velocity(event.value, num_velocity_bins)
+    num_velocity_bins = token_vocabulary.num_velocity_bins_from_codec(codec)
+    velocity = token_vocabulary.bin_to_velocity(event.value, num_velocity_bins)
     state.current_velocity = velocity
   elif event.type == 'program':
     # program change
@@ -408,7 +528,7 @@ def flush_note_decoding_state(
   return state.note_sequence
 
 
-class NoteEncodingSpecType(run_length_encoding.EventEncodingSpec):
+class NoteEncodingSpecType(event_codec.EventEncodingSpec):
   pass
 
 
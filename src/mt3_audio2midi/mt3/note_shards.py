@@ -0,0 +1,176 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Columnar binary shards of transcribed notes, indexed by example id.
+
+A shard is an uncompressed NumPy .npz file with one array per `NoteArray`
+field, holding the notes of all examples back to back, plus the example ids
+and the offset of each example's first note:
+
+  ids:      (num_examples,) example ids
+  offsets:  (num_examples + 1,) int64; example i has notes
+            offsets[i]:offsets[i + 1]
+  <field>:  (num_notes,) one column per `note_sequences.NoteArray` field
+
+Shards can be read with `np.load`; `NoteShardReader` additionally memory-maps
+the note columns of local files, so that notes of an example are read on
+access rather than when the shard is opened.
+"""
+
+import dataclasses
+import io
+import os
+import struct
+import zipfile
+
+from typing import Iterator, List, Mapping, Sequence, Tuple
+
+from mt3_audio2midi.mt3 import note_sequences
+
+import note_seq
+import numpy as np
+import tensorflow as tf
+
+_NOTE_FIELDS = tuple(
+    field.name for field in dataclasses.fields(note_sequences.NoteArray))
+
+# Size of a zip local file header before its variable length fields.
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+class NoteShardWriter:
+  """Collects the notes of examples and writes them as one shard on close."""
+
+  def __init__(self, path: str):
+    self.path = path
+    self._ids = []
+    self._notes = []
+
+  def write(self, example_id: str, notes: note_sequences.NoteArray) -> None:
+    self._ids.append(example_id)
+    self._notes.append(notes)
+
+  def close(self) -> None:
+    write_note_shard(self.path, self._ids, self._notes)
+
+  def __enter__(self) -> 'NoteShardWriter':
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    if exc_type is None:
+      self.close()
+
+
+def write_note_shard(
+    path: str,
+    example_ids: Sequence[str],
+    notes: Sequence[note_sequences.NoteArray]
+) -> None:
+  """Write the notes of examples to a shard.
+
+  Args:
+    path: Path of the shard to write.
+    example_ids: Example ids, unique within the shard.
+    notes: Notes of each example.
+  """
+  if len(example_ids) != len(notes):
+    raise ValueError(
+        f'Got {len(example_ids)} example ids for {len(notes)} note arrays.')
+  if len(set(example_ids)) != len(example_ids):
+    raise ValueError('Example ids in a shard must be unique.')
+  # Start from an empty array so that columns keep their dtypes if there are
+  # no examples.
+  empty = note_sequences.NoteArray.from_note_sequence(note_seq.NoteSequence())
+  columns = {
+      name: np.concatenate(
+          [getattr(empty, name)] + [getattr(n, name) for n in notes])
+      for name in _NOTE_FIELDS
+  }
+  offsets = np.concatenate(
+      [[0], np.cumsum([len(n) for n in notes], dtype=np.int64)])
+  # Stored (uncompressed) members, so that readers can memory-map them. Zip
+  # files need a seekable stream, which GFile does not provide when writing.
+  buffer = io.BytesIO()
+  np.savez(buffer, ids=np.array(example_ids, dtype=np.str_), offsets=offsets,
+           **columns)
+  with tf.io.gfile.GFile(path, 'wb') as f:
+    f.write(buffer.getvalue())
+
+
+def _mmap_npz_members(path: str) -> Mapping[str, np.ndarray]:
+  """Memory-map the arrays stored uncompressed in a local .npz file."""
+  arrays = {}
+  with open(path, 'rb') as f, zipfile.ZipFile(f) as zf:
+    for info in zf.infolist():
+      name = info.filename[:-len('.npy')]
+      if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f'Cannot memory-map compressed member {name}.')
+      f.seek(info.header_offset)
+      local_header = f.read(_ZIP_LOCAL_HEADER_SIZE)
+      name_size, extra_size = struct.unpack('<HH', local_header[26:30])
+      f.seek(info.header_offset + _ZIP_LOCAL_HEADER_SIZE + name_size +
+             extra_size)
+      version = np.lib.format.read_magic(f)
+      if version == (1, 0):
+        header = np.lib.format.read_array_header_1_0(f)
+      else:
+        header = np.lib.format.read_array_header_2_0(f)
+      shape, fortran_order, dtype = header
+      if dtype.hasobject:
+        raise ValueError(f'Cannot memory-map object member {name}.')
+      if not np.prod(shape):
+        arrays[name] = np.zeros(shape, dtype)
+      else:
+        arrays[name] = np.memmap(
+            path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+            order='F' if fortran_order else 'C')
+  return arrays
+
+
+class NoteShardReader:
+  """Reads notes of examples from a shard by example id.
+
+  Note columns of local shards are memory-mapped; the notes of an example are
+  views of these columns. Shards on other filesystems are read into memory.
+  """
+
+  def __init__(self, path: str):
+    if os.path.exists(path):
+      arrays = _mmap_npz_members(path)
+    else:
+      with tf.io.gfile.GFile(path, 'rb') as f, np.load(f) as npz:
+        arrays = dict(npz)
+    self.ids: List[str] = np.asarray(arrays['ids']).tolist()
+    self._offsets = np.asarray(arrays['offsets'])
+    self._columns = {name: arrays[name] for name in _NOTE_FIELDS}
+    self._index = {example_id: i for i, example_id in enumerate(self.ids)}
+
+  def __len__(self) -> int:
+    return len(self.ids)
+
+  def __contains__(self, example_id: str) -> bool:
+    return example_id in self._index
+
+  def __getitem__(self, example_id: str) -> note_sequences.NoteArray:
+    return self.notes(self._index[example_id])
+
+  def __iter__(self) -> Iterator[Tuple[str, note_sequences.NoteArray]]:
+    for i, example_id in enumerate(self.ids):
+      yield example_id, self.notes(i)
+
+  def notes(self, index: int) -> note_sequences.NoteArray:
+    """Notes of the example at the given position in the shard."""
+    start, end = self._offsets[index], self._offsets[index + 1]
+    return note_sequences.NoteArray(**{
+        name: column[start:end] for name, column in self._columns.items()})
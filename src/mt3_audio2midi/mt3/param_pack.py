@@ -0,0 +1,150 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Single-file parameter packs, memory-mapped and shared across processes.
+
+A param pack holds the parameters of a checkpoint as raw arrays in one file:
+
+  magic:     8 bytes, `MAGIC`
+  size:      8 bytes, little-endian uint64 size of the manifest
+  manifest:  JSON; `arrays` lists the `name` (`/`-separated path in the
+             parameter tree), `dtype`, `shape` and `offset` of each array
+  arrays:    raw C-order array data, starting at the first multiple of
+             `ALIGNMENT` after the manifest; offsets are relative to this
+             start and also multiples of `ALIGNMENT`
+
+`load_param_pack` memory-maps the file read-only and returns NumPy views of
+it, so processes loading the same pack share its page cache pages instead of
+each holding a copy of the parameters. On CPU, `jax.device_put` of these
+(aligned, read-only) views does not copy them either.
+
+Export a checkpoint with:
+python -m mt3_audio2midi.mt3.export_param_pack \
+  --checkpoint=/path/to/mt3/checkpoint --output=/path/to/mt3.params
+"""
+
+import json
+import struct
+
+from typing import Any, Mapping, Optional
+
+from etils import epath
+from mt3_audio2midi.mt3 import checkpoint_params
+
+import numpy as np
+
+PyTree = Any
+
+MAGIC = b'MT3PACK1'
+# Alignment of array data, at least what XLA needs to use host arrays in place.
+ALIGNMENT = 64
+_HEADER = struct.Struct('<8sQ')
+
+
+def _flatten(tree: Mapping[str, Any], prefix: str = ''):
+  for name, value in tree.items():
+    if isinstance(value, Mapping):
+      yield from _flatten(value, f'{prefix}{name}/')
+    else:
+      yield f'{prefix}{name}', np.asarray(value)
+
+
+def _align(offset: int) -> int:
+  return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_param_pack(
+    path: str, params: PyTree, metadata: Optional[Mapping[str, Any]] = None
+) -> None:
+  """Writes a nested dict of arrays as a param pack.
+
+  Args:
+    path: Path of the pack to write.
+    params: Nested dict of arrays, e.g. from `checkpoint_params.load_params`.
+    metadata: Optional JSON serializable metadata stored in the manifest.
+  """
+  arrays = list(_flatten(params))
+  entries = []
+  offset = 0
+  for name, array in arrays:
+    entries.append({'name': name, 'dtype': array.dtype.str,
+                    'shape': list(array.shape), 'offset': offset})
+    offset = _align(offset + array.nbytes)
+  manifest_bytes = json.dumps(
+      {'arrays': entries, 'metadata': dict(metadata or {})}).encode()
+  data_start = _align(_HEADER.size + len(manifest_bytes))
+
+  with epath.Path(path).open('wb') as f:
+    f.write(_HEADER.pack(MAGIC, len(manifest_bytes)))
+    f.write(manifest_bytes)
+    position = _HEADER.size + len(manifest_bytes)
+    for entry, (_, array) in zip(entries, arrays):
+      f.write(b'\0' * (data_start + entry['offset'] - position))
+      f.write(np.ascontiguousarray(array).tobytes())
+      position = data_start + entry['offset'] + array.nbytes
+
+
+def is_param_pack(path: str) -> bool:
+  """Whether `path` is a param pack file (rather than a checkpoint)."""
+  pack_path = epath.Path(path)
+  if not pack_path.is_file():
+    return False
+  with pack_path.open('rb') as f:
+    return f.read(len(MAGIC)) == MAGIC
+
+
+def read_manifest(path: str) -> Mapping[str, Any]:
+  """Reads the manifest of a param pack, with absolute array offsets."""
+  with epath.Path(path).open('rb') as f:
+    magic, size = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != MAGIC:
+      raise ValueError(f'Not a param pack: {path}')
+    manifest = json.loads(f.read(size))
+  data_start = _align(_HEADER.size + size)
+  for entry in manifest['arrays']:
+    entry['offset'] += data_start
+  return manifest
+
+
+def load_param_pack(path: str) -> PyTree:
+  """Memory-maps a local param pack.
+
+  Args:
+    path: Path of a local param pack.
+
+  Returns:
+    Nested dict of read-only NumPy arrays backed by the memory-mapped file.
+  """
+  manifest = read_manifest(path)
+  buffer = np.memmap(path, dtype=np.uint8, mode='r')
+  params = {}
+  for entry in manifest['arrays']:
+    dtype = np.dtype(entry['dtype'])
+    shape = tuple(entry['shape'])
+    size = int(np.prod(shape)) * dtype.itemsize
+    array = buffer[entry['offset']:entry['offset'] + size].view(dtype).reshape(
+        shape)
+    *parents, name = entry['name'].split('/')
+    node = params
+    for parent in parents:
+      node = node.setdefault(parent, {})
+    node[name] = array
+  return params
+
+
+def load_params(path: str) -> PyTree:
+  """Loads parameters from a param pack or a T5X checkpoint."""
+  if is_param_pack(path):
+    return load_param_pack(path)
+  return checkpoint_params.load_params(path, dtype=np.float32)
@@ -90,6 +90,69 @@ def _include_inputs(ds, input_record, fields_to_omit=('audio',)):
                 num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
 
+def _tokenize_transcription(
+    sequence: bytes, audio, sample_rate: int, example_id: Optional[bytes],
+    spectrogram_config: spectrograms.SpectrogramConfig,
+    codec: event_codec.Codec, onsets_only: bool, include_ties: bool,
+    audio_is_samples: bool
+) -> Mapping[str, Any]:
+  """Tokenize one example; see `tokenize_transcription_example` below."""
+  ns = note_seq.NoteSequence.FromString(sequence)
+  note_sequences.validate_note_sequence(ns)
+
+  if example_id is not None:
+    ns.id = example_id
+
+  if audio_is_samples:
+    samples = audio
+    if sample_rate != spectrogram_config.sample_rate:
+      samples = librosa.resample(
+          samples, sample_rate, spectrogram_config.sample_rate)
+  else:
+    samples = note_seq.audio_io.wav_data_to_samples_librosa(
+        audio, sample_rate=spectrogram_config.sample_rate)
+
+  logging.info('Got samples for %s::%s with length %d',
+               ns.id, ns.filename, len(samples))
+
+  frames, frame_times = _audio_to_frames(samples, spectrogram_config)
+
+  if onsets_only:
+    times, values = note_sequences.note_sequence_to_onsets(ns)
+  else:
+    ns = note_seq.apply_sustain_control_changes(ns)
+    times, values = (
+        note_sequences.note_sequence_to_onsets_and_offsets_and_programs(ns))
+
+  # The original NoteSequence can have a lot of control changes we don't need;
+  # delete them.
+  del ns.control_changes[:]
+
+  (events, event_start_indices, event_end_indices,
+   state_events, state_event_indices) = (
+       run_length_encoding.encode_and_index_events(
+           state=note_sequences.NoteEncodingState() if include_ties else None,
+           event_times=times,
+           event_values=values,
+           encode_event_fn=note_sequences.note_event_data_to_events,
+           codec=codec,
+           frame_times=frame_times,
+           encoding_state_to_events_fn=(
+               note_sequences.note_encoding_state_to_events
+               if include_ties else None)))
+
+  return {
+      'inputs': frames,
+      'input_times': frame_times,
+      'targets': events,
+      'input_event_start_indices': event_start_indices,
+      'input_event_end_indices': event_end_indices,
+      'state_events': state_events,
+      'input_state_event_indices': state_event_indices,
+      'sequence': ns.SerializeToString()
+  }
+
+
 def tokenize_transcription_example(
     ds: tf.data.Dataset, spectrogram_config: spectrograms.SpectrogramConfig,
     codec: event_codec.Codec, is_training_data: bool,
@@ -128,60 +191,11 @@ def tokenize_transcription_example(
     raise ValueError('Ties not supported when only modeling onsets.')
 
   def tokenize(sequence, audio, sample_rate, example_id=None):
-    ns = note_seq.NoteSequence.FromString(sequence)
-    note_sequences.validate_note_sequence(ns)
-
-    if example_id is not None:
-      ns.id = example_id
-
-    if audio_is_samples:
-      samples = audio
-      if sample_rate != spectrogram_config.sample_rate:
-        samples = librosa.resample(
-            samples, sample_rate, spectrogram_config.sample_rate)
-    else:
-      samples = note_seq.audio_io.wav_data_to_samples_librosa(
-          audio, sample_rate=spectrogram_config.sample_rate)
-
-    logging.info('Got samples for %s::%s with length %d',
-                 ns.id, ns.filename, len(samples))
-
-    frames, frame_times = _audio_to_frames(samples, spectrogram_config)
-
-    if onsets_only:
-      times, values = note_sequences.note_sequence_to_onsets(ns)
-    else:
-      ns = note_seq.apply_sustain_control_changes(ns)
-      times, values = (
-          note_sequences.note_sequence_to_onsets_and_offsets_and_programs(ns))
-
-    # The original NoteSequence can have a lot of control changes we don't need;
-    # delete them.
-    del ns.control_changes[:]
-
-    (events, event_start_indices, event_end_indices,
-     state_events, state_event_indices) = (
-         run_length_encoding.encode_and_index_events(
-             state=note_sequences.NoteEncodingState() if include_ties else None,
-             event_times=times,
-             event_values=values,
-             encode_event_fn=note_sequences.note_event_data_to_events,
-             codec=codec,
-             frame_times=frame_times,
-             encoding_state_to_events_fn=(
-                 note_sequences.note_encoding_state_to_events
-                 if include_ties else None)))
-
-    yield {
-        'inputs': frames,
-        'input_times': frame_times,
-        'targets': events,
-        'input_event_start_indices': event_start_indices,
-        'input_event_end_indices': event_end_indices,
-        'state_events': state_events,
-        'input_state_event_indices': state_event_indices,
-        'sequence': ns.SerializeToString()
-    }
+    yield _tokenize_transcription(
+        sequence, audio, sample_rate, example_id,
+        spectrogram_config=spectrogram_config, codec=codec,
+        onsets_only=onsets_only, include_ties=include_ties,
+        audio_is_samples=audio_is_samples)
 
   def process_record(input_record):
     if audio_is_samples and 'sample_rate' not in input_record:
@@ -261,6 +275,76 @@ def guitarset_instrument_to_program(instrument: str) -> int:
     raise ValueError('Unknown GuitarSet instrument: %s' % instrument)
 
 
+def _tokenize_with_program_lookup(
+    sequences: Sequence[bytes], inst_names: Sequence[bytes], audio: bytes,
+    example_id: Optional[bytes],
+    spectrogram_config: spectrograms.SpectrogramConfig,
+    codec: event_codec.Codec, onsets_only: bool, include_ties: bool,
+    inst_name_to_program_fn: Callable[[str], int]
+) -> Mapping[str, Any]:
+  """Tokenize one multi-track example with instrument name lookup."""
+  # Add all the notes from the tracks to a single NoteSequence.
+  ns = note_seq.NoteSequence(ticks_per_quarter=220)
+  tracks = [note_seq.NoteSequence.FromString(seq) for seq in sequences]
+  assert len(tracks) == len(inst_names)
+  for track, inst_name in zip(tracks, inst_names):
+    program = inst_name_to_program_fn(
+        inst_name.decode())
+
+    # Note that there are no pitch bends in URMP data; the below block will
+    # raise PitchBendError if one is encountered.
+    add_track_to_notesequence(ns, track, program=program, is_drum=False,
+                              ignore_pitch_bends=False)
+
+  note_sequences.assign_instruments(ns)
+  note_sequences.validate_note_sequence(ns)
+
+  if example_id is not None:
+    ns.id = example_id
+
+  samples = note_seq.audio_io.wav_data_to_samples_librosa(
+      audio, sample_rate=spectrogram_config.sample_rate)
+
+  logging.info('Got samples for %s::%s with length %d',
+               ns.id, ns.filename, len(samples))
+
+  frames, frame_times = _audio_to_frames(samples, spectrogram_config)
+
+  if onsets_only:
+    times, values = note_sequences.note_sequence_to_onsets(ns)
+  else:
+    times, values = (
+        note_sequences.note_sequence_to_onsets_and_offsets_and_programs(ns))
+
+  # The original NoteSequence can have a lot of control changes we don't need;
+  # delete them.
+  del ns.control_changes[:]
+
+  (events, event_start_indices, event_end_indices,
+   state_events, state_event_indices) = (
+       run_length_encoding.encode_and_index_events(
+           state=note_sequences.NoteEncodingState() if include_ties else None,
+           event_times=times,
+           event_values=values,
+           encode_event_fn=note_sequences.note_event_data_to_events,
+           codec=codec,
+           frame_times=frame_times,
+           encoding_state_to_events_fn=(
+               note_sequences.note_encoding_state_to_events
+               if include_ties else None)))
+
+  return {
+      'inputs': frames,
+      'input_times': frame_times,
+      'targets': events,
+      'input_event_start_indices': event_start_indices,
+      'input_event_end_indices': event_end_indices,
+      'state_events': state_events,
+      'input_state_event_indices': state_event_indices,
+      'sequence': ns.SerializeToString()
+  }
+
+
 def tokenize_example_with_program_lookup(
     ds: tf.data.Dataset,
     spectrogram_config: spectrograms.SpectrogramConfig,
@@ -294,66 +378,11 @@ def tokenize_example_with_program_lookup(
   del is_training_data
 
   def tokenize(sequences, inst_names, audio, example_id=None):
-    # Add all the notes from the tracks to a single NoteSequence.
-    ns = note_seq.NoteSequence(ticks_per_quarter=220)
-    tracks = [note_seq.NoteSequence.FromString(seq) for seq in sequences]
-    assert len(tracks) == len(inst_names)
-    for track, inst_name in zip(tracks, inst_names):
-      program = inst_name_to_program_fn(
-          inst_name.decode())
-
-      # Note that there are no pitch bends in URMP data; the below block will
-      # raise PitchBendError if one is encountered.
-      add_track_to_notesequence(ns, track, program=program, is_drum=False,
-                                ignore_pitch_bends=False)
-
-    note_sequences.assign_instruments(ns)
-    note_sequences.validate_note_sequence(ns)
-
-    if example_id is not None:
-      ns.id = example_id
-
-    samples = note_seq.audio_io.wav_data_to_samples_librosa(
-        audio, sample_rate=spectrogram_config.sample_rate)
-
-    logging.info('Got samples for %s::%s with length %d',
-                 ns.id, ns.filename, len(samples))
-
-    frames, frame_times = _audio_to_frames(samples, spectrogram_config)
-
-    if onsets_only:
-      times, values = note_sequences.note_sequence_to_onsets(ns)
-    else:
-      times, values = (
-          note_sequences.note_sequence_to_onsets_and_offsets_and_programs(ns))
-
-    # The original NoteSequence can have a lot of control changes we don't need;
-    # delete them.
-    del ns.control_changes[:]
-
-    (events, event_start_indices, event_end_indices,
-     state_events, state_event_indices) = (
-         run_length_encoding.encode_and_index_events(
-             state=note_sequences.NoteEncodingState() if include_ties else None,
-             event_times=times,
-             event_values=values,
-             encode_event_fn=note_sequences.note_event_data_to_events,
-             codec=codec,
-             frame_times=frame_times,
-             encoding_state_to_events_fn=(
-                 note_sequences.note_encoding_state_to_events
-                 if include_ties else None)))
-
-    yield {
-        'inputs': frames,
-        'input_times': frame_times,
-        'targets': events,
-        'input_event_start_indices': event_start_indices,
-        'input_event_end_indices': event_end_indices,
-        'state_events': state_events,
-        'input_state_event_indices': state_event_indices,
-        'sequence': ns.SerializeToString()
-    }
+    yield _tokenize_with_program_lookup(
+        sequences, inst_names, audio, example_id,
+        spectrogram_config=spectrogram_config, codec=codec,
+        onsets_only=onsets_only, include_ties=include_ties,
+        inst_name_to_program_fn=inst_name_to_program_fn)
 
   def process_record(input_record):
     args = [
@@ -486,6 +515,91 @@ def add_track_to_notesequence(ns: note_seq.NoteSequence,
     ns.total_time = max(ns.total_time, note.end_time)
 
 
+def _tokenize_slakh(
+    sequences: Sequence[bytes], samples, sample_rate: int,
+    inst_names: Sequence[bytes], example_id: bytes,
+    spectrogram_config: spectrograms.SpectrogramConfig,
+    codec: event_codec.Codec, is_training_data: bool, onsets_only: bool,
+    include_ties: bool,
+    track_specs: Optional[Sequence[note_sequences.TrackSpec]],
+    ignore_pitch_bends: bool
+) -> Optional[Mapping[str, Any]]:
+  """Tokenize a single Slakh example, or return None if it has pitch bends."""
+  if sample_rate != spectrogram_config.sample_rate:
+    samples = librosa.resample(
+        samples, sample_rate, spectrogram_config.sample_rate)
+
+  frames, frame_times = _audio_to_frames(samples, spectrogram_config)
+
+  # Add all the notes from the tracks to a single NoteSequence.
+  ns = note_seq.NoteSequence(ticks_per_quarter=220)
+  tracks = [note_seq.NoteSequence.FromString(seq) for seq in sequences]
+  assert len(tracks) == len(inst_names)
+  if track_specs:
+    # Specific tracks expected.
+    assert len(tracks) == len(track_specs)
+    for track, spec, inst_name in zip(tracks, track_specs, inst_names):
+      # Make sure the instrument name matches what we expect.
+      assert inst_name.decode() == spec.name
+      try:
+        add_track_to_notesequence(ns, track,
+                                  program=spec.program, is_drum=spec.is_drum,
+                                  ignore_pitch_bends=ignore_pitch_bends)
+      except PitchBendError:
+        # TODO(iansimon): is there a way to count these?
+        return None
+  else:
+    for track, inst_name in zip(tracks, inst_names):
+      # Instrument name should be Slakh class.
+      program, is_drum = slakh_class_to_program_and_is_drum(
+          inst_name.decode())
+      try:
+        add_track_to_notesequence(ns, track, program=program, is_drum=is_drum,
+                                  ignore_pitch_bends=ignore_pitch_bends)
+      except PitchBendError:
+        # TODO(iansimon): is there a way to count these?
+        return None
+
+  note_sequences.assign_instruments(ns)
+  note_sequences.validate_note_sequence(ns)
+  if is_training_data:
+    # Trim overlapping notes in training (as our event vocabulary cannot
+    # represent them), but preserve original NoteSequence for eval.
+    ns = note_sequences.trim_overlapping_notes(ns)
+
+  ns.id = example_id
+
+  if onsets_only:
+    times, values = note_sequences.note_sequence_to_onsets(ns)
+  else:
+    times, values = (
+        note_sequences.note_sequence_to_onsets_and_offsets_and_programs(ns))
+
+  (events, event_start_indices, event_end_indices,
+   state_events, state_event_indices) = (
+       run_length_encoding.encode_and_index_events(
+           state=note_sequences.NoteEncodingState() if include_ties else None,
+           event_times=times,
+           event_values=values,
+           encode_event_fn=note_sequences.note_event_data_to_events,
+           codec=codec,
+           frame_times=frame_times,
+           encoding_state_to_events_fn=(
+               note_sequences.note_encoding_state_to_events
+               if include_ties else None)))
+
+  return {
+      'inputs': frames,
+      'input_times': frame_times,
+      'targets': events,
+      'input_event_start_indices': event_start_indices,
+      'input_event_end_indices': event_end_indices,
+      'state_events': state_events,
+      'input_state_event_indices': state_event_indices,
+      'sequence': ns.SerializeToString()
+  }
+
+
 def tokenize_slakh_example(
     ds: tf.data.Dataset,
     spectrogram_config: spectrograms.SpectrogramConfig,
@@ -498,79 +612,14 @@ def tokenize_slakh_example(
 ) -> tf.data.Dataset:
   """Tokenize a Slakh multitrack note transcription example."""
   def tokenize(sequences, samples, sample_rate, inst_names, example_id):
-    if sample_rate != spectrogram_config.sample_rate:
-      samples = librosa.resample(
-          samples, sample_rate, spectrogram_config.sample_rate)
-
-    frames, frame_times = _audio_to_frames(samples, spectrogram_config)
-
-    # Add all the notes from the tracks to a single NoteSequence.
-    ns = note_seq.NoteSequence(ticks_per_quarter=220)
-    tracks = [note_seq.NoteSequence.FromString(seq) for seq in sequences]
-    assert len(tracks) == len(inst_names)
-    if track_specs:
-      # Specific tracks expected.
-      assert len(tracks) == len(track_specs)
-      for track, spec, inst_name in zip(tracks, track_specs, inst_names):
-        # Make sure the instrument name matches what we expect.
-        assert inst_name.decode() == spec.name
-        try:
-          add_track_to_notesequence(ns, track,
-                                    program=spec.program, is_drum=spec.is_drum,
-                                    ignore_pitch_bends=ignore_pitch_bends)
-        except PitchBendError:
-          # TODO(iansimon): is there a way to count these?
-          return
-    else:
-      for track, inst_name in zip(tracks, inst_names):
-        # Instrument name should be Slakh class.
-        program, is_drum = slakh_class_to_program_and_is_drum(
-            inst_name.decode())
-        try:
-          add_track_to_notesequence(ns, track, program=program, is_drum=is_drum,
-                                    ignore_pitch_bends=ignore_pitch_bends)
-        except PitchBendError:
-          # TODO(iansimon): is there a way to count these?
-          return
-
-    note_sequences.assign_instruments(ns)
-    note_sequences.validate_note_sequence(ns)
-    if is_training_data:
-      # Trim overlapping notes in training (as our event vocabulary cannot
-      # represent them), but preserve original NoteSequence for eval.
-      ns = note_sequences.trim_overlapping_notes(ns)
-
-    ns.id = example_id
-
-    if onsets_only:
-      times, values = note_sequences.note_sequence_to_onsets(ns)
-    else:
-      times, values = (
-          note_sequences.note_sequence_to_onsets_and_offsets_and_programs(ns))
-
-    (events, event_start_indices, event_end_indices,
-     state_events, state_event_indices) = (
-         run_length_encoding.encode_and_index_events(
-             state=note_sequences.NoteEncodingState() if include_ties else None,
-             event_times=times,
-             event_values=values,
-             encode_event_fn=note_sequences.note_event_data_to_events,
-             codec=codec,
-             frame_times=frame_times,
-             encoding_state_to_events_fn=(
-                 note_sequences.note_encoding_state_to_events
-                 if include_ties else None)))
-
-    yield {
-        'inputs': frames,
-        'input_times': frame_times,
-        'targets': events,
-        'input_event_start_indices': event_start_indices,
-        'input_event_end_indices': event_end_indices,
-        'state_events': state_events,
-        'input_state_event_indices': state_event_indices,
-        'sequence': ns.SerializeToString()
-    }
+    tokenized = _tokenize_slakh(
+        sequences, samples, sample_rate, inst_names, example_id,
+        spectrogram_config=spectrogram_config, codec=codec,
+        is_training_data=is_training_data, onsets_only=onsets_only,
+        include_ties=include_ties, track_specs=track_specs,
+        ignore_pitch_bends=ignore_pitch_bends)
+    if tokenized is not None:
+      yield tokenized
 
   def process_record(input_record):
     ds = tf.data.Dataset.from_generator(
@@ -608,13 +657,140 @@ def tokenize_slakh_example(
   return tokenized_records
 
 
+# Per-record versions of the tokenizers above, for random-access (Grain)
+# pipelines. These take a single parsed example as a dict of numpy values and
+# return the tokenized example, rather than mapping over a tf.data.Dataset.
+
+
+def _include_record_inputs(output_record, input_record,
+                           fields_to_omit=('audio',)):
+  """Like `_include_inputs`, for a single record."""
+  output_record = dict(output_record)
+  # Audio frames are computed with TensorFlow ops.
+  output_record['inputs'] = np.asarray(output_record['inputs'])
+  for key in set(input_record.keys()) - set(output_record.keys()):
+    output_record[key] = input_record[key]
+  for key in fields_to_omit:
+    del output_record[key]
+  return output_record
 
 
+def tokenize_transcription_record(
+    ex: Mapping[str, Any], spectrogram_config: spectrograms.SpectrogramConfig,
+    codec: event_codec.Codec, is_training_data: bool,
+    onsets_only: bool, include_ties: bool, audio_is_samples: bool,
+    id_feature_key: Optional[str] = None
+) -> Mapping[str, Any]:
+  """Tokenize a single example; see `tokenize_transcription_example`."""
+  del is_training_data
+
+  if onsets_only and include_ties:
+    raise ValueError('Ties not supported when only modeling onsets.')
+  if audio_is_samples and 'sample_rate' not in ex:
+    raise ValueError('Must provide sample rate when audio is samples.')
+
+  tokenized = _tokenize_transcription(
+      ex['sequence'], ex['audio'],
+      ex['sample_rate'] if 'sample_rate' in ex else 0,
+      ex[id_feature_key] if id_feature_key is not None else None,
+      spectrogram_config=spectrogram_config, codec=codec,
+      onsets_only=onsets_only, include_ties=include_ties,
+      audio_is_samples=audio_is_samples)
+  return _include_record_inputs(tokenized, ex)
+
+
+def tokenize_guitarset_record(
+    ex: Mapping[str, Any], spectrogram_config: spectrograms.SpectrogramConfig,
+    codec: event_codec.Codec, is_training_data: bool,
+    onsets_only: bool, include_ties: bool
+) -> Mapping[str, Any]:
+  """Tokenize a single example; see `tokenize_guitarset_example`."""
+  assert 'inst_names' not in ex, 'Key `inst_names` is already populated.'
+  ex = dict(ex)
+  ex['inst_names'] = [b'Clean Guitar']
+  ex['instrument_sequences'] = [ex.pop('sequence')]
+  return tokenize_record_with_program_lookup(
+      ex,
+      spectrogram_config=spectrogram_config,
+      codec=codec,
+      is_training_data=is_training_data,
+      inst_name_to_program_fn=guitarset_instrument_to_program,
+      onsets_only=onsets_only,
+      include_ties=include_ties,
+      id_feature_key='id')
+
+
+def tokenize_record_with_program_lookup(
+    ex: Mapping[str, Any],
+    spectrogram_config: spectrograms.SpectrogramConfig,
+    codec: event_codec.Codec,
+    is_training_data: bool,
+    onsets_only: bool,
+    include_ties: bool,
+    inst_name_to_program_fn: Callable[[str], int],
+    id_feature_key: Optional[str] = None
+) -> Mapping[str, Any]:
+  """Tokenize a single example; see `tokenize_example_with_program_lookup`."""
+  del is_training_data
+
+  tokenized = _tokenize_with_program_lookup(
+      ex['instrument_sequences'], ex['inst_names'], ex['audio'],
+      ex[id_feature_key] if id_feature_key is not None else None,
+      spectrogram_config=spectrogram_config, codec=codec,
+      onsets_only=onsets_only, include_ties=include_ties,
+      inst_name_to_program_fn=inst_name_to_program_fn)
+  return _include_record_inputs(tokenized, ex)
+
+
+def tokenize_slakh_record(
+    ex: Mapping[str, Any],
+    spectrogram_config: spectrograms.SpectrogramConfig,
+    codec: event_codec.Codec,
+    is_training_data: bool,
+    onsets_only: bool,
+    include_ties: bool,
+    track_specs: Optional[Sequence[note_sequences.TrackSpec]],
+    ignore_pitch_bends: bool
+) -> Mapping[str, Any]:
+  """Tokenize a single example; see `tokenize_slakh_example`.
+
+  Returns an empty dict for examples that the tf.data version would drop
+  (tracks with pitch bends), so they can be filtered out afterwards.
+  """
+  tokenized = _tokenize_slakh(
+      ex['note_sequences'], ex['mix'], ex['audio_sample_rate'],
+      ex['inst_names'], ex['track_id'],
+      spectrogram_config=spectrogram_config, codec=codec,
+      is_training_data=is_training_data, onsets_only=onsets_only,
+      include_ties=include_ties, track_specs=track_specs,
+      ignore_pitch_bends=ignore_pitch_bends)
+  if tokenized is None:
+    return {}
+  return _include_record_inputs(
+      tokenized, ex, fields_to_omit=['mix', 'stems'])
+
+
+@gin.configurable
 @seqio.map_over_dataset
-def compute_spectrograms(ex, spectrogram_config):
+def compute_spectrograms(ex, spectrogram_config, keep_raw_inputs=True):
+  """Compute spectrogram inputs, optionally keeping the raw audio samples.
+
+  Raw samples are only needed for audio summaries; dropping them avoids
+  carrying a second copy of every segment's audio through the pipeline.
+
+  Args:
+    ex: Example with audio frames as 'inputs'.
+    spectrogram_config: Spectrogram configuration.
+    keep_raw_inputs: If True, also store the flattened samples as
+        'raw_inputs'.
+
+  Returns:
+    The example with spectrogram 'inputs'.
+  """
   samples = spectrograms.flatten_frames(ex['inputs'])
   ex['inputs'] = spectrograms.compute_spectrogram(samples, spectrogram_config)
-  ex['raw_inputs'] = samples
+  if keep_raw_inputs:
+    ex['raw_inputs'] = samples
   return ex
 
 
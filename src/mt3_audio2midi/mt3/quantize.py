@@ -0,0 +1,71 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Post-training int8 weight quantization of the Transformer kernels.
+
+Every `layers.DenseGeneral` kernel (the parameters named `kernel`) is stored
+as int8, with a float32 scale per output feature in `kernel_scale`:
+`kernel ~= int8_kernel * kernel_scale`. Embeddings and layer norms stay in
+float32. The quantized parameters are used by setting `T5Config.quantization`
+to one of `layers.QUANTIZATION_MODES`.
+"""
+
+from typing import Any, Mapping, Tuple
+
+import numpy as np
+
+PyTree = Any
+
+# Param pack metadata key of the weight format, e.g. {'quantization': 'int8'}.
+METADATA_KEY = 'quantization'
+WEIGHT_FORMAT = 'int8'
+_INT8_MAX = 127
+
+
+def quantize_kernel(kernel: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  """Symmetrically quantizes a [inputs, features] kernel per feature.
+
+  Args:
+    kernel: 2d float kernel, as stored by `layers.DenseGeneral`.
+
+  Returns:
+    The int8 kernel and its float32 scale per feature (column).
+  """
+  kernel = np.asarray(kernel, np.float32)
+  scale = np.abs(kernel).max(axis=0) / _INT8_MAX
+  scale = np.where(scale == 0, 1, scale).astype(np.float32)
+  quantized = np.clip(np.round(kernel / scale), -_INT8_MAX, _INT8_MAX)
+  return quantized.astype(np.int8), scale
+
+
+def quantize_params(params: Mapping[str, Any]) -> PyTree:
+  """Quantizes all kernels in a nested dict of parameters."""
+  quantized = {}
+  for name, value in params.items():
+    if isinstance(value, Mapping):
+      quantized[name] = quantize_params(value)
+    elif name == 'kernel':
+      quantized['kernel'], quantized['kernel_scale'] = quantize_kernel(value)
+    else:
+      quantized[name] = value
+  return quantized
+
+
+def is_quantized(params: Mapping[str, Any]) -> bool:
+  """Whether a nested dict of parameters has quantized kernels."""
+  for name, value in params.items():
+    if name == 'kernel_scale' or (
+        isinstance(value, Mapping) and is_quantized(value)):
+      return True
+  return False
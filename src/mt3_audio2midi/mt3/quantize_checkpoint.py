@@ -0,0 +1,140 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Quantizes the kernels of a checkpoint to int8 and writes a param pack.
+
+With `--eval_audio`, also transcribes held-out audio with the original and the
+quantized parameters, and reports `metrics.transcription_metrics` of both and
+their difference. Each audio file needs a reference MIDI file with the same
+path and a `.mid` extension.
+
+Usage:
+python -m mt3_audio2midi.mt3.quantize_checkpoint \
+  --checkpoint=/path/to/mt3/checkpoint --output=/path/to/mt3.int8.params \
+  --eval_audio=/path/to/heldout/*.wav
+"""
+
+import json
+import os
+from typing import Mapping, Sequence
+
+from absl import app
+from absl import flags
+from absl import logging
+from etils import epath
+
+from mt3_audio2midi.mt3 import layers
+from mt3_audio2midi.mt3 import param_pack
+from mt3_audio2midi.mt3 import quantize
+
+import numpy as np
+
+_CHECKPOINT = flags.DEFINE_string(
+    'checkpoint', None, 'T5X checkpoint or param pack to quantize.',
+    required=True)
+_OUTPUT = flags.DEFINE_string(
+    'output', None, 'Path of the quantized param pack to write.',
+    required=True)
+_MODEL_TYPE = flags.DEFINE_enum(
+    'model_type', 'mt3', ['mt3', 'ismir2021'], 'Model type of --checkpoint.')
+_EVAL_AUDIO = flags.DEFINE_list(
+    'eval_audio', [],
+    'Held-out audio files (or glob patterns) to compare transcription metrics '
+    'on; each needs a reference MIDI file with the same path and extension '
+    '.mid.')
+_EVAL_QUANTIZATION = flags.DEFINE_enum(
+    'eval_quantization', 'int8', list(layers.QUANTIZATION_MODES),
+    'Quantized execution mode to evaluate.')
+_METRICS_OUTPUT = flags.DEFINE_string(
+    'metrics_output', None, 'Optional JSON file to write the metrics to.')
+
+
+def _eval_files(patterns: Sequence[str]) -> Sequence[str]:
+  paths = []
+  for pattern in patterns:
+    path = epath.Path(pattern)
+    matches = sorted(path.parent.glob(path.name)) if '*' in pattern else [path]
+    paths.extend(os.fspath(match) for match in matches)
+  return paths
+
+
+def transcription_scores(transcriber, audio_paths: Sequence[str]
+                         ) -> Mapping[str, float]:
+  """Mean `metrics.transcription_metrics` scores of a transcriber."""
+  # pylint: disable=g-import-not-at-top
+  import librosa
+  from mt3_audio2midi.mt3 import metrics
+  import note_seq
+  # pylint: enable=g-import-not-at-top
+  targets = []
+  predictions = []
+  for unique_id, audio_path in enumerate(audio_paths):
+    samples = librosa.load(
+        audio_path, sr=transcriber.spectrogram_config.sample_rate)[0]
+    ref_ns = note_seq.midi_file_to_note_sequence(
+        os.path.splitext(audio_path)[0] + '.mid')
+    segment_predictions = transcriber.predict_segments(samples)
+    for i, prediction in enumerate(segment_predictions):
+      targets.append({'unique_id': unique_id, 'ref_ns': ref_ns if i == 0
+                      else None})
+      predictions.append(dict(prediction, unique_id=unique_id))
+  scores = metrics.transcription_metrics(
+      targets, predictions, codec=transcriber.codec,
+      spectrogram_config=transcriber.spectrogram_config, onsets_only=False,
+      use_ties=transcriber.config.use_ties, num_summary_examples=1)
+  return {name: float(value) for name, value in scores.items()
+          if isinstance(value, (float, np.floating))}
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  params = param_pack.load_params(_CHECKPOINT.value)
+  if quantize.is_quantized(params):
+    raise app.UsageError(f'{_CHECKPOINT.value} is already quantized.')
+  param_pack.write_param_pack(
+      _OUTPUT.value, quantize.quantize_params(params),
+      metadata={'checkpoint': _CHECKPOINT.value,
+                quantize.METADATA_KEY: quantize.WEIGHT_FORMAT})
+  logging.info('Wrote quantized param pack %s', _OUTPUT.value)
+
+  audio_paths = _eval_files(_EVAL_AUDIO.value)
+  if not audio_paths:
+    return
+  # pylint: disable=g-import-not-at-top
+  from mt3_audio2midi import infer
+  # pylint: enable=g-import-not-at-top
+  float_scores = transcription_scores(
+      infer.Transcriber(_CHECKPOINT.value, model_type=_MODEL_TYPE.value),
+      audio_paths)
+  quantized_scores = transcription_scores(
+      infer.Transcriber(_OUTPUT.value, model_type=_MODEL_TYPE.value,
+                        quantization=_EVAL_QUANTIZATION.value),
+      audio_paths)
+  results = {}
+  for name in sorted(float_scores):
+    results[name] = {
+        'float32': float_scores[name],
+        _EVAL_QUANTIZATION.value: quantized_scores[name],
+        'delta': quantized_scores[name] - float_scores[name],
+    }
+    logging.info('%s: float32 %.4f, %s %.4f (delta %+.4f)', name,
+                 float_scores[name], _EVAL_QUANTIZATION.value,
+                 quantized_scores[name], results[name]['delta'])
+  if _METRICS_OUTPUT.value:
+    epath.Path(_METRICS_OUTPUT.value).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -14,10 +14,8 @@
 
 """Tools for run length encoding."""
 
-import dataclasses
 from typing import Any, Callable, Mapping, MutableMapping, Tuple, Optional, Sequence, TypeVar
 
-from absl import logging
 from mt3_audio2midi.mt3 import event_codec
 
 import numpy as np
@@ -26,38 +24,19 @@ import tensorflow as tf
 
 Event = event_codec.Event
 
-# These should be type variables, but unfortunately those are incompatible with
-# dataclasses.
-EventData = Any
-EncodingState = Any
-DecodingState = Any
-DecodeResult = Any
+# Event data, encoding and decoding state types and the encoding spec are
+# defined in event_codec, which (unlike this module) does not use TensorFlow.
+EventData = event_codec.EventData
+EncodingState = event_codec.EncodingState
+DecodingState = event_codec.DecodingState
+DecodeResult = event_codec.DecodeResult
 
 T = TypeVar('T', bound=EventData)
 ES = TypeVar('ES', bound=EncodingState)
 DS = TypeVar('DS', bound=DecodingState)
 
-
-@dataclasses.dataclass
-class EventEncodingSpec:
-  """Spec for encoding events."""
-  # initialize encoding state
-  init_encoding_state_fn: Callable[[], EncodingState]
-  # convert EventData into zero or more events, updating encoding state
-  encode_event_fn: Callable[[EncodingState, EventData, event_codec.Codec],
-                            Sequence[event_codec.Event]]
-  # convert encoding state (at beginning of segment) into events
-  encoding_state_to_events_fn: Optional[Callable[[EncodingState],
-                                                 Sequence[event_codec.Event]]]
-  # create empty decoding state
-  init_decoding_state_fn: Callable[[], DecodingState]
-  # update decoding state when entering new segment
-  begin_decoding_segment_fn: Callable[[DecodingState], None]
-  # consume time and Event and update decoding state
-  decode_event_fn: Callable[
-      [DecodingState, float, event_codec.Event, event_codec.Codec], None]
-  # flush decoding state into result
-  flush_decoding_state_fn: Callable[[DecodingState], DecodeResult]
+EventEncodingSpec = event_codec.EventEncodingSpec
+decode_events = event_codec.decode_events
 
 
 def encode_and_index_events(
@@ -191,6 +170,34 @@ def extract_target_sequence_with_indices(features, state_events_end_token=None):
   return features
 
 
+def remove_redundant_state_changes_np(
+    events: np.ndarray,
+    codec: event_codec.Codec,
+    state_change_event_types: Sequence[str] = ()
+) -> np.ndarray:
+  """Remove redundant state change events, e.g. duplicate velocity changes.
+
+  Args:
+    events: A 1D array of integer event values.
+    codec: The event_codec.Codec used to interpret the events.
+    state_change_event_types: A list of event types that represent state
+        changes; an event of one of these types is redundant if it equals the
+        previous event of the same type.
+
+  Returns:
+    A 1D int32 array of the events that are not redundant.
+  """
+  events = np.asarray(events, dtype=np.int32)
+  keep = np.ones(len(events), dtype=bool)
+  for event_type in state_change_event_types:
+    min_index, max_index = codec.event_type_range(event_type)
+    indices = np.flatnonzero((events >= min_index) & (events <= max_index))
+    # The state starts at zero.
+    previous_states = np.concatenate([[0], events[indices[:-1]]])
+    keep[indices] &= events[indices] != previous_states
+  return events[keep]
+
+
 def remove_redundant_state_changes_fn(
     codec: event_codec.Codec,
     feature_key: str = 'targets',
@@ -208,37 +215,60 @@ def remove_redundant_state_changes_fn(
   Returns:
     A preprocessing function that removes redundant state change events.
   """
-  state_change_event_ranges = [codec.event_type_range(event_type)
-                               for event_type in state_change_event_types]
-
   def remove_redundant_state_changes(
       features: MutableMapping[str, Any],
   ) -> Mapping[str, Any]:
     """Remove redundant tokens e.g. duplicate velocity changes from sequence."""
-    current_state = tf.zeros(len(state_change_event_ranges), dtype=tf.int32)
-    output = tf.constant([], dtype=tf.int32)
-
-    for event in features[feature_key]:
-      # Let autograph know that the shape of 'output' will change during the
-      # loop.
-      tf.autograph.experimental.set_loop_options(
-          shape_invariants=[(output, tf.TensorShape([None]))])
-      is_redundant = False
-      for i, (min_index, max_index) in enumerate(state_change_event_ranges):
-        if (min_index <= event) and (event <= max_index):
-          if current_state[i] == event:
-            is_redundant = True
-          current_state = tf.tensor_scatter_nd_update(
-              current_state, indices=[[i]], updates=[event])
-      if not is_redundant:
-        output = tf.concat([output, [event]], axis=0)
-
+    output = tf.numpy_function(
+        lambda events: remove_redundant_state_changes_np(
+            events, codec=codec,
+            state_change_event_types=state_change_event_types),
+        [features[feature_key]], tf.int32, stateful=False)
+    output.set_shape([None])
     features[feature_key] = output
     return features
 
   return seqio.map_over_dataset(remove_redundant_state_changes)
 
 
+def run_length_encode_shifts_np(
+    events: np.ndarray,
+    codec: event_codec.Codec
+) -> np.ndarray:
+  """Combine leading/interior single-step shifts, trim trailing shifts.
+
+  Before each non-shift event that follows shifts, outputs the total number of
+  steps so far as shifts of at most `codec.max_shift_steps` steps.
+
+  Args:
+    events: A 1D array of integer event values with single-step shifts.
+    codec: The Codec to use for shift events.
+
+  Returns:
+    A 1D int32 array of events with run-length encoded shifts.
+  """
+  events = np.asarray(events, dtype=np.int32)
+  min_shift, max_shift = codec.event_type_range('shift')
+  is_shift = (events >= min_shift) & (events <= max_shift)
+  non_shift_indices = np.flatnonzero(~is_shift)
+  if not non_shift_indices.size:
+    return np.zeros(0, dtype=np.int32)
+
+  total_steps = np.cumsum(is_shift)[non_shift_indices]
+  has_shifts = total_steps > np.concatenate([[0], total_steps[:-1]])
+  max_shift_steps = codec.max_shift_steps
+  num_shifts = np.where(has_shifts, -(-total_steps // max_shift_steps), 0)
+  event_positions = np.cumsum(num_shifts + 1) - 1
+
+  output = np.full(event_positions[-1] + 1, max_shift_steps, dtype=np.int32)
+  output[event_positions] = events[non_shift_indices]
+  # The last shift before each event covers the remaining steps.
+  remainders = total_steps % max_shift_steps
+  partial = has_shifts & (remainders > 0)
+  output[event_positions[partial] - 1] = remainders[partial]
+  return output
+
+
 def run_length_encode_shifts_fn(
     codec: event_codec.Codec,
     feature_key: str = 'targets'
@@ -263,32 +293,10 @@ def run_length_encode_shifts_fn(
     Returns:
       A dict of features.
     """
-    events = features[feature_key]
-
-    shift_steps = 0
-    total_shift_steps = 0
-    output = tf.constant([], dtype=tf.int32)
-
-    for event in events:
-      # Let autograph know that the shape of 'output' will change during the
-      # loop.
-      tf.autograph.experimental.set_loop_options(
-          shape_invariants=[(output, tf.TensorShape([None]))])
-      if codec.is_shift_event_index(event):
-        shift_steps += 1
-        total_shift_steps += 1
-
-      else:
-        # Once we've reached a non-shift event, RLE all previous shift events
-        # before outputting the non-shift event.
-        if shift_steps > 0:
-          shift_steps = total_shift_steps
-          while shift_steps > 0:
-            output_steps = tf.minimum(codec.max_shift_steps, shift_steps)
-            output = tf.concat([output, [output_steps]], axis=0)
-            shift_steps -= output_steps
-        output = tf.concat([output, [event]], axis=0)
-
+    output = tf.numpy_function(
+        lambda events: run_length_encode_shifts_np(events, codec=codec),
+        [features[feature_key]], tf.int32, stateful=False)
+    output.set_shape([None])
     features[feature_key] = output
     return features
 
@@ -368,56 +376,69 @@ def merge_run_length_encoded_targets(
   return output
 
 
-def decode_events(
-    state: DS,
-    tokens: np.ndarray,
-    start_time: int,
-    max_time: Optional[int],
-    codec: event_codec.Codec,
-    decode_event_fn: Callable[[DS, float, event_codec.Event, event_codec.Codec],
-                              None],
-) -> Tuple[int, int]:
-  """Decode a series of tokens, maintaining a decoding state object.
+def merge_run_length_encoded_targets_np(
+    targets: Sequence[np.ndarray],
+    codec: event_codec.Codec
+) -> np.ndarray:
+  """Merge multiple tracks of target events into a single stream (NumPy).
+
+  Produces the same output as `merge_run_length_encoded_targets` but operates
+  on unpadded tracks of different lengths and merges them with a single sort
+  instead of an event-by-event loop. Tracks are expected to be output by
+  `run_length_encode_shifts`, i.e. with increasing shifts that are each
+  followed by at least one non-shift event.
 
   Args:
-    state: Decoding state object; will be modified in-place.
-    tokens: event tokens to convert.
-    start_time: offset start time if decoding in the middle of a sequence.
-    max_time: Events at or beyond this time will be dropped.
-    codec: An event_codec.Codec object that maps indices to Event objects.
-    decode_event_fn: Function that consumes an Event (and the current time) and
-        updates the decoding state.
+    targets: A sequence of 1D arrays of integer event values, one per track.
+        Each track is truncated at its first zero (padding).
+    codec: The event_codec.Codec used to interpret the events.
 
   Returns:
-    invalid_events: number of events that could not be decoded.
-    dropped_events: number of events dropped due to max_time restriction.
+    A 1D int32 array of merged events.
   """
-  invalid_events = 0
-  dropped_events = 0
-  cur_steps = 0
-  cur_time = start_time
-  token_idx = 0
-  for token_idx, token in enumerate(tokens):
-    try:
-      event = codec.decode_event_index(token)
-    except ValueError:
-      invalid_events += 1
-      continue
-    if event.type == 'shift':
-      cur_steps += event.value
-      cur_time = start_time + cur_steps / codec.steps_per_second
-      if max_time and cur_time > max_time:
-        dropped_events = len(tokens) - token_idx
-        break
-    else:
-      cur_steps = 0
-      try:
-        decode_event_fn(state, cur_time, event, codec)
-      except ValueError:
-        invalid_events += 1
-        logging.info(
-            'Got invalid event when decoding event %s at time %f. '
-            'Invalid event counter now at %d.',
-            event, cur_time, invalid_events, exc_info=True)
-        continue
-  return invalid_events, dropped_events
+  tracks = []
+  for track in targets:
+    track = np.asarray(track, dtype=np.int32)
+    padding = np.flatnonzero(track == 0)
+    if padding.size:
+      track = track[:padding[0]]
+    tracks.append(track)
+  track_lengths = np.array([len(track) for track in tracks], dtype=np.int64)
+  if not track_lengths.sum():
+    return np.zeros(0, dtype=np.int32)
+
+  events = np.concatenate(tracks)
+  event_tracks = np.repeat(np.arange(len(tracks)), track_lengths)
+  min_shift, max_shift = codec.event_type_range('shift')
+  is_shift = (events >= min_shift) & (events <= max_shift)
+
+  # Split each track into segments that start at a shift event (or at the
+  # start of the track, for events at step zero before the first shift).
+  track_starts = np.zeros(len(events), dtype=bool)
+  track_starts[np.cumsum(track_lengths)[:-1][track_lengths[1:] > 0]] = True
+  track_starts[0] = True
+  segment_starts = np.flatnonzero(is_shift | track_starts)
+  segment_ids = np.cumsum(is_shift | track_starts) - 1
+  segment_steps = np.where(
+      is_shift[segment_starts], events[segment_starts], 0)
+  segment_tracks = event_tracks[segment_starts]
+
+  # Order segments by step. Ties at step zero take the last track first and
+  # other ties take the first track first, as in the loop-based merge.
+  order = np.lexsort((
+      np.where(segment_steps == 0, -segment_tracks, segment_tracks),
+      segment_steps))
+  sorted_steps = segment_steps[order]
+  previous_steps = np.concatenate([[0], sorted_steps[:-1]])
+
+  # Drop the leading shift of segments at the same step as the previous one.
+  keep_segment_shift = np.ones(len(order), dtype=bool)
+  keep_segment_shift[order] = (
+      (sorted_steps != previous_steps) | (sorted_steps == 0))
+  keep = np.ones(len(events), dtype=bool)
+  keep[segment_starts] = ~is_shift[segment_starts] | keep_segment_shift
+
+  segment_ranks = np.empty(len(order), dtype=np.int64)
+  segment_ranks[order] = np.arange(len(order))
+  event_order = np.argsort(segment_ranks[segment_ids], kind='stable')
+  return events[event_order[keep[event_order]]]
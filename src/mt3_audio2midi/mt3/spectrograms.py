@@ -14,42 +14,20 @@
 
 """Audio spectrogram functions."""
 
-import dataclasses
-
+from mt3_audio2midi.mt3 import audio_frontend
 from mt3_audio2midi.mt3 import spectral_ops
 import tensorflow as tf
 
-# defaults for spectrogram config
-DEFAULT_SAMPLE_RATE = 16000
-DEFAULT_HOP_WIDTH = 128
-DEFAULT_NUM_MEL_BINS = 512
-
-# fixed constants; add these to SpectrogramConfig before changing
-FFT_SIZE = 2048
-MEL_LO_HZ = 20.0
-
-
-@dataclasses.dataclass
-class SpectrogramConfig:
-  """Spectrogram configuration parameters."""
-  sample_rate: int = DEFAULT_SAMPLE_RATE
-  hop_width: int = DEFAULT_HOP_WIDTH
-  num_mel_bins: int = DEFAULT_NUM_MEL_BINS
+# The spectrogram configuration is defined in audio_frontend, which also has
+# NumPy versions of the functions below.
+DEFAULT_SAMPLE_RATE = audio_frontend.DEFAULT_SAMPLE_RATE
+DEFAULT_HOP_WIDTH = audio_frontend.DEFAULT_HOP_WIDTH
+DEFAULT_NUM_MEL_BINS = audio_frontend.DEFAULT_NUM_MEL_BINS
 
-  @property
-  def abbrev_str(self):
-    s = ''
-    if self.sample_rate != DEFAULT_SAMPLE_RATE:
-      s += 'sr%d' % self.sample_rate
-    if self.hop_width != DEFAULT_HOP_WIDTH:
-      s += 'hw%d' % self.hop_width
-    if self.num_mel_bins != DEFAULT_NUM_MEL_BINS:
-      s += 'mb%d' % self.num_mel_bins
-    return s
+FFT_SIZE = audio_frontend.FFT_SIZE
+MEL_LO_HZ = audio_frontend.MEL_LO_HZ
 
-  @property
-  def frames_per_second(self):
-    return self.sample_rate / self.hop_width
+SpectrogramConfig = audio_frontend.SpectrogramConfig
 
 
 def split_audio(samples, spectrogram_config):
@@ -78,5 +56,4 @@ def flatten_frames(frames):
   return tf.reshape(frames, [-1])
 
 
-def input_depth(spectrogram_config):
-  return spectrogram_config.num_mel_bins
+input_depth = audio_frontend.input_depth
@@ -14,7 +14,9 @@
 
 """TensorBoard summaries and utilities."""
 
-from typing import Any, Mapping, Optional, Sequence, Tuple
+import time
+from typing import (Any, Callable, List, Mapping, Optional, Sequence, Tuple,
+                    TypeVar)
 
 import librosa
 
@@ -35,31 +37,80 @@ _DEFAULT_PIANOROLL_FRAMES_PER_SECOND = 15
 
 # TODO(iansimon): pick a SoundFont; for some reason the default is all organ
 
+T = TypeVar('T')
+
+
+class SummaryBudget:
+  """Time and memory budget for the summaries of one evaluation.
+
+  Summaries are generated one example at a time; once the budget is exhausted,
+  remaining examples are left out of the summaries.
+  """
+
+  def __init__(self,
+               max_seconds: Optional[float] = None,
+               max_bytes: Optional[int] = None):
+    """Create a budget, starting the clock.
+
+    Args:
+      max_seconds: Maximum time to spend generating summaries, or None for no
+          limit.
+      max_bytes: Maximum total size of summary arrays, or None for no limit.
+    """
+    self.max_seconds = max_seconds
+    self.max_bytes = max_bytes
+    self.num_bytes = 0
+    self._start_time = time.time()
+
+  def reserve(self, num_bytes: int) -> bool:
+    """Reserve memory for summarizing one example, if within budget."""
+    if (self.max_seconds is not None and
+        time.time() - self._start_time > self.max_seconds):
+      return False
+    if (self.max_bytes is not None and
+        self.num_bytes + num_bytes > self.max_bytes):
+      return False
+    self.num_bytes += num_bytes
+    return True
+
+
+def _summarize_examples(
+    examples: Sequence[Any],
+    summarize_fn: Callable[[Any], T],
+    num_bytes: int,
+    budget: Optional[SummaryBudget]
+) -> List[T]:
+  """Summarize examples in order, stopping once over budget."""
+  outputs = []
+  for ex in examples:
+    if budget is not None and not budget.reserve(num_bytes):
+      break
+    outputs.append(summarize_fn(ex))
+  return outputs
+
 
 def _extract_example_audio(
-    examples: Sequence[Mapping[str, Any]],
+    example: Mapping[str, Any],
     sample_rate: float,
     num_seconds: float,
     audio_key: str = 'raw_inputs'
 ) -> np.ndarray:
-  """Extract audio from examples.
+  """Extract audio from an example.
 
   Args:
-    examples: List of examples containing raw audio.
+    example: Example containing raw audio.
     sample_rate: Number of samples per second.
     num_seconds: Number of seconds of audio to include.
     audio_key: Dictionary key for the raw audio.
 
   Returns:
-    An n-by-num_samples numpy array of samples.
+    A num_samples float32 numpy array of samples.
   """
-  n = len(examples)
   num_samples = round(num_seconds * sample_rate)
-  all_samples = np.zeros([n, num_samples])
-  for i, ex in enumerate(examples):
-    samples = ex[audio_key][:num_samples]
-    all_samples[i, :len(samples)] = samples
-  return all_samples
+  samples = np.zeros([num_samples], dtype=np.float32)
+  example_samples = example[audio_key][:num_samples]
+  samples[:len(example_samples)] = example_samples
+  return samples
 
 
 def _example_to_note_sequence(
@@ -109,7 +160,7 @@ def _example_to_note_sequence(
 
 
 def _synthesize_example_notes(
-    examples: Sequence[Mapping[str, Sequence[float]]],
+    example: Mapping[str, Sequence[float]],
     ns_feature_name: str,
     note_onset_feature_name: str,
     note_offset_feature_name: str,
@@ -121,231 +172,174 @@ def _synthesize_example_notes(
   """Synthesize example notes to audio.
 
   Args:
-    examples: List of example dictionaries, containing either serialized
-        NoteSequence protos or note onset times and pitches.
+    example: Example dictionary, containing either a serialized NoteSequence
+        proto or note onset times and pitches.
     ns_feature_name: Name of serialized NoteSequence feature.
     note_onset_feature_name: Name of note onset times feature.
     note_offset_feature_name: Name of note offset times feature.
     note_frequency_feature_name: Name of note frequencies feature.
     note_confidence_feature_name: Name of note confidences (velocities) feature.
     sample_rate: Sample rate at which to synthesize.
-    num_seconds: Number of seconds to synthesize for each example.
+    num_seconds: Number of seconds to synthesize.
 
   Returns:
-    An n-by-num_samples numpy array of samples.
+    A num_samples float32 numpy array of samples.
   """
   if (ns_feature_name is not None) == (note_onset_feature_name is not None):
     raise ValueError(
         'must specify exactly one of NoteSequence feature and onset feature')
 
-  n = len(examples)
   num_samples = round(num_seconds * sample_rate)
+  ns = _example_to_note_sequence(
+      example,
+      ns_feature_name=ns_feature_name,
+      note_onset_feature_name=note_onset_feature_name,
+      note_offset_feature_name=note_offset_feature_name,
+      note_frequency_feature_name=note_frequency_feature_name,
+      note_confidence_feature_name=note_confidence_feature_name,
+      num_seconds=num_seconds)
+  fluidsynth = midi_synth.fluidsynth
+  samples = np.zeros([num_samples], dtype=np.float32)
+  synthesized_samples = fluidsynth(ns, sample_rate=sample_rate)[:num_samples]
+  samples[:len(synthesized_samples)] = synthesized_samples
+  return samples
+
+
+def _draw_notes(
+    onset_image: np.ndarray,
+    full_image: np.ndarray,
+    notes: note_sequences.NoteArray,
+    total_time: float,
+    frames_per_second: float
+) -> None:
+  """Draw note onsets and full notes into single-channel pianoroll images.
 
-  all_samples = np.zeros([n, num_samples])
-
-  for i, ex in enumerate(examples):
-    ns = _example_to_note_sequence(
-        ex,
-        ns_feature_name=ns_feature_name,
-        note_onset_feature_name=note_onset_feature_name,
-        note_offset_feature_name=note_offset_feature_name,
-        note_frequency_feature_name=note_frequency_feature_name,
-        note_confidence_feature_name=note_confidence_feature_name,
-        num_seconds=num_seconds)
-    fluidsynth = midi_synth.fluidsynth
-    samples = fluidsynth(ns, sample_rate=sample_rate)
-    if len(samples) > num_samples:
-      samples = samples[:num_samples]
-    all_samples[i, :len(samples)] = samples
-
-  return all_samples
-
+  Frames are as in `note_seq.sequences_lib.sequence_to_pianoroll` with
+  `onset_mode='length_ms'`; rows are pitches, from highest to lowest.
 
-def _examples_to_pianorolls(
-    targets: Sequence[Mapping[str, Sequence[float]]],
-    predictions: Sequence[Mapping[str, Sequence[float]]],
-    ns_feature_suffix: str,
-    note_onset_feature_suffix: str,
-    note_offset_feature_suffix: str,
-    note_frequency_feature_suffix: str,
-    note_confidence_feature_suffix: str,
+  Args:
+    onset_image: A num_pitches-by-num_frames uint8 image for note onsets.
+    full_image: A num_pitches-by-num_frames uint8 image for full notes.
+    notes: Notes to draw.
+    total_time: Total time of the NoteSequence containing the notes; frames
+        past this time are not drawn.
+    frames_per_second: Number of pianoroll frames per second.
+  """
+  num_frames = min(int(total_time * frames_per_second + 1),
+                   onset_image.shape[1])
+  in_range = ((notes.pitch >= note_seq.MIN_MIDI_PITCH) &
+              (notes.pitch <= note_seq.MAX_MIDI_PITCH))
+  rows = note_seq.MAX_MIDI_PITCH - notes.pitch[in_range]
+  start_frames = (notes.start_time[in_range] *
+                  frames_per_second).astype(np.int64)
+  end_frames = np.maximum(
+      start_frames + 1,
+      np.ceil(notes.end_time[in_range] * frames_per_second).astype(np.int64))
+
+  onset = start_frames < num_frames
+  onset_image[rows[onset], start_frames[onset]] = 255
+
+  # Count notes starting minus notes ending at each frame, then accumulate to
+  # find active frames.
+  start_frames = np.minimum(start_frames, num_frames)
+  end_frames = np.minimum(end_frames, num_frames)
+  counts = np.zeros([onset_image.shape[0], num_frames + 1], dtype=np.int32)
+  np.add.at(counts, (rows, start_frames), 1)
+  np.add.at(counts, (rows, end_frames), -1)
+  active = np.cumsum(counts, axis=1)[:, :num_frames] > 0
+  full_image[:, :num_frames][active] = 255
+
+
+def _example_to_pianorolls(
+    target_ns: note_seq.NoteSequence,
+    pred_ns: note_seq.NoteSequence,
+    start_times: Sequence[float],
     track_specs: Optional[Sequence[note_sequences.TrackSpec]],
-    num_seconds: float,
+    num_frames: int,
     frames_per_second: float
 ) -> Tuple[np.ndarray, np.ndarray]:
-  """Generate pianoroll images from example notes.
+  """Draw onset and full pianoroll images for one example."""
+  num_pitches = note_seq.MAX_MIDI_PITCH - note_seq.MIN_MIDI_PITCH + 1
+  num_tracks = len(track_specs) if track_specs else 1
+  pianoroll_height = num_tracks * num_pitches + (num_tracks - 1)
 
-  Args:
-    targets: List of target dictionaries, containing either serialized
-        NoteSequence protos or note onset times and pitches.
-    predictions: List of prediction dictionaries, containing either serialized
-        NoteSequence protos or note onset times and pitches.
-    ns_feature_suffix: Suffix of serialized NoteSequence feature.
-    note_onset_feature_suffix: Suffix of note onset times feature.
-    note_offset_feature_suffix: Suffix of note offset times feature.
-    note_frequency_feature_suffix: Suffix of note frequencies feature.
-    note_confidence_feature_suffix: Suffix of note confidences (velocities)
-        feature.
-    track_specs: Optional list of TrackSpec objects to indicate a set of tracks
-        into which each NoteSequence should be split. Tracks will be stacked
-        vertically in the pianorolls
-    num_seconds: Number of seconds to show for each example.
-    frames_per_second: Number of pianoroll frames per second.
+  onset_image = np.zeros([pianoroll_height, num_frames, 3], dtype=np.uint8)
+  full_image = np.zeros([pianoroll_height, num_frames, 3], dtype=np.uint8)
+
+  # Show lines at frame boundaries.
+  line_frames = np.array(
+      [int(start_time * frames_per_second) for start_time in start_times
+       if start_time < target_ns.total_time], dtype=np.int64)
+  line_frames = line_frames[line_frames < num_frames]
+
+  target_notes = note_sequences.NoteArray.from_note_sequence(target_ns)
+  pred_notes = note_sequences.NoteArray.from_note_sequence(pred_ns)
+  if track_specs is not None:
+    def track(notes, spec):
+      notes = notes.track(spec.program, spec.is_drum)
+      # As for `NoteArray.to_note_sequence`, the total time is the last end.
+      return notes, (notes.end_time.max() if len(notes) else 0.0)
+
+    tracks = [track(target_notes, spec) + track(pred_notes, spec)
+              for spec in track_specs]
+  else:
+    tracks = [(target_notes, target_ns.total_time,
+               pred_notes, pred_ns.total_time)]
 
-  Returns:
-    onset_pianorolls: An n-by-num_pitches-by-num_frames-by-4 numpy array of
-        pianoroll images showing only onsets.
-    full_pianorolls: An n-by-num_pitches-by-num_frames-by-4 numpy array of
-        pianoroll images.
-  """
-  if (ns_feature_suffix is not None) == (note_onset_feature_suffix is not None):
-    raise ValueError(
-        'must specify exactly one of NoteSequence feature and onset feature')
+  for j, (target_track, target_total_time, pred_track,
+          pred_total_time) in enumerate(tracks):
+    start_offset = j * (num_pitches + 1)
+    end_offset = start_offset + num_pitches
 
-  def ex_to_ns(example, prefix):
-    return _example_to_note_sequence(
-        example=example,
-        ns_feature_name=(prefix + ns_feature_suffix
-                         if ns_feature_suffix else None),
-        note_onset_feature_name=(prefix + note_onset_feature_suffix
-                                 if note_onset_feature_suffix else None),
-        note_offset_feature_name=(prefix + note_offset_feature_suffix
-                                  if note_offset_feature_suffix else None),
-        note_frequency_feature_name=(
-            prefix + note_frequency_feature_suffix
-            if note_frequency_feature_suffix else None),
-        note_confidence_feature_name=(
-            prefix + note_confidence_feature_suffix
-            if note_confidence_feature_suffix else None),
-        num_seconds=num_seconds)
+    onset_image[start_offset:end_offset, line_frames, 0] = 255
+    full_image[start_offset:end_offset, line_frames, 0] = 255
+    _draw_notes(
+        onset_image[start_offset:end_offset, :, 1],
+        full_image[start_offset:end_offset, :, 1],
+        target_track, target_total_time, frames_per_second)
+    _draw_notes(
+        onset_image[start_offset:end_offset, :, 2],
+        full_image[start_offset:end_offset, :, 2],
+        pred_track, pred_total_time, frames_per_second)
 
-  n = len(targets)
-  num_pitches = note_seq.MAX_MIDI_PITCH - note_seq.MIN_MIDI_PITCH + 1
-  num_frames = round(num_seconds * frames_per_second)
-  num_tracks = len(track_specs) if track_specs else 1
-  pianoroll_height = num_tracks * num_pitches + (num_tracks - 1)
+    # Add separator between tracks.
+    if j < num_tracks - 1:
+      onset_image[end_offset, :, 0] = 255
+      full_image[end_offset, :, 0] = 255
 
-  onset_images = np.zeros([n, pianoroll_height, num_frames, 3])
-  full_images = np.zeros([n, pianoroll_height, num_frames, 3])
-
-  for i, (target, pred) in enumerate(zip(targets, predictions)):
-    target_ns, pred_ns = [
-        ex_to_ns(ex, prefix)
-        for (ex, prefix) in [(target, 'ref_'), (pred, 'est_')]
-    ]
-
-    # Show lines at frame boundaries. To ensure that these lines are drawn with
-    # the same downsampling and frame selection logic as the real NoteSequences,
-    # use this hack to draw the lines with a NoteSequence that contains notes
-    # across all pitches at all frame start times.
-    start_times_ns = note_seq.NoteSequence()
-    start_times_ns.CopyFrom(target_ns)
-    del start_times_ns.notes[:]
-    for start_time in pred['start_times']:
-      if start_time < target_ns.total_time:
-        for pitch in range(
-            note_seq.MIN_MIDI_PITCH, note_seq.MAX_MIDI_PITCH + 1):
-          start_times_ns.notes.add(
-              pitch=pitch,
-              velocity=100,
-              start_time=start_time,
-              end_time=start_time + (1 / frames_per_second))
-
-    start_time_roll = sequences_lib.sequence_to_pianoroll(
-        start_times_ns,
-        frames_per_second=frames_per_second,
-        min_pitch=note_seq.MIN_MIDI_PITCH,
-        max_pitch=note_seq.MAX_MIDI_PITCH,
-        onset_mode='length_ms')
-    num_start_time_frames = min(len(start_time_roll.onsets), num_frames)
-
-    if track_specs is not None:
-      target_tracks = [note_sequences.extract_track(target_ns,
-                                                    spec.program, spec.is_drum)
-                       for spec in track_specs]
-      pred_tracks = [note_sequences.extract_track(pred_ns,
-                                                  spec.program, spec.is_drum)
-                     for spec in track_specs]
-    else:
-      target_tracks = [target_ns]
-      pred_tracks = [pred_ns]
-
-    for j, (target_track, pred_track) in enumerate(zip(target_tracks[::-1],
-                                                       pred_tracks[::-1])):
-      target_roll = sequences_lib.sequence_to_pianoroll(
-          target_track,
-          frames_per_second=frames_per_second,
-          min_pitch=note_seq.MIN_MIDI_PITCH,
-          max_pitch=note_seq.MAX_MIDI_PITCH,
-          onset_mode='length_ms')
-      pred_roll = sequences_lib.sequence_to_pianoroll(
-          pred_track,
-          frames_per_second=frames_per_second,
-          min_pitch=note_seq.MIN_MIDI_PITCH,
-          max_pitch=note_seq.MAX_MIDI_PITCH,
-          onset_mode='length_ms')
-
-      num_target_frames = min(len(target_roll.onsets), num_frames)
-      num_pred_frames = min(len(pred_roll.onsets), num_frames)
-
-      start_offset = j * (num_pitches + 1)
-      end_offset = (j + 1) * (num_pitches + 1) - 1
-
-      # Onsets
-      onset_images[
-          i, start_offset:end_offset, :num_start_time_frames, 0
-      ] = start_time_roll.onsets[:num_start_time_frames, :].T
-      onset_images[
-          i, start_offset:end_offset, :num_target_frames, 1
-      ] = target_roll.onsets[:num_target_frames, :].T
-      onset_images[
-          i, start_offset:end_offset, :num_pred_frames, 2
-      ] = pred_roll.onsets[:num_pred_frames, :].T
-
-      # Full notes
-      full_images[
-          i, start_offset:end_offset, :num_start_time_frames, 0
-      ] = start_time_roll.onsets[:num_start_time_frames, :].T
-      full_images[
-          i, start_offset:end_offset, :num_target_frames, 1
-      ] = target_roll.active[:num_target_frames, :].T
-      full_images[
-          i, start_offset:end_offset, :num_pred_frames, 2
-      ] = pred_roll.active[:num_pred_frames, :].T
-
-      # Add separator between tracks.
-      if j < num_tracks - 1:
-        onset_images[i, end_offset, :, 0] = 1
-        full_images[i, end_offset, :, 0] = 1
-
-  return onset_images[:, ::-1, :, :], full_images[:, ::-1, :, :]
+  return onset_image, full_image
 
 
 def prettymidi_pianoroll(
     track_pianorolls: Mapping[str, Sequence[Tuple[np.ndarray, np.ndarray]]],
     fps: float,
-    num_seconds=_DEFAULT_AUDIO_SECONDS
+    num_seconds=_DEFAULT_AUDIO_SECONDS,
+    budget: Optional[SummaryBudget] = None
 ) -> Mapping[str, seqio.metrics.MetricValue]:
   """Create summary from given pianorolls."""
   max_len = int(num_seconds * fps)
   summaries = {}
   for inst_name, all_prs in track_pianorolls.items():
 
-    est_prs, ref_prs = zip(*all_prs)
+    def pianoroll_image(prs):
+      est_pr, ref_pr = prs
+      ref_pr = ref_pr[:, :max_len]
+      est_pr = est_pr[:, :max_len]
 
-    bs = len(ref_prs)
-    pianoroll_image_batch = np.zeros(shape=(bs, 128, max_len, 3))
-    for i in range(bs):
-      ref_pr = ref_prs[i][:, :max_len]
-      est_pr = est_prs[i][:, :max_len]
+      image = np.zeros(shape=(128, max_len, 3), dtype=np.uint8)
+      image[:, :est_pr.shape[1], 2] = np.where(est_pr > 0, 255, 0)
+      image[:, :ref_pr.shape[1], 1] = np.where(ref_pr > 0, 255, 0)
+      return image
 
-      pianoroll_image_batch[i, :, :est_pr.shape[1], 2] = est_pr
-      pianoroll_image_batch[i, :, :ref_pr.shape[1], 1] = ref_pr
+    images = _summarize_examples(
+        all_prs, pianoroll_image, num_bytes=128 * max_len * 3, budget=budget)
+    if not images:
+      continue
     if not inst_name:
       inst_name = 'all instruments'
 
     summaries[f'{inst_name} pretty_midi pianoroll'] = seqio.metrics.Image(
-        image=pianoroll_image_batch, max_outputs=bs)
+        image=np.stack(images), max_outputs=len(images))
 
   return summaries
 
@@ -354,7 +348,8 @@ def audio_summaries(
     targets: Sequence[Mapping[str, Sequence[float]]],
     predictions: Sequence[Mapping[str, Sequence[float]]],
     spectrogram_config: spectrograms.SpectrogramConfig,
-    num_seconds: float = _DEFAULT_AUDIO_SECONDS
+    num_seconds: float = _DEFAULT_AUDIO_SECONDS,
+    budget: Optional[SummaryBudget] = None
 ) -> Mapping[str, seqio.metrics.MetricValue]:
   """Compute audio summaries for a list of examples.
 
@@ -366,20 +361,32 @@ def audio_summaries(
     num_seconds: Number of seconds of audio to include in the summaries.
         Longer audio will be cropped (from the beginning), shorter audio will be
         padded with silence (at the end).
+    budget: Optional budget; examples past the budget are not summarized.
 
   Returns:
-    A dictionary mapping "audio" to the audio summaries.
+    A dictionary mapping "audio" to the audio summaries, empty if predictions
+    do not include raw input audio.
   """
   del targets
-  samples = _extract_example_audio(
-      examples=predictions,
-      sample_rate=spectrogram_config.sample_rate,
-      num_seconds=num_seconds)
+  if not all('raw_inputs' in pred for pred in predictions):
+    # Raw input audio was not kept, see `preprocessors.compute_spectrograms`.
+    return {}
+  num_samples = round(num_seconds * spectrogram_config.sample_rate)
+  samples = _summarize_examples(
+      predictions,
+      lambda pred: _extract_example_audio(
+          example=pred,
+          sample_rate=spectrogram_config.sample_rate,
+          num_seconds=num_seconds),
+      num_bytes=num_samples * np.dtype(np.float32).itemsize,
+      budget=budget)
+  if not samples:
+    return {}
   return {
       'audio': seqio.metrics.Audio(
-          audiodata=samples[:, :, np.newaxis],
+          audiodata=np.stack(samples)[:, :, np.newaxis],
           sample_rate=spectrogram_config.sample_rate,
-          max_outputs=samples.shape[0])
+          max_outputs=len(samples))
   }
 
 
@@ -395,6 +402,7 @@ def transcription_summaries(
     track_specs: Optional[Sequence[note_sequences.TrackSpec]] = None,
     num_seconds: float = _DEFAULT_AUDIO_SECONDS,
     pianoroll_frames_per_second: float = _DEFAULT_PIANOROLL_FRAMES_PER_SECOND,
+    budget: Optional[SummaryBudget] = None
 ) -> Mapping[str, seqio.metrics.MetricValue]:
   """Compute note transcription summaries for multiple examples.
 
@@ -414,18 +422,19 @@ def transcription_summaries(
         Longer audio will be cropped (from the beginning), shorter audio will be
         padded with silence (at the end).
     pianoroll_frames_per_second: Temporal resolution of pianoroll images.
+    budget: Optional budget; examples past the budget are not summarized.
 
   Returns:
-    A dictionary of input, ground truth, and transcription summaries.
+    A dictionary of input, ground truth, and transcription summaries. Input
+    audio with synthesized transcription is only included if predictions
+    include raw input audio.
   """
-  audio_samples = _extract_example_audio(
-      examples=predictions,
-      sample_rate=spectrogram_config.sample_rate,
-      num_seconds=num_seconds)
+  if (ns_feature_suffix is not None) == (note_onset_feature_suffix is not None):
+    raise ValueError(
+        'must specify exactly one of NoteSequence feature and onset feature')
 
-  def synthesize(examples, prefix):
-    return _synthesize_example_notes(
-        examples=examples,
+  def feature_names(prefix):
+    return dict(
         ns_feature_name=(prefix + ns_feature_suffix
                          if ns_feature_suffix else None),
         note_onset_feature_name=(prefix + note_onset_feature_suffix
@@ -437,30 +446,57 @@ def transcription_summaries(
             if note_frequency_feature_suffix else None),
         note_confidence_feature_name=(
             prefix + note_confidence_feature_suffix
-            if note_confidence_feature_suffix else None),
-        sample_rate=spectrogram_config.sample_rate,
-        num_seconds=num_seconds)
-
-  synthesized_predictions = synthesize(predictions, 'est_')
-
-  onset_pianoroll_images, full_pianoroll_images = _examples_to_pianorolls(
-      targets=targets,
-      predictions=predictions,
-      ns_feature_suffix=ns_feature_suffix,
-      note_onset_feature_suffix=note_onset_feature_suffix,
-      note_offset_feature_suffix=note_offset_feature_suffix,
-      note_frequency_feature_suffix=note_frequency_feature_suffix,
-      note_confidence_feature_suffix=note_confidence_feature_suffix,
-      track_specs=track_specs,
-      num_seconds=num_seconds,
-      frames_per_second=pianoroll_frames_per_second)
-
-  return {
-      'input_with_transcription': seqio.metrics.Audio(
-          audiodata=np.stack([audio_samples, synthesized_predictions], axis=2),
-          sample_rate=spectrogram_config.sample_rate,
-          max_outputs=audio_samples.shape[0]),
+            if note_confidence_feature_suffix else None))
 
+  include_audio = all('raw_inputs' in pred for pred in predictions)
+  num_samples = (round(num_seconds * spectrogram_config.sample_rate)
+                 if include_audio else 0)
+  num_frames = round(num_seconds * pianoroll_frames_per_second)
+  num_tracks = len(track_specs) if track_specs else 1
+  num_pixels = (
+      num_tracks * (note_seq.MAX_MIDI_PITCH - note_seq.MIN_MIDI_PITCH + 2) - 1
+  ) * num_frames * 3
+
+  def summarize(target_and_pred):
+    target, pred = target_and_pred
+    audio = None
+    if include_audio:
+      audio = np.stack([
+          _extract_example_audio(
+              example=pred,
+              sample_rate=spectrogram_config.sample_rate,
+              num_seconds=num_seconds),
+          _synthesize_example_notes(
+              example=pred,
+              sample_rate=spectrogram_config.sample_rate,
+              num_seconds=num_seconds,
+              **feature_names('est_'))
+      ], axis=1)
+    onset_image, full_image = _example_to_pianorolls(
+        target_ns=_example_to_note_sequence(
+            target, num_seconds=num_seconds, **feature_names('ref_')),
+        pred_ns=_example_to_note_sequence(
+            pred, num_seconds=num_seconds, **feature_names('est_')),
+        start_times=pred['start_times'],
+        track_specs=track_specs,
+        num_frames=num_frames,
+        frames_per_second=pianoroll_frames_per_second)
+    return audio, onset_image, full_image
+
+  example_summaries = _summarize_examples(
+      list(zip(targets, predictions)),
+      summarize,
+      num_bytes=2 * num_samples * np.dtype(np.float32).itemsize +
+      2 * num_pixels,
+      budget=budget)
+  if not example_summaries:
+    return {}
+  audio, onset_pianoroll_images, full_pianoroll_images = zip(
+      *example_summaries)
+  onset_pianoroll_images = np.stack(onset_pianoroll_images)
+  full_pianoroll_images = np.stack(full_pianoroll_images)
+
+  result = {
       'pianoroll': seqio.metrics.Image(
           image=full_pianoroll_images,
           max_outputs=full_pianoroll_images.shape[0]),
@@ -469,3 +505,10 @@ def transcription_summaries(
           image=onset_pianoroll_images,
           max_outputs=onset_pianoroll_images.shape[0]),
   }
+  if include_audio:
+    audio = np.stack(audio)
+    result['input_with_transcription'] = seqio.metrics.Audio(
+        audiodata=audio,
+        sample_rate=spectrogram_config.sample_rate,
+        max_outputs=audio.shape[0])
+  return result
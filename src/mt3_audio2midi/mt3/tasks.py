@@ -14,8 +14,9 @@
 
 """Transcription task definitions."""
 
+import dataclasses
 import functools
-from typing import Optional, Sequence
+from typing import Any, Mapping, Optional, Sequence
 
 from mt3_audio2midi.mt3 import datasets
 from mt3_audio2midi.mt3 import event_codec
@@ -79,12 +80,15 @@ def postprocess(tokens, example, is_target, codec):
   # Round down to nearest symbolic token step.
   start_time -= start_time % (1 / codec.steps_per_second)
 
-  return {
+  prediction = {
       'unique_id': example['unique_id'][0],
-      'raw_inputs': example['raw_inputs'],
       'est_tokens': tokens,
       'start_time': start_time
   }
+  # Raw input audio is only present when audio summaries need it.
+  if 'raw_inputs' in example:
+    prediction['raw_inputs'] = example['raw_inputs']
+  return prediction
 
 
 def add_transcription_task_to_registry(
@@ -173,7 +177,8 @@ def add_transcription_task_to_registry(
               state_change_event_types=['velocity', 'program']),
           functools.partial(
               preprocessors.compute_spectrograms,
-              spectrogram_config=spectrogram_config),
+              spectrogram_config=spectrogram_config,
+              keep_raw_inputs=False),
           functools.partial(preprocessors.handle_too_long, skip=skip_too_long),
           functools.partial(
               seqio.preprocessors.tokenize_and_append_eos,
@@ -253,110 +258,118 @@ SPECTROGRAM_CONFIG = spectrograms.SpectrogramConfig()
 VOCAB_CONFIG_FULL = vocabularies.VocabularyConfig()
 VOCAB_CONFIG_NOVELOCITY = vocabularies.VocabularyConfig(num_velocity_bins=1)
 
-# Transcribe MAESTRO v1.
-add_transcription_task_to_registry(
-    dataset_config=datasets.MAESTROV1_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_FULL,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_transcription_example,
-        audio_is_samples=False,
-        id_feature_key='id'),
-    onsets_only=False,
-    include_ties=False)
-
-# Transcribe MAESTRO v3.
-add_transcription_task_to_registry(
-    dataset_config=datasets.MAESTROV3_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_FULL,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_transcription_example,
-        audio_is_samples=False,
-        id_feature_key='id'),
-    onsets_only=False,
-    include_ties=False)
-
-# Transcribe MAESTRO v3 without velocities, with ties.
-add_transcription_task_to_registry(
-    dataset_config=datasets.MAESTROV3_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_NOVELOCITY,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_transcription_example,
-        audio_is_samples=False,
-        id_feature_key='id'),
-    onsets_only=False,
-    include_ties=True)
-
-# Transcribe GuitarSet, with ties.
-add_transcription_task_to_registry(
-    dataset_config=datasets.GUITARSET_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_NOVELOCITY,
-    tokenize_fn=preprocessors.tokenize_guitarset_example,
-    onsets_only=False,
-    include_ties=True)
-
-# Transcribe URMP mixes, with ties.
-add_transcription_task_to_registry(
-    dataset_config=datasets.URMP_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_NOVELOCITY,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_example_with_program_lookup,
-        inst_name_to_program_fn=preprocessors.urmp_instrument_to_program,
-        id_feature_key='id'),
-    onsets_only=False,
-    include_ties=True)
-
-# Transcribe MusicNet, with ties.
-add_transcription_task_to_registry(
-    dataset_config=datasets.MUSICNET_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_NOVELOCITY,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_transcription_example,
-        audio_is_samples=True,
-        id_feature_key='id'),
-    onsets_only=False,
-    include_ties=True)
-
-# Transcribe MusicNetEM, with ties.
-add_transcription_task_to_registry(
-    dataset_config=datasets.MUSICNET_EM_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_NOVELOCITY,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_transcription_example,
-        audio_is_samples=True,
-        id_feature_key='id'),
-    onsets_only=False,
-    include_ties=True)
-
-# Transcribe Cerberus4 (piano-guitar-bass-drums quartets), with ties.
-add_transcription_task_to_registry(
-    dataset_config=datasets.CERBERUS4_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_NOVELOCITY,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_slakh_example,
-        track_specs=datasets.CERBERUS4_CONFIG.track_specs,
-        ignore_pitch_bends=True),
-    onsets_only=False,
-    include_ties=True)
-
-# Transcribe 10 random sub-mixes of each song from Slakh, with ties.
-add_transcription_task_to_registry(
-    dataset_config=datasets.SLAKH_CONFIG,
-    spectrogram_config=SPECTROGRAM_CONFIG,
-    vocab_config=VOCAB_CONFIG_NOVELOCITY,
-    tokenize_fn=functools.partial(
-        preprocessors.tokenize_slakh_example,
-        track_specs=None,
-        ignore_pitch_bends=True),
-    onsets_only=False,
-    include_ties=True)
+@dataclasses.dataclass(frozen=True)
+class TranscriptionTaskConfig:
+  """Arguments of a transcription task, shared by seqio and `grain_tasks`."""
+  dataset_config: datasets.DatasetConfig
+  vocab_config: vocabularies.VocabularyConfig
+  # Key into `EXAMPLE_TOKENIZERS` (and `grain_tasks.RECORD_TOKENIZERS`).
+  tokenizer: str
+  include_ties: bool
+  tokenizer_kwargs: Mapping[str, Any] = dataclasses.field(default_factory=dict)
+  spectrogram_config: spectrograms.SpectrogramConfig = dataclasses.field(
+      default_factory=spectrograms.SpectrogramConfig)
+  onsets_only: bool = False
+
+  @property
+  def train_task_name(self) -> str:
+    task_name = 'onsets' if self.onsets_only else 'notes'
+    if self.include_ties:
+      task_name += '_ties'
+    return construct_task_name(
+        task_prefix=f'{self.dataset_config.name}_{task_name}',
+        spectrogram_config=self.spectrogram_config,
+        vocab_config=self.vocab_config,
+        task_suffix='train')
+
+
+# tf.data tokenizers of each `TranscriptionTaskConfig.tokenizer`.
+EXAMPLE_TOKENIZERS = {
+    'transcription': preprocessors.tokenize_transcription_example,
+    'guitarset': preprocessors.tokenize_guitarset_example,
+    'program_lookup': preprocessors.tokenize_example_with_program_lookup,
+    'slakh': preprocessors.tokenize_slakh_example,
+}
+
+TRANSCRIPTION_TASKS = (
+    # Transcribe MAESTRO v1.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.MAESTROV1_CONFIG,
+        vocab_config=VOCAB_CONFIG_FULL,
+        tokenizer='transcription',
+        tokenizer_kwargs={'audio_is_samples': False, 'id_feature_key': 'id'},
+        include_ties=False),
+    # Transcribe MAESTRO v3.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.MAESTROV3_CONFIG,
+        vocab_config=VOCAB_CONFIG_FULL,
+        tokenizer='transcription',
+        tokenizer_kwargs={'audio_is_samples': False, 'id_feature_key': 'id'},
+        include_ties=False),
+    # Transcribe MAESTRO v3 without velocities, with ties.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.MAESTROV3_CONFIG,
+        vocab_config=VOCAB_CONFIG_NOVELOCITY,
+        tokenizer='transcription',
+        tokenizer_kwargs={'audio_is_samples': False, 'id_feature_key': 'id'},
+        include_ties=True),
+    # Transcribe GuitarSet, with ties.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.GUITARSET_CONFIG,
+        vocab_config=VOCAB_CONFIG_NOVELOCITY,
+        tokenizer='guitarset',
+        include_ties=True),
+    # Transcribe URMP mixes, with ties.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.URMP_CONFIG,
+        vocab_config=VOCAB_CONFIG_NOVELOCITY,
+        tokenizer='program_lookup',
+        tokenizer_kwargs={
+            'inst_name_to_program_fn': preprocessors.urmp_instrument_to_program,
+            'id_feature_key': 'id'},
+        include_ties=True),
+    # Transcribe MusicNet, with ties.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.MUSICNET_CONFIG,
+        vocab_config=VOCAB_CONFIG_NOVELOCITY,
+        tokenizer='transcription',
+        tokenizer_kwargs={'audio_is_samples': True, 'id_feature_key': 'id'},
+        include_ties=True),
+    # Transcribe MusicNetEM, with ties.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.MUSICNET_EM_CONFIG,
+        vocab_config=VOCAB_CONFIG_NOVELOCITY,
+        tokenizer='transcription',
+        tokenizer_kwargs={'audio_is_samples': True, 'id_feature_key': 'id'},
+        include_ties=True),
+    # Transcribe Cerberus4 (piano-guitar-bass-drums quartets), with ties.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.CERBERUS4_CONFIG,
+        vocab_config=VOCAB_CONFIG_NOVELOCITY,
+        tokenizer='slakh',
+        tokenizer_kwargs={
+            'track_specs': datasets.CERBERUS4_CONFIG.track_specs,
+            'ignore_pitch_bends': True},
+        include_ties=True),
+    # Transcribe 10 random sub-mixes of each song from Slakh, with ties.
+    TranscriptionTaskConfig(
+        dataset_config=datasets.SLAKH_CONFIG,
+        vocab_config=VOCAB_CONFIG_NOVELOCITY,
+        tokenizer='slakh',
+        tokenizer_kwargs={'track_specs': None, 'ignore_pitch_bends': True},
+        include_ties=True),
+)
+
+for task_config in TRANSCRIPTION_TASKS:
+  add_transcription_task_to_registry(
+      dataset_config=task_config.dataset_config,
+      spectrogram_config=task_config.spectrogram_config,
+      vocab_config=task_config.vocab_config,
+      tokenize_fn=functools.partial(
+          EXAMPLE_TOKENIZERS[task_config.tokenizer],
+          **task_config.tokenizer_kwargs),
+      onsets_only=task_config.onsets_only,
+      include_ties=task_config.include_ties)
 
 
 # Construct task names to include in transcription mixture.
@@ -0,0 +1,189 @@
+# Copyright 2024 The mt3_audio2midi.mt3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Model output vocabulary without TensorFlow or seqio.
+
+Vocabulary configuration, event codec construction, velocity binning, and
+NumPy encoding and decoding of token ids. `vocabularies` builds the seqio
+vocabulary used by tasks and models on top of these.
+"""
+
+import dataclasses
+import math
+
+from typing import Optional, Tuple
+
+from mt3_audio2midi.mt3 import event_codec
+
+import note_seq
+import numpy as np
+
+DECODED_EOS_ID = -1
+DECODED_INVALID_ID = -2
+
+# defaults for vocabulary config
+DEFAULT_STEPS_PER_SECOND = 100
+DEFAULT_MAX_SHIFT_SECONDS = 10
+DEFAULT_NUM_VELOCITY_BINS = 127
+
+# Same as t5.data.DEFAULT_EXTRA_IDS, used for the model output vocabulary.
+DEFAULT_EXTRA_IDS = 100
+
+
+@dataclasses.dataclass
+class VocabularyConfig:
+  """Vocabulary configuration parameters."""
+  steps_per_second: int = DEFAULT_STEPS_PER_SECOND
+  max_shift_seconds: int = DEFAULT_MAX_SHIFT_SECONDS
+  num_velocity_bins: int = DEFAULT_NUM_VELOCITY_BINS
+
+  @property
+  def abbrev_str(self):
+    s = ''
+    if self.steps_per_second != DEFAULT_STEPS_PER_SECOND:
+      s += 'ss%d' % self.steps_per_second
+    if self.max_shift_seconds != DEFAULT_MAX_SHIFT_SECONDS:
+      s += 'ms%d' % self.max_shift_seconds
+    if self.num_velocity_bins != DEFAULT_NUM_VELOCITY_BINS:
+      s += 'vb%d' % self.num_velocity_bins
+    return s
+
+
+def num_velocity_bins_from_codec(codec: event_codec.Codec):
+  """Get number of velocity bins from event codec."""
+  lo, hi = codec.event_type_range('velocity')
+  return hi - lo
+
+
+def velocity_to_bin(velocity, num_velocity_bins):
+  if velocity == 0:
+    return 0
+  else:
+    return math.ceil(num_velocity_bins * velocity / note_seq.MAX_MIDI_VELOCITY)
+
+
+def bin_to_velocity(velocity_bin, num_velocity_bins):
+  if velocity_bin == 0:
+    return 0
+  else:
+    return int(note_seq.MAX_MIDI_VELOCITY * velocity_bin / num_velocity_bins)
+
+
+def build_codec(vocab_config: VocabularyConfig):
+  """Build event codec."""
+  event_ranges = [
+      event_codec.EventRange('pitch', note_seq.MIN_MIDI_PITCH,
+                             note_seq.MAX_MIDI_PITCH),
+      # velocity bin 0 is used for note-off
+      event_codec.EventRange('velocity', 0, vocab_config.num_velocity_bins),
+      # used to indicate that a pitch is present at the beginning of a segment
+      # (only has an "off" event as when using ties all pitch events until the
+      # "tie" event belong to the tie section)
+      event_codec.EventRange('tie', 0, 0),
+      event_codec.EventRange('program', note_seq.MIN_MIDI_PROGRAM,
+                             note_seq.MAX_MIDI_PROGRAM),
+      event_codec.EventRange('drum', note_seq.MIN_MIDI_PITCH,
+                             note_seq.MAX_MIDI_PITCH),
+  ]
+
+  return event_codec.Codec(
+      max_shift_steps=(vocab_config.steps_per_second *
+                       vocab_config.max_shift_seconds),
+      steps_per_second=vocab_config.steps_per_second,
+      event_ranges=event_ranges)
+
+
+class TokenVocabulary:
+  """Pass-through encoding of tokens, on NumPy arrays.
+
+  Ids match those of `vocabularies.GenericTokenVocabulary`: the first ids are
+  special tokens (0=PAD, 1=EOS, 2=UNK), followed by the regular tokens and the
+  extra ids.
+  """
+
+  def __init__(self, regular_ids: int, extra_ids: int = 0):
+    self._num_special_tokens = 3
+    self._num_regular_tokens = regular_ids
+    self.extra_ids = extra_ids
+
+  @property
+  def pad_id(self) -> int:
+    return 0
+
+  @property
+  def eos_id(self) -> Optional[int]:
+    return 1
+
+  @property
+  def unk_id(self) -> Optional[int]:
+    return 2
+
+  @property
+  def _base_vocab_size(self) -> int:
+    return self._num_special_tokens + self._num_regular_tokens
+
+  @property
+  def vocab_size(self) -> int:
+    return self._base_vocab_size + self.extra_ids
+
+  def encode_np(self, token_ids: np.ndarray) -> np.ndarray:
+    """Encode token ids, like `encode_tf` but without EOS handling.
+
+    Args:
+      token_ids: int array of token ids, of any shape.
+
+    Returns:
+      an int32 array of the same shape.
+    """
+    token_ids = np.asarray(token_ids)
+    if token_ids.size and (token_ids.min() < 0 or
+                           token_ids.max() >= self._num_regular_tokens):
+      raise ValueError(
+          f'token_ids do not fall within valid range of '
+          f'[0, {self._num_regular_tokens})')
+    return token_ids.astype(np.int32) + self._num_special_tokens
+
+  def decode_np(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode token ids, with the same output as `decode_tf`.
+
+    Args:
+      ids: int array of shape [..., length], e.g. a batch of model outputs.
+
+    Returns:
+      an int32 array of decoded token ids of the same shape, and an int array
+      of shape [...] with the number of tokens before the first EOS of each
+      row (or the row length if there is no EOS).
+    """
+    ids = np.asarray(ids)
+    is_eos = ids == self.eos_id
+    eos_and_after = np.logical_or.accumulate(is_eos, axis=-1)
+    decoded = np.where(
+        eos_and_after,
+        DECODED_EOS_ID,
+        np.where(
+            (ids >= self._num_special_tokens) & (ids < self._base_vocab_size),
+            ids - self._num_special_tokens,
+            DECODED_INVALID_ID)).astype(np.int32)
+    lengths = np.where(
+        is_eos.any(axis=-1), is_eos.argmax(axis=-1), ids.shape[-1])
+    return decoded, lengths
+
+
+def vocabulary_from_codec(codec: event_codec.Codec) -> TokenVocabulary:
+  return TokenVocabulary(codec.num_classes, extra_ids=DEFAULT_EXTRA_IDS)
+
+
+def num_embeddings(vocabulary: TokenVocabulary) -> int:
+  """Vocabulary size as a multiple of 128 for TPU efficiency."""
+  return 128 * math.ceil(vocabulary.vocab_size / 128)
@@ -15,63 +15,32 @@
 """Model vocabulary."""
 
 import dataclasses
-import math
 
-from typing import Callable, Optional, Sequence
+from typing import Callable, Optional, Sequence, Tuple
 from mt3_audio2midi.mt3 import event_codec
+from mt3_audio2midi.mt3 import token_vocabulary
 
-import note_seq
+import numpy as np
 import seqio
 import t5.data
 import tensorflow as tf
 
 
-DECODED_EOS_ID = -1
-DECODED_INVALID_ID = -2
+# The vocabulary configuration and codec are defined in token_vocabulary, which
+# (unlike this module) does not use TensorFlow or seqio.
+DECODED_EOS_ID = token_vocabulary.DECODED_EOS_ID
+DECODED_INVALID_ID = token_vocabulary.DECODED_INVALID_ID
 
-# defaults for vocabulary config
-DEFAULT_STEPS_PER_SECOND = 100
-DEFAULT_MAX_SHIFT_SECONDS = 10
-DEFAULT_NUM_VELOCITY_BINS = 127
+DEFAULT_STEPS_PER_SECOND = token_vocabulary.DEFAULT_STEPS_PER_SECOND
+DEFAULT_MAX_SHIFT_SECONDS = token_vocabulary.DEFAULT_MAX_SHIFT_SECONDS
+DEFAULT_NUM_VELOCITY_BINS = token_vocabulary.DEFAULT_NUM_VELOCITY_BINS
 
+VocabularyConfig = token_vocabulary.VocabularyConfig
 
-@dataclasses.dataclass
-class VocabularyConfig:
-  """Vocabulary configuration parameters."""
-  steps_per_second: int = DEFAULT_STEPS_PER_SECOND
-  max_shift_seconds: int = DEFAULT_MAX_SHIFT_SECONDS
-  num_velocity_bins: int = DEFAULT_NUM_VELOCITY_BINS
-
-  @property
-  def abbrev_str(self):
-    s = ''
-    if self.steps_per_second != DEFAULT_STEPS_PER_SECOND:
-      s += 'ss%d' % self.steps_per_second
-    if self.max_shift_seconds != DEFAULT_MAX_SHIFT_SECONDS:
-      s += 'ms%d' % self.max_shift_seconds
-    if self.num_velocity_bins != DEFAULT_NUM_VELOCITY_BINS:
-      s += 'vb%d' % self.num_velocity_bins
-    return s
-
-
-def num_velocity_bins_from_codec(codec: event_codec.Codec):
-  """Get number of velocity bins from event codec."""
-  lo, hi = codec.event_type_range('velocity')
-  return hi - lo
-
-
-def velocity_to_bin(velocity, num_velocity_bins):
-  if velocity == 0:
-    return 0
-  else:
-    return math.ceil(num_velocity_bins * velocity / note_seq.MAX_MIDI_VELOCITY)
-
-
-def bin_to_velocity(velocity_bin, num_velocity_bins):
-  if velocity_bin == 0:
-    return 0
-  else:
-    return int(note_seq.MAX_MIDI_VELOCITY * velocity_bin / num_velocity_bins)
+num_velocity_bins_from_codec = token_vocabulary.num_velocity_bins_from_codec
+velocity_to_bin = token_vocabulary.velocity_to_bin
+bin_to_velocity = token_vocabulary.bin_to_velocity
+build_codec = token_vocabulary.build_codec
 
 
 def drop_programs(tokens, codec: event_codec.Codec):
@@ -116,30 +85,6 @@ PROGRAM_GRANULARITIES = {
 }
 
 
-def build_codec(vocab_config: VocabularyConfig):
-  """Build event codec."""
-  event_ranges = [
-      event_codec.EventRange('pitch', note_seq.MIN_MIDI_PITCH,
-                             note_seq.MAX_MIDI_PITCH),
-      # velocity bin 0 is used for note-off
-      event_codec.EventRange('velocity', 0, vocab_config.num_velocity_bins),
-      # used to indicate that a pitch is present at the beginning of a segment
-      # (only has an "off" event as when using ties all pitch events until the
-      # "tie" event belong to the tie section)
-      event_codec.EventRange('tie', 0, 0),
-      event_codec.EventRange('program', note_seq.MIN_MIDI_PROGRAM,
-                             note_seq.MAX_MIDI_PROGRAM),
-      event_codec.EventRange('drum', note_seq.MIN_MIDI_PITCH,
-                             note_seq.MAX_MIDI_PITCH),
-  ]
-
-  return event_codec.Codec(
-      max_shift_steps=(vocab_config.steps_per_second *
-                       vocab_config.max_shift_seconds),
-      steps_per_second=vocab_config.steps_per_second,
-      event_ranges=event_ranges)
-
-
 def vocabulary_from_codec(codec: event_codec.Codec) -> seqio.Vocabulary:
   return GenericTokenVocabulary(
       codec.num_classes, extra_ids=t5.data.DEFAULT_EXTRA_IDS)
@@ -152,6 +97,8 @@ class GenericTokenVocabulary(seqio.Vocabulary):
     # The special tokens: 0=PAD, 1=EOS, and 2=UNK
     self._num_special_tokens = 3
     self._num_regular_tokens = regular_ids
+    self._np_vocabulary = token_vocabulary.TokenVocabulary(
+        regular_ids, extra_ids=extra_ids)
     super().__init__(extra_ids=extra_ids)
 
   @property
@@ -270,6 +217,14 @@ class GenericTokenVocabulary(seqio.Vocabulary):
             ids - self._num_special_tokens,
             DECODED_INVALID_ID))
 
+  def encode_np(self, token_ids: np.ndarray) -> np.ndarray:
+    """Encode token ids in NumPy, like `encode_tf` but without EOS handling."""
+    return self._np_vocabulary.encode_np(token_ids)
+
+  def decode_np(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode in NumPy, see `token_vocabulary.TokenVocabulary.decode_np`."""
+    return self._np_vocabulary.decode_np(ids)
+
   def __eq__(self, other):
     their_extra_ids = other.extra_ids
     their_num_regular_tokens = other._num_regular_tokens
@@ -277,6 +232,4 @@ class GenericTokenVocabulary(seqio.Vocabulary):
             self._num_regular_tokens == their_num_regular_tokens)
 
 
-def num_embeddings(vocabulary: GenericTokenVocabulary) -> int:
-  """Vocabulary size as a multiple of 128 for TPU efficiency."""
-  return 128 * math.ceil(vocabulary.vocab_size / 128)
+num_embeddings = token_vocabulary.num_embeddings
@@ -12,17 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Import API modules."""
-
-import mt3_audio2midi.t5x.adafactor
-import mt3_audio2midi.t5x.checkpoints
-import mt3_audio2midi.t5x.decoding
-import mt3_audio2midi.t5x.gin_utils
-import mt3_audio2midi.t5x.infer
-import mt3_audio2midi.t5x.losses
-import mt3_audio2midi.t5x.models
-import mt3_audio2midi.t5x.partitioning
-import mt3_audio2midi.t5x.state_utils
-import mt3_audio2midi.t5x.train_state
-import mt3_audio2midi.t5x.trainer
-import mt3_audio2midi.t5x.utils
+"""API modules, imported on first access.
+
+Submodules such as `decoding` only need JAX and Flax; importing them on
+access keeps `import mt3_audio2midi.t5x.decoding` from also importing
+TensorFlow, seqio and the training loop.
+"""
+
+import importlib
+
+_API_MODULES = (
+    'adafactor',
+    'checkpoints',
+    'decoding',
+    'gin_utils',
+    'infer',
+    'losses',
+    'models',
+    'partitioning',
+    'state_utils',
+    'train_state',
+    'trainer',
+    'utils',
+)
+
+
+def __getattr__(name):
+  if name in _API_MODULES:
+    return importlib.import_module(f'{__name__}.{name}')
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+  return sorted(list(globals()) + list(_API_MODULES))
@@ -24,6 +24,7 @@ from flax import traverse_util
 import jax
 from jax import numpy as jnp
 import numpy as np
+from mt3_audio2midi.t5x import checkpoint_utils
 import tensorflow as tf
 import tensorstore as ts
 
@@ -105,9 +106,10 @@ class LazyAwaitableArray(LazyArray):
   """Lazily and asynchronously loads an array when the `get_fn` is async.
 
   Note:
-    The synchronous load method `.get` requires the asyncio event loop and
-    calling `.run_until_complete`. This is not supported when the event loop is
-    already running (for example, from inside another async function).
+    The synchronous load method `.get` runs `get_async` on the checkpoint event
+    loop thread (see `checkpoint_utils.run_coroutine`) and blocks until it is
+    done, so it also works while an event loop is running in the calling
+    thread. Async code should await `get_async` instead.
 
   Note:
     Currently, this class has a few helper methods for creating a
@@ -132,7 +134,7 @@ class LazyAwaitableArray(LazyArray):
     return await _get_and_cast()
 
   def get(self) -> ScalarOrArrayType:
-    return asyncio.run(self.get_async())
+    return checkpoint_utils.run_coroutine(self.get_async())
 
   @classmethod
   def from_tensor_store_spec(
@@ -15,12 +15,15 @@
 """Checkpoint helper functions for managing checkpoints.
 
 Supports marking checkpoints as pinned to exclude them from the checkpointer
-removal process.
+removal process, and running the asynchronous checkpoint reads and writes from
+synchronous code.
 """
 
+import asyncio
 import enum
 import os
-from typing import Any, BinaryIO, Optional, Union
+import threading
+from typing import Any, BinaryIO, Coroutine, Optional, TypeVar, Union
 
 from absl import logging
 from etils import epath
@@ -34,6 +37,48 @@ from tensorflow.io import gfile
 _PINNED_CHECKPOINT_FILENAME = 'PINNED'
 
 PyTree = Any
+T = TypeVar('T')
+
+# Event loop running in a daemon thread, created on first use by
+# `run_coroutine`.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+  """Returns the event loop of the checkpoint loop thread, starting it."""
+  global _loop, _loop_thread
+  with _loop_lock:
+    if _loop is None:
+      loop = asyncio.new_event_loop()
+      _loop_thread = threading.Thread(
+          target=loop.run_forever, name='t5x-checkpoint-loop', daemon=True)
+      _loop_thread.start()
+      _loop = loop
+    return _loop
+
+
+def run_coroutine(coroutine: Coroutine[Any, Any, T]) -> T:
+  """Runs a coroutine to completion and returns its result, blocking.
+
+  Unlike `asyncio.run`, this can be called from a thread that is running an
+  event loop (e.g. from a request handler of an asyncio server) and does not
+  change the event loop of the calling thread: the coroutine runs on an event
+  loop in a dedicated thread. Async code should await the coroutine instead,
+  which does not block its event loop.
+
+  Args:
+    coroutine: The coroutine to run.
+
+  Returns:
+    The result of the coroutine.
+  """
+  if threading.current_thread() is _loop_thread:
+    raise RuntimeError(
+        'run_coroutine cannot be called from the checkpoint loop thread; '
+        'await the coroutine instead.')
+  return asyncio.run_coroutine_threadsafe(coroutine, _get_loop()).result()
 
 
 def pinned_checkpoint_filepath(ckpt_dir: str) -> str:
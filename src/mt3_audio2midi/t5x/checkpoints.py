@@ -192,15 +192,16 @@ def register_ts_spec_for_serialization():
 register_ts_spec_for_serialization()
 
 
-def _run_future_tree(future_tree):
-  """Block until all futures are resolved on this host."""
+async def _gather_future_tree(future_tree):
+  """Awaits all futures (awaitables) in a tree, returning a tree of results."""
   future_leaves, treedef = jax.tree_util.tree_flatten(future_tree)
+  leaves = await asyncio.gather(*future_leaves)
+  return jax.tree_util.tree_unflatten(treedef, leaves)
 
-  async def run():
-    return await asyncio.gather(*future_leaves)
 
-  leaves = asyncio.run(run())
-  return jax.tree_util.tree_unflatten(treedef, leaves)
+def _run_future_tree(future_tree):
+  """Block until all futures are resolved on this host."""
+  return checkpoint_utils.run_coroutine(_gather_future_tree(future_tree))
 
 
 def get_local_data(x):
@@ -421,6 +422,19 @@ def _maybe_make_sharded_array(
   return arr
 
 
+def _restored_nbytes(ts_spec: ts.Spec, restore_dtype: Optional[jnp.dtype]):
+  """Host bytes of reading (and casting) a TensorStore array."""
+  ts_spec_dict = ts_spec.to_json()
+  itemsize = jnp.dtype(ts_spec_dict['dtype']).itemsize
+  if restore_dtype is not None:
+    itemsize = max(itemsize, jnp.dtype(restore_dtype).itemsize)
+  return int(np.prod(ts_spec_dict['metadata']['shape'])) * itemsize
+
+
+def _lazy_nbytes(x: Any) -> int:
+  return x.nbytes if isinstance(x, LazyArray) and x.dtype is not None else 0
+
+
 class _BytesConditionVariable(object):
   """Wraps a condition variable to control concurrency based on bytes."""
 
@@ -429,9 +443,13 @@ class _BytesConditionVariable(object):
     self._num_bytes = num_bytes
     self._cv = asyncio.Condition(lock=asyncio.Lock())
 
+  @property
+  def max_bytes(self):
+    return self._max_bytes
+
   async def wait_for_bytes(self, n_bytes):
     async with self._cv:
-      await self._cv.wait_for(lambda: self._num_bytes > n_bytes)
+      await self._cv.wait_for(lambda: self._num_bytes >= n_bytes)
       self._num_bytes -= n_bytes
       assert self._num_bytes >= 0
 
@@ -442,6 +460,28 @@ class _BytesConditionVariable(object):
       self._cv.notify_all()
 
 
+@dataclasses.dataclass
+class RestoreTimings:
+  """Per-stage timings of restoring the parameters of a checkpoint.
+
+  Parameters are restored concurrently, so the stage times, which are summed
+  over parameters, can add up to more than `total_secs`.
+  """
+
+  # Wall time of reading and placing all parameters.
+  total_secs: float = 0.0
+  # Waiting for the in-flight byte budget.
+  wait_secs: float = 0.0
+  # TensorStore reads, including the transfer to devices for arrays that are
+  # deserialized directly to devices.
+  read_secs: float = 0.0
+  # Casting host arrays and placing them on devices.
+  place_secs: float = 0.0
+  # Bytes read from TensorStore.
+  num_bytes: int = 0
+  num_arrays: int = 0
+
+
 class SaveStateTransformationFn(typing_extensions.Protocol):
 
   def __call__(
@@ -536,6 +576,9 @@ class Checkpointer(object):
     keep_dataset_checkpoints: an optional maximum number of data iterators to
       keep. If more than this number of data iterators exist after a save, the
       oldest ones will be automatically deleted to save space.
+    restore_concurrent_gb: approximate number of gigabytes of parameters read
+      but not yet placed on devices during a restore.
+    last_restore_timings: per-stage timings of the last (non-lazy) restore.
   """
 
   def __init__(  # pytype: disable=annotation-type-mismatch  # jnp-type
@@ -551,6 +594,7 @@ class Checkpointer(object):
       save_dtype: jnp.dtype = np.float32,
       restore_dtype: Optional[jnp.dtype] = None,
       keep_dataset_checkpoints: Optional[int] = None,
+      restore_concurrent_gb: float = 16,
   ):
     """Checkpointer constructor.
 
@@ -572,6 +616,10 @@ class Checkpointer(object):
       keep_dataset_checkpoints: an optional maximum number of data iterators to
         keep. If more than this number of data iterators exist after a save, the
         oldest ones will be automatically deleted to save space.
+      restore_concurrent_gb: the approximate number of gigabytes of parameters
+        read from TensorStore but not yet cast and placed on devices during a
+        restore. Larger parameters are read first, and reads of later ones
+        overlap with the placement of earlier ones within this budget.
     """
     self._train_state = train_state
     self._partitioner = partitioner
@@ -581,6 +629,8 @@ class Checkpointer(object):
     # Immutable due to use in `_get_parameter_infos`
     self._save_dtype = save_dtype
     self.restore_dtype = restore_dtype
+    self.restore_concurrent_gb = restore_concurrent_gb
+    self.last_restore_timings: Optional[RestoreTimings] = None
     self._original_dataset_iterator = dataset_iterator
     if isinstance(dataset_iterator, tf.data.Iterator):
       dataset_iterator = _TfDataCheckpointer(dataset_iterator)
@@ -601,8 +651,6 @@ class Checkpointer(object):
 
     self._parameter_infos = self._get_parameter_infos()
 
-    asyncio.set_event_loop(asyncio.new_event_loop())
-
   def _get_state_dict_for_save(
       self, state_dict: Dict[str, Any], lazy_load: bool = True
   ) -> MutableMapping[str, Any]:
@@ -995,9 +1043,38 @@ class Checkpointer(object):
       state_transformation_fns: Sequence[RestoreStateTransformationFn] = (),
       fallback_state: Optional[Mapping[str, Any]] = None,
       lazy_parameters: bool = False,
+  ) -> train_state_lib.TrainState:
+    """Restores the host-specific parameters in an Optimizer, blocking.
+
+    Runs `restore_async` on the checkpoint event loop thread (see
+    `checkpoint_utils.run_coroutine`), so it can also be called while an event
+    loop is running in the calling thread. Arguments are those of
+    `restore_async`.
+    """
+    return checkpoint_utils.run_coroutine(
+        self.restore_async(
+            step=step,
+            path=path,
+            state_transformation_fns=state_transformation_fns,
+            fallback_state=fallback_state,
+            lazy_parameters=lazy_parameters,
+        )
+    )
+
+  async def restore_async(
+      self,
+      step: Optional[int] = None,
+      path: Optional[str] = None,
+      state_transformation_fns: Sequence[RestoreStateTransformationFn] = (),
+      fallback_state: Optional[Mapping[str, Any]] = None,
+      lazy_parameters: bool = False,
   ) -> train_state_lib.TrainState:
     """Restores the host-specific parameters in an Optimizer.
 
+    Blocking file system calls run in a worker thread and TensorStore reads are
+    awaited, so awaiting this in a running event loop (e.g. to reload a model
+    while serving) does not block the loop.
+
     Either `step` or `path` can be specified, but not both. If neither are
     specified, restores from the latest checkpoint in the checkpoints directory.
 
@@ -1031,56 +1108,9 @@ class Checkpointer(object):
       )
     if step is not None and path is not None:
       raise ValueError('At most one of `step` or `path` may be provided.')
-    if path:
-      ckpt_path = path
-    else:
-      if step is None:
-        step = self.latest_step()
-        if not step:
-          raise ValueError(f'No checkpoints found in {self.checkpoints_dir}.')
-      ckpt_path = self._get_checkpoint_dir(step)
-
-    if gfile.isdir(ckpt_path):
-      ckpt_dir = ckpt_path
-      if gfile.isdir(os.path.join(ckpt_dir, _STATE_KEY)):
-        ckpt_path = os.path.join(ckpt_path, _STATE_KEY, 'checkpoint')
-      else:
-        ckpt_path = os.path.join(ckpt_path, 'checkpoint')
-    else:
-      ckpt_dir = os.path.dirname(ckpt_path)
-
-    if not gfile.exists(ckpt_path) or gfile.isdir(ckpt_path):
-      raise ValueError(f'Path is not a valid T5X checkpoint: {ckpt_path}')
-
-    ckpt_type = checkpoint_utils.detect_checkpoint_type(
-        ckpt_path, expected=checkpoint_utils.CheckpointTypes.T5X
+    ckpt_path, ckpt_dir, ckpt_contents, ckpt_type = await asyncio.to_thread(
+        self._read_checkpoint_contents, step, path
     )
-    if ckpt_type is checkpoint_utils.CheckpointTypes.T5X_TF:
-      raise ValueError(
-          'Attempting to restore a TensorFlow checkpoint as a native T5X '
-          'checkpoint. Use `restore_from_tf_checkpoint` instead. Path: '
-          f'{ckpt_path}'
-      )
-    # Don't error out here for Orbax-detected checkpoint (there are edge cases
-    # where all values are stored in the msgpack and the checkpoint file can be
-    # loaded by both the Orbax and T5X checkpointer).
-    logging.info('Restoring from checkpoint: %s', ckpt_path)
-
-    with gfile.GFile(ckpt_path, 'rb') as fp:
-      # TODO(adarob): Use threaded reading as in flax.checkpoints.
-      # `ckpt_contents['optimizer']` is a pytree with a realized np.array for
-      # leaves (params or states) written as msgpack and a ts.Spec (in a dict)
-      # for leaves written by TensorStore.
-      ckpt_contents = serialization.msgpack_restore(fp.read())
-
-    # If reading a ckpt that was written with gfile driver but the current
-    # session uses the gcs driver, convert the ckpt's driver to gcs.
-    if os.fspath(ckpt_dir).startswith('gs://'):
-      ckpt_contents = _maybe_update_ts_from_file_to_gcs(ckpt_contents)
-    # If a ckpt was saved in gcs and is being loaded locally, then convert the
-    # driver to file or gfile. If the ckpt was not saved in gcs, do not change.
-    else:
-      ckpt_contents = _maybe_update_ts_from_gcs_to_file(ckpt_contents)
 
     ckpt_state_dict = self._get_optimizer_state_dict(
         ckpt_contents,
@@ -1127,7 +1157,7 @@ class Checkpointer(object):
     written_state_dict = serialization.from_state_dict(
         dummy_written_state_dict, ckpt_state_dict
     )
-    state_dict = self._read_state_from_tensorstore(
+    state_dict = await self._read_state_from_tensorstore_async(
         ckpt_path,
         written_state_dict,
         restore_parameter_infos=restore_parameter_infos,
@@ -1146,8 +1176,9 @@ class Checkpointer(object):
       logging.info(
           "Restoring dataset iterator from '%s'.", self._dataset_ckpt_name
       )
-      self._dataset_iterator.load(
-          os.path.join(ckpt_dir, self._dataset_ckpt_name)
+      await asyncio.to_thread(
+          self._dataset_iterator.load,
+          os.path.join(ckpt_dir, self._dataset_ckpt_name),
       )
 
     restored_train_state = self._restore_train_state(state_dict)
@@ -1158,6 +1189,68 @@ class Checkpointer(object):
     )
     return restored_train_state
 
+  def _read_checkpoint_contents(
+      self, step: Optional[int], path: Optional[str]
+  ) -> Tuple[str, str, PyTree, checkpoint_utils.CheckpointTypes]:
+    """Finds the checkpoint to restore and reads its msgpack file."""
+    if path:
+      ckpt_path = path
+    else:
+      if step is None:
+        step = self.latest_step()
+        if not step:
+          raise ValueError(f'No checkpoints found in {self.checkpoints_dir}.')
+      ckpt_path = self._get_checkpoint_dir(step)
+
+    if gfile.isdir(ckpt_path):
+      ckpt_dir = ckpt_path
+      if gfile.isdir(os.path.join(ckpt_dir, _STATE_KEY)):
+        ckpt_path = os.path.join(ckpt_path, _STATE_KEY, 'checkpoint')
+      else:
+        ckpt_path = os.path.join(ckpt_path, 'checkpoint')
+    else:
+      ckpt_dir = os.path.dirname(ckpt_path)
+
+    if not gfile.exists(ckpt_path) or gfile.isdir(ckpt_path):
+      raise ValueError(f'Path is not a valid T5X checkpoint: {ckpt_path}')
+
+    ckpt_type = checkpoint_utils.detect_checkpoint_type(
+        ckpt_path, expected=checkpoint_utils.CheckpointTypes.T5X
+    )
+    if ckpt_type is checkpoint_utils.CheckpointTypes.T5X_TF:
+      raise ValueError(
+          'Attempting to restore a TensorFlow checkpoint as a native T5X '
+          'checkpoint. Use `restore_from_tf_checkpoint` instead. Path: '
+          f'{ckpt_path}'
+      )
+    # Don't error out here for Orbax-detected checkpoint (there are edge cases
+    # where all values are stored in the msgpack and the checkpoint file can be
+    # loaded by both the Orbax and T5X checkpointer).
+    logging.info('Restoring from checkpoint: %s', ckpt_path)
+
+    with gfile.GFile(ckpt_path, 'rb') as fp:
+      # TODO(adarob): Use threaded reading as in flax.checkpoints.
+      # `ckpt_contents['optimizer']` is a pytree with a realized np.array for
+      # leaves (params or states) written as msgpack and a ts.Spec (in a dict)
+      # for leaves written by TensorStore.
+      ckpt_contents = serialization.msgpack_restore(fp.read())
+
+    if isinstance(self._train_state, train_state_lib.InferenceState):
+      # Inference states have no optimizer slots; drop them (including arrays
+      # stored in the msgpack file) before processing the checkpoint contents.
+      ckpt_contents = _drop_optimizer_param_states(ckpt_contents)
+
+    # If reading a ckpt that was written with gfile driver but the current
+    # session uses the gcs driver, convert the ckpt's driver to gcs.
+    if os.fspath(ckpt_dir).startswith('gs://'):
+      ckpt_contents = _maybe_update_ts_from_file_to_gcs(ckpt_contents)
+    # If a ckpt was saved in gcs and is being loaded locally, then convert the
+    # driver to file or gfile. If the ckpt was not saved in gcs, do not change.
+    else:
+      ckpt_contents = _maybe_update_ts_from_gcs_to_file(ckpt_contents)
+
+    return ckpt_path, ckpt_dir, ckpt_contents, ckpt_type
+
   def _restore_train_state(
       self, state_dict: optimizers.OptimizerStateType
   ) -> train_state_lib.TrainState:
@@ -1170,6 +1263,8 @@ class Checkpointer(object):
       maybe_ts_spec: Any,
       ckpt_path: str,
       restore_dtype: Optional[jnp.dtype],
+      bytes_cv: Optional[_BytesConditionVariable] = None,
+      timings: Optional[RestoreTimings] = None,
   ) -> LazyAwaitableArray:
     """Creates LazyArray from tensorstore.
 
@@ -1185,6 +1280,9 @@ class Checkpointer(object):
         tensorstore spec.
       restore_dtype: type to restore as. None indicates that no cast is
         requested.
+      bytes_cv: optional budget of bytes that may be read but not yet placed;
+        reads wait until the bytes of the parameter are available.
+      timings: optional timings to add the stage times of the read to.
 
     Returns:
       LazyArray object.
@@ -1195,6 +1293,14 @@ class Checkpointer(object):
     async def get_fn():
       nonlocal mesh
       nonlocal axes
+      n_bytes = 0
+      start_time = time.perf_counter()
+      if bytes_cv is not None and isinstance(maybe_ts_spec, ts.Spec):
+        n_bytes = min(
+            _restored_nbytes(maybe_ts_spec, restore_dtype), bytes_cv.max_bytes
+        )
+        await bytes_cv.wait_for_bytes(n_bytes)
+      read_start_time = time.perf_counter()
       arr = await _read_ts(
           param_info,
           maybe_ts_spec,
@@ -1204,13 +1310,28 @@ class Checkpointer(object):
           axes=axes,
           params_on_devices=self._partitioner.params_on_devices,
       )
-      return _maybe_make_sharded_array(
+      place_start_time = time.perf_counter()
+      # Casting and copying to devices run in a worker thread, so that the event
+      # loop keeps reading other parameters meanwhile.
+      arr = await asyncio.to_thread(
+          _maybe_make_sharded_array,
           arr,
           mesh,
           axes=axes,
           restore_dtype=restore_dtype,
           params_on_devices=self._partitioner.params_on_devices,
       )
+      end_time = time.perf_counter()
+      if n_bytes:
+        await bytes_cv.return_bytes(n_bytes)
+      if timings is not None:
+        timings.wait_secs += read_start_time - start_time
+        timings.read_secs += place_start_time - read_start_time
+        timings.place_secs += end_time - place_start_time
+        if isinstance(maybe_ts_spec, ts.Spec):
+          timings.num_bytes += _restored_nbytes(maybe_ts_spec, restore_dtype)
+        timings.num_arrays += 1
+      return arr
 
     return LazyAwaitableArray.from_tensor_store_spec_or_array(
         maybe_ts_spec, get_fn, dtype=restore_dtype
@@ -1224,9 +1345,35 @@ class Checkpointer(object):
       lazy_parameters: bool = False,
   ) -> Mapping[str, Any]:
     """Sets up lazy reads from Tensorstore and returns them as a state_dict."""
+    return checkpoint_utils.run_coroutine(
+        self._read_state_from_tensorstore_async(
+            ckpt_path,
+            written_state_dict,
+            restore_parameter_infos=restore_parameter_infos,
+            lazy_parameters=lazy_parameters,
+        )
+    )
+
+  async def _read_state_from_tensorstore_async(
+      self,
+      ckpt_path: str,
+      written_state_dict: Mapping[str, Any],
+      restore_parameter_infos: Optional[Mapping[str, Any]] = None,
+      lazy_parameters: bool = False,
+  ) -> Mapping[str, Any]:
+    """Like `_read_state_from_tensorstore`, awaiting the reads."""
     if restore_parameter_infos is None:
       restore_parameter_infos = self._parameter_infos
 
+    # Lazy parameters are read on demand, outside of the byte budget.
+    if lazy_parameters:
+      bytes_cv = timings = None
+    else:
+      bytes_cv = _BytesConditionVariable(
+          int(self.restore_concurrent_gb * 10**9)
+      )
+      timings = RestoreTimings()
+
     # Replace TensorStore Specs with the lazy array values.
     state_dict = {}
     for k in written_state_dict.keys():
@@ -1237,16 +1384,41 @@ class Checkpointer(object):
               self._create_lazy_awaitable_array,
               ckpt_path=ckpt_path,
               restore_dtype=restore_dtype,
+              bytes_cv=bytes_cv,
+              timings=timings,
           ),
           restore_parameter_infos[k],
           written_state_dict[k],
       )
 
     if not lazy_parameters:
-      future_state_dict = jax.tree_util.tree_map(
-          lambda x: x.get_async(), state_dict
+      lazy_arrays, treedef = jax.tree_util.tree_flatten(state_dict)
+      # Read the largest parameters first, so that the reads of the many small
+      # ones overlap with placing the large ones rather than trailing them.
+      order = sorted(
+          range(len(lazy_arrays)), key=lambda i: -_lazy_nbytes(lazy_arrays[i])
+      )
+      start_time = time.perf_counter()
+      arrays = await asyncio.gather(
+          *(lazy_arrays[i].get_async() for i in order)
+      )
+      timings.total_secs = time.perf_counter() - start_time
+      leaves = [None] * len(lazy_arrays)
+      for i, arr in zip(order, arrays):
+        leaves[i] = arr
+      state_dict = jax.tree_util.tree_unflatten(treedef, leaves)
+      self.last_restore_timings = timings
+      logging.info(
+          'Restored %d arrays (%.1f MB) in %.2f s; summed over arrays: waiting '
+          'for the byte budget %.2f s, reading %.2f s, casting and placing '
+          '%.2f s.',
+          timings.num_arrays,
+          timings.num_bytes / 1e6,
+          timings.total_secs,
+          timings.wait_secs,
+          timings.read_secs,
+          timings.place_secs,
       )
-      state_dict = _run_future_tree(future_state_dict)
 
     if self.restore_dtype is not None:
       if 'target' not in state_dict:
@@ -1612,6 +1784,17 @@ class SaveBestCheckpointer(Checkpointer):
       checkpoint_utils.remove_checkpoint_dir(self._get_checkpoint_dir(step))
 
 
+def _drop_optimizer_param_states(ckpt_contents: PyTree) -> PyTree:
+  """Removes the optimizer slots (`param_states`) from checkpoint contents."""
+  if not isinstance(ckpt_contents, Mapping) or not ckpt_contents.get(
+      'version', 0):
+    return ckpt_contents
+  optimizer_state = ckpt_contents.get('optimizer', {}).get('state')
+  if isinstance(optimizer_state, MutableMapping):
+    optimizer_state.pop('param_states', None)
+  return ckpt_contents
+
+
 def _no_optimizer_state(ckpt_contents: PyTree, use_orbax_format: bool) -> bool:
   if use_orbax_format:
     return True
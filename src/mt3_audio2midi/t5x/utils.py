@@ -2023,6 +2023,23 @@ def get_dataset_inner(
         seed,
     )
 
+  if isinstance(mixture_or_task, (airio.Task, airio.Mixture)):
+    return airio.get_dataset(
+        mixture_or_task=mixture_or_task,
+        sequence_lengths=cfg.task_feature_lengths,
+        split=cfg.split,
+        runtime_preprocessors=cfg.runtime_preprocessors,
+        batch_size=batch_size,
+        shuffle=cfg.shuffle,
+        num_epochs=num_epochs,
+        seed=seed,
+        shard_info=airio.ShardInfo(
+            index=shard_info.index, num_shards=shard_info.num_shards
+        ),
+        num_prefetch_threads=cfg.num_prefetch_threads,
+        num_workers=cfg.num_workers,
+    )
+
   in_memory_shuffle = cfg.shuffle
   return seqio.get_dataset(
       mixture_or_task_name=mixture_or_task,